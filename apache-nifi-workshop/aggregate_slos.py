@@ -0,0 +1,181 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+
+from gen_io import dataset_files, file_format, file_stamp, read_records
+from gen_slo import SloAggregator, load_checkpoint, save_checkpoint
+
+# Derives the observability Module 3 SLO records (one per flow_name and
+# window) from flow_kpis in a single pass, with the incremental aggregator
+# in gen_slo instead of MergeRecord + QueryRecord re-reading the KPIs.
+#
+# Every file of the input datasets (part and delta files included) is read
+# record by record; windows are written to out_dir/derived_slos.jsonl as the
+# watermark finalizes them, and the rest when the input ends. With a
+# checkpoint_path the open windows are saved instead of flushed, and the
+# next run restores them and appends to the output, so a stream can be
+# aggregated in pieces (with the same window, lateness and accuracy: a run
+# whose settings differ from the checkpoint's stops rather than mixing them).
+# The checkpoint also records every file read, with its stamp (size, mtime)
+# and the byte offset consumed, and the next run reads only what is new: an
+# unchanged file resumes at its offset (nothing, once read to the end), an
+# uncompressed JSONL file that grew past it by appending resumes there too,
+# and a file changed any other way stops the run, as the trace index does.
+# An unterminated last line is left for the next run, since a live writer
+# may still be appending to it:
+#
+#   python aggregate_slos.py
+#   python aggregate_slos.py --window-s 60 --lateness-s 600 --checkpoint ./data/obs/kpis/slo_state.json
+
+# Config block: edit values here
+CONFIG = {
+    "input_dir": "./data/obs/raw",
+    # generator_kpis (gen_metrics) has the same shape and can be added
+    "datasets": ["flow_kpis"],
+    "out_dir": "./data/obs/kpis/derived_slos",
+    # tumbling window length; None groups by each record's own
+    # window_start/window_end like the Module 3 SQL
+    "window_s": 300,
+    # how far behind the latest window_end a record may arrive; None holds
+    # every window until the input ends
+    "lateness_s": None,
+    # p95 sketch accuracy (relative error)
+    "relative_accuracy": 0.01,
+    # open windows saved here after the run and restored before the next
+    "checkpoint_path": None,
+}
+
+OUTPUT_NAME = "derived_slos.jsonl"
+# CONFIG key -> SloAggregator attribute a checkpoint must agree with
+CHECKPOINT_SETTINGS = {"window_s": "window_s", "lateness_s": "lateness_s",
+                       "relative_accuracy": "relative_accuracy"}
+# bytes before the consumed offset hashed into the checkpoint, to tell an
+# appended-to file from a rewritten one
+TAIL_BYTES = 64
+
+
+def check_settings(agg, path):
+    diff = [f"{key} {getattr(agg, attr)!r} (this run: {CONFIG[key]!r})"
+            for key, attr in CHECKPOINT_SETTINGS.items() if getattr(agg, attr) != CONFIG[key]]
+    if diff:
+        raise SystemExit(f"{path} was saved with {', '.join(diff)}; rerun with the checkpoint's settings "
+                         f"or delete it to start empty")
+
+
+def tail_digest(path, offset):
+    with open(path, "rb") as f:
+        f.seek(max(0, offset - TAIL_BYTES))
+        return hashlib.blake2b(f.read(offset - f.tell()), digest_size=8).hexdigest()
+
+
+def resume_offset(path, seen, checkpoint):
+    # where to resume a file the checkpoint has seen (None: not yet, 0)
+    if seen is None:
+        return 0
+    stamp = file_stamp(path)
+    if stamp == seen["stamp"]:
+        return seen["offset"]
+    if (file_format(path) == ("jsonl", None) and stamp["size"] > seen["stamp"]["size"]
+            and tail_digest(path, seen["offset"]) == seen["tail"]):
+        return seen["offset"]
+    raise SystemExit(f"{path} changed since {checkpoint} consumed it; restore it or delete the checkpoint "
+                     f"to start empty")
+
+
+def unread_records(path, offset):
+    # (record, offset after it) from offset on; a format without line
+    # offsets is read whole (offset None) and skipped once consumed
+    if file_format(path) != ("jsonl", None):
+        if not offset:
+            yield from ((record, None) for record in read_records(path))
+        return
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                return
+            offset += len(line)
+            if line.strip():
+                yield json.loads(line), offset
+
+
+def main(force_flush=False):
+    t0 = time.perf_counter()
+    checkpoint = CONFIG["checkpoint_path"]
+    restored = bool(checkpoint) and os.path.exists(checkpoint)
+    if restored:
+        agg = load_checkpoint(checkpoint)
+        check_settings(agg, checkpoint)
+    else:
+        agg = SloAggregator(CONFIG["window_s"], CONFIG["lateness_s"],
+                            relative_accuracy=CONFIG["relative_accuracy"])
+    files = [p for name in CONFIG["datasets"] for p in dataset_files(CONFIG["input_dir"], name)]
+    if not files:
+        raise SystemExit(f"no {'/'.join(CONFIG['datasets'])} files in {CONFIG['input_dir']}; "
+                         "run gen_fintech_observability_data.py first")
+
+    out_dir = CONFIG["out_dir"]
+    os.makedirs(out_dir, exist_ok=True)
+    out_path = os.path.join(out_dir, OUTPUT_NAME)
+    rows = written = 0
+    with open(out_path, "a" if restored else "w", encoding="utf-8", newline="") as out:
+        def emit(slos):
+            out.write("".join(json.dumps(r, separators=(",", ":"), ensure_ascii=False) + "\n"
+                              for r in slos))
+            return len(slos)
+
+        for path in files:
+            if not checkpoint:
+                records = ((record, None) for record in read_records(path))
+            else:
+                key = os.path.abspath(path)
+                offset = resume_offset(path, agg.inputs.get(key), checkpoint)
+                records = unread_records(path, offset)
+            for record, offset in records:
+                rows += 1
+                done = agg.add(record)
+                if done:
+                    written += emit(done)
+            if checkpoint:
+                stamp = file_stamp(path)
+                if offset is None:
+                    offset = stamp["size"]
+                agg.inputs[key] = {"stamp": stamp, "offset": offset, "tail": tail_digest(path, offset)}
+        if force_flush or not checkpoint:
+            written += emit(agg.flush())
+        if checkpoint:
+            save_checkpoint(checkpoint, agg)
+
+    wall = time.perf_counter() - t0
+    print(f"{rows} KPI records -> {written} SLO records ({agg.late} late, {len(agg.windows)} windows "
+          f"still open) in {wall:.2f}s ({rows / wall if wall > 0 else 0:.0f} records/s); {out_path}")
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(
+        description="Aggregate flow_kpis into per-flow, per-window SLO records.")
+    p.add_argument("--input-dir", default=CONFIG["input_dir"],
+                   help="directory with the flow_kpis files")
+    p.add_argument("--out-dir", default=CONFIG["out_dir"],
+                   help="where derived_slos.jsonl goes")
+    p.add_argument("--window-s", type=int, default=CONFIG["window_s"],
+                   help="tumbling window length in seconds (0: each record's own window)")
+    p.add_argument("--lateness-s", type=int, default=CONFIG["lateness_s"],
+                   help="allowed lateness; windows finalize once the watermark passes their end")
+    p.add_argument("--checkpoint", default=CONFIG["checkpoint_path"],
+                   help="state file: restored before the run when it exists, saved after")
+    p.add_argument("--flush", action="store_true",
+                   help="with --checkpoint, finalize the open windows at the end anyway")
+    return p.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    CONFIG["input_dir"] = args.input_dir
+    CONFIG["out_dir"] = args.out_dir
+    CONFIG["window_s"] = args.window_s or None
+    CONFIG["lateness_s"] = args.lateness_s
+    CONFIG["checkpoint_path"] = args.checkpoint
+    main(args.flush)
@@ -0,0 +1,348 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from itertools import islice
+
+from faker import Faker
+
+import gen_fintech_data as fin
+import gen_fintech_observability_data as obs
+from gen_ids import IdFactory
+from gen_io import TEXT_BATCH_ROWS, JsonlEncoder, block_len, write_dataset
+from gen_pools import load_pools, value_sources
+
+try:
+    import resource
+except ImportError:  # Windows: peak RSS comes from psutil when installed
+    resource = None
+
+# Benchmarks every generator stage at several row counts and records wall
+# time, rows/sec, peak RSS and output bytes/sec. Each (stage, scale) runs in
+# a fresh process, so peak RSS belongs to that stage alone (setup included:
+# reference rows and the reused row chunk). Timings cover the stage itself,
+# not its setup.
+#
+#   python bench_generators.py                       # print results
+#   python bench_generators.py --save                # write the baseline
+#   python bench_generators.py --compare             # flag regressions
+#   python bench_generators.py --scales 1e4,1e7 --stages transactions,write
+#
+# --compare exits with status 1 when a stage's rows/sec dropped, or its peak
+# RSS grew, by more than the threshold against the baseline.
+
+# Config block: edit values here
+CONFIG = {
+    # 10_000_000 works too but takes minutes for the Faker-heavy stages
+    "scales": [10_000, 100_000, 1_000_000],
+    "stages": [
+        "reference", "transactions", "transactions_numpy", "disputes", "fx",
+        "bulletins", "provenance", "kpis", "alerts", "serialization", "write",
+    ],
+    "repeat": 1,  # runs per case; the fastest is kept
+    "value_pools": False,  # pooled Faker columns, as the generators' --value-pools
+    "serializer": "auto",
+    "write_format": "jsonl",
+    # rows generated once and reused by the disputes, serialization and
+    # write stages, so large scales do not hold every row in memory
+    "chunk_rows": 100_000,
+    "baseline": "./bench/baseline.json",
+    "threshold": 0.15,
+    "seed": 7,
+    "anchor_time": "2026-01-01T00:00:00Z",
+}
+
+
+def peak_rss_mb():
+    if resource is not None:
+        kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is KiB on Linux, bytes on macOS
+        return round(kb / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    try:
+        import psutil
+    except ImportError:
+        return None
+    info = psutil.Process().memory_info()
+    return round(getattr(info, "peak_wset", info.rss) / (1024 * 1024), 1)
+
+
+def cycle_rows(chunk, n):
+    # n rows taken from the chunk over and over
+    full, rest = divmod(n, len(chunk))
+    for _ in range(full):
+        yield from chunk
+    yield from chunk[:rest]
+
+
+class Context:
+    # seeded generator state and small reference sets shared by the stages
+    def __init__(self, cfg):
+        seed = cfg["seed"]
+        self.cfg = cfg
+        self.now = fin.anchor_now(cfg["anchor_time"])
+        self.rng = random.Random(seed)
+        Faker.seed(seed)
+        self.fake = Faker()
+        self.ids = IdFactory(fin.derive_seed(seed, "ids"), clock_ms=int(self.now.timestamp()) * 1000)
+        pool_cfg = dict(fin.CONFIG["value_pools"], enabled=cfg["value_pools"])
+        self.values = value_sources(fin.FAKER_PROVIDERS, load_pools(fin.FAKER_PROVIDERS, pool_cfg, seed),
+                                    self.rng, self.fake)
+        obs_pool_cfg = dict(obs.CONFIG["value_pools"], enabled=cfg["value_pools"])
+        self.obs_values = value_sources(obs.FAKER_PROVIDERS, load_pools(obs.FAKER_PROVIDERS, obs_pool_cfg, seed),
+                                        self.rng, self.fake)
+        vols = fin.CONFIG["volumes"]
+        store = fin.new_store("uuid4")
+        self.accounts, self.merchants = store["accounts"], store["merchants"]
+        for gen in (fin.gen_customers(self.rng, self.ids, self.values, self.now, vols["customers"],
+                                      table=store["customers"]),
+                    fin.gen_accounts(self.rng, self.ids, self.now, vols["accounts"],
+                                     store["customers"]["customer_id"], table=self.accounts),
+                    fin.gen_merchants(self.rng, self.ids, self.values, self.now, vols["merchants"],
+                                      table=self.merchants)):
+            for _ in gen:
+                pass
+        self.obs_start = self.now - timedelta(days=obs.CONFIG["volumes"]["days"])
+        self.trace_pool = obs.gen_trace_pool(self.ids, 1000)
+        self.flowfile_uuids = self.ids.take(2000)
+
+    def transactions(self, n):
+        return fin.gen_transactions(self.rng, self.ids, self.values, self.now, n, self.accounts,
+                                    self.merchants, fin.CURRENCIES)
+
+    def transaction_chunk(self, n):
+        return list(self.transactions(min(n, self.cfg["chunk_rows"])))
+
+
+# Each setup_* function prepares a stage for n rows and returns the timed
+# part: a zero-arg callable returning (rows, output bytes). Stages that only
+# generate rows report 0 bytes.
+def setup_reference(ctx, n):
+    def run():
+        k = n // 3
+        customers = list(fin.gen_customers(ctx.rng, ctx.ids, ctx.values, ctx.now, k))
+        accounts = sum(1 for _ in fin.gen_accounts(ctx.rng, ctx.ids, ctx.now, k,
+                                                   [r["customer_id"] for r in customers]))
+        merchants = sum(1 for _ in fin.gen_merchants(ctx.rng, ctx.ids, ctx.values, ctx.now, k))
+        return len(customers) + accounts + merchants, 0
+    return run
+
+
+def setup_transactions(ctx, n):
+    return lambda: (sum(1 for _ in ctx.transactions(n)), 0)
+
+
+def setup_transactions_numpy(ctx, n):
+    if fin.np is None:
+        return None
+    nrng = fin.np.random.default_rng(ctx.cfg["seed"])
+
+    def run():
+        blocks = fin.gen_transaction_blocks(nrng, ctx.ids, ctx.now, n, ctx.accounts, ctx.merchants,
+                                            fin.CURRENCIES, fin.CONFIG["batch_rows"])
+        return sum(block_len(b) for b in blocks), 0
+    return run
+
+
+def setup_disputes(ctx, n):
+    chunk = ctx.transaction_chunk(n)
+    return lambda: (sum(1 for _ in fin.gen_disputes(ctx.rng, ctx.ids, cycle_rows(chunk, n))), 0)
+
+
+def setup_fx(ctx, n):
+    quotes = fin.CONFIG["fx"]["quote_ccys"]
+    days = max(1, n // (len(quotes) - 1))
+    return lambda: (len(fin.gen_fx_rates(ctx.rng, ctx.now.date(), days, fin.CONFIG["fx"]["base_ccy"],
+                                         quotes)), 0)
+
+
+def setup_bulletins(ctx, n):
+    return lambda: (sum(1 for _ in obs.gen_bulletins(ctx.rng, ctx.ids, ctx.obs_values, ctx.obs_start,
+                                                     ctx.now, n, ctx.trace_pool)), 0)
+
+
+def setup_provenance(ctx, n):
+    return lambda: (sum(1 for _ in obs.gen_provenance(ctx.rng, ctx.ids, ctx.obs_start, ctx.now, n,
+                                                      ctx.flowfile_uuids, ctx.trace_pool)), 0)
+
+
+def setup_kpis(ctx, n):
+    return lambda: (sum(1 for _ in obs.gen_kpis(ctx.rng, ctx.obs_start, ctx.now, n)), 0)
+
+
+def setup_alerts(ctx, n):
+    return lambda: (sum(1 for _ in obs.gen_alerts(ctx.rng, ctx.ids, ctx.obs_start, ctx.now, n,
+                                                  ctx.trace_pool)), 0)
+
+
+def setup_serialization(ctx, n):
+    chunk = ctx.transaction_chunk(n)
+    encoder = JsonlEncoder(fin.TX_COLUMNS, fin.TX_COLUMN_KINDS, ctx.cfg["serializer"])
+
+    def run():
+        rows = cycle_rows(chunk, n)
+        size = 0
+        while True:
+            batch = list(islice(rows, TEXT_BATCH_ROWS))
+            if not batch:
+                return n, size
+            size += sum(len(line) for line in encoder.encode_rows(batch))
+    return run
+
+
+def setup_write(ctx, n):
+    chunk = ctx.transaction_chunk(n)
+    out_dir = tempfile.mkdtemp(prefix="bench-write-")
+
+    def run():
+        try:
+            parts = write_dataset(out_dir, "transactions", ctx.cfg["write_format"], fin.TX_COLUMNS,
+                                  cycle_rows(chunk, n), fin.CONFIG["columnar"], None,
+                                  fin.TIME_FIELDS["transactions"], fin.TX_COLUMN_KINDS, ctx.cfg["serializer"])
+            return sum(p["rows"] for p in parts), sum(p["bytes"] for p in parts)
+        finally:
+            shutil.rmtree(out_dir, ignore_errors=True)
+    return run
+
+
+STAGES = {
+    "reference": setup_reference,
+    "transactions": setup_transactions,
+    "transactions_numpy": setup_transactions_numpy,
+    "disputes": setup_disputes,
+    "fx": setup_fx,
+    "bulletins": setup_bulletins,
+    "provenance": setup_provenance,
+    "kpis": setup_kpis,
+    "alerts": setup_alerts,
+    "serialization": setup_serialization,
+    "write": setup_write,
+}
+
+
+def run_case(task):
+    stage, scale, cfg = task
+    run = STAGES[stage](Context(cfg), scale)
+    if run is None:
+        return None
+    t0 = time.perf_counter()
+    rows, size = run()
+    wall = time.perf_counter() - t0
+    return {
+        "stage": stage,
+        "scale": scale,
+        "rows": rows,
+        "wall_s": round(wall, 4),
+        "rows_per_s": round(rows / wall, 1) if wall > 0 else None,
+        "bytes": size,
+        "bytes_per_s": round(size / wall, 1) if wall > 0 and size else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_suite(cfg):
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    for scale in cfg["scales"]:
+        for stage in cfg["stages"]:
+            best = None
+            for _ in range(cfg["repeat"]):
+                with ctx.Pool(1) as pool:
+                    r = pool.apply(run_case, ((stage, scale, cfg),))
+                if r is None:
+                    break
+                if best is None or r["wall_s"] < best["wall_s"]:
+                    best = r
+            if best is None:
+                print(f"{stage:<20} {scale:>11,}  skipped (needs numpy)")
+                continue
+            print_result(best)
+            results.append(best)
+    return results
+
+
+def print_result(r, note=""):
+    mbps = f"{r['bytes_per_s'] / 1e6:8.1f} MB/s" if r["bytes_per_s"] else " " * 13
+    rss = f"{r['peak_rss_mb']:8.1f} MB" if r["peak_rss_mb"] is not None else " " * 11
+    print(f"{r['stage']:<20} {r['scale']:>11,}  {r['wall_s']:9.3f} s  {r['rows_per_s']:>12,.0f} rows/s"
+          f"  {mbps}  {rss}{note}")
+
+
+def compare(results, baseline, threshold):
+    # returns the regressions; prints every case with its change vs the baseline
+    base = {(r["stage"], r["scale"]): r for r in baseline["results"]}
+    flagged = []
+    print(f"\ncompared with the baseline from {baseline.get('created_at')} (threshold {threshold:.0%})")
+    for r in results:
+        b = base.get((r["stage"], r["scale"]))
+        if b is None:
+            print(f"{r['stage']:<20} {r['scale']:>11,}  not in the baseline")
+            continue
+        speed = r["rows_per_s"] / b["rows_per_s"] - 1
+        notes = [f"rows/s {speed:+.1%}"]
+        bad = speed < -threshold
+        if r["peak_rss_mb"] and b.get("peak_rss_mb"):
+            mem = r["peak_rss_mb"] / b["peak_rss_mb"] - 1
+            notes.append(f"peak RSS {mem:+.1%}")
+            bad = bad or mem > threshold
+        print(f"{r['stage']:<20} {r['scale']:>11,}  " + "  ".join(notes) + ("  REGRESSION" if bad else ""))
+        if bad:
+            flagged.append(r)
+    return flagged
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Benchmark the workshop data generators stage by stage.")
+    p.add_argument("--scales", default=",".join(str(s) for s in CONFIG["scales"]),
+                   help="comma-separated row counts (1e6 style accepted)")
+    p.add_argument("--stages", default=",".join(CONFIG["stages"]),
+                   help=f"comma-separated stages from: {', '.join(STAGES)}")
+    p.add_argument("--repeat", type=int, default=CONFIG["repeat"])
+    p.add_argument("--value-pools", action="store_true", default=CONFIG["value_pools"])
+    p.add_argument("--save", nargs="?", const=CONFIG["baseline"], metavar="PATH",
+                   help="write the results as the baseline (default %(const)s)")
+    p.add_argument("--compare", nargs="?", const=CONFIG["baseline"], metavar="PATH",
+                   help="compare with a saved baseline (default %(const)s)")
+    p.add_argument("--threshold", type=float, default=CONFIG["threshold"],
+                   help="relative slowdown / memory growth that counts as a regression")
+    return p.parse_args(argv)
+
+
+def main(args):
+    cfg = dict(CONFIG, scales=[int(float(s)) for s in args.scales.split(",")],
+               stages=args.stages.split(","), repeat=args.repeat, value_pools=args.value_pools)
+    unknown = [s for s in cfg["stages"] if s not in STAGES]
+    if unknown:
+        raise SystemExit(f"unknown stages {unknown}; expected some of {list(STAGES)}")
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    results = run_suite(cfg)
+    report = {
+        "bench_version": 1,
+        "created_at": fin.iso_utc(fin.utc_now()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": {k: cfg[k] for k in ("value_pools", "serializer", "write_format", "chunk_rows", "repeat")},
+        "results": results,
+    }
+    if args.save:
+        os.makedirs(os.path.dirname(args.save) or ".", exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nbaseline written to {args.save}")
+    if baseline is not None and compare(results, baseline, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,177 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from itertools import islice
+
+from gen_dedupe import MODES, classify, open_store, restore_store, snapshot
+from gen_io import dataset_files, file_format, open_source, read_header
+
+# Splits a transaction stream into unique and duplicate records by
+# idempotency_key, as Module 2's DetectDuplicate does (7-day age-off), with
+# a local store instead of the distributed map cache (see gen_dedupe).
+#
+# Every JSONL/CSV file of the dataset, including part and delta files, is
+# read in order (full output first, then each delta run) and each line is
+# copied as it is to out_dir/unique/<file>, out_dir/duplicate/<file> or,
+# without a key or event time, out_dir/failure/<file>. With --stdin, JSONL
+# lines come from standard input and unique ones go to standard output.
+#
+# With a state_path the store is restored from it before the run (when it
+# exists) and snapshotted after, so a later run over new files, e.g. the
+# next delta, still catches replays of keys from earlier ones.
+#
+#   python dedupe_transactions.py
+#   python dedupe_transactions.py --mode bloom --fp-rate 0.0001 --state ./data/deduped/dedupe.state
+#   python enrich_transactions.py && cat data/enriched/transactions.jsonl | python dedupe_transactions.py --stdin
+
+# Config block: edit values here
+CONFIG = {
+    "input_dir": "./data/enriched",
+    "dataset": "transactions",
+    "out_dir": "./data/deduped",
+    "key_field": "idempotency_key",
+    "time_field": "event_time",
+    "dedupe": {
+        # "exact" (hashed keys, exact age-off) or "bloom" (fp_rate false
+        # duplicates, age-off in ttl_days / slices steps)
+        "mode": "exact",
+        "ttl_days": 7,
+        # how far behind the latest event_time a record may arrive and still
+        # be checked; entries older than ttl + lateness are dropped. None
+        # keeps every key: the generated files are not in event-time order
+        "lateness_days": None,
+        # live keys expected within one ttl window; sizes the table / filters
+        "capacity": 1_000_000,
+        "fp_rate": 0.001,
+        "slices": 7,
+    },
+    # restored before the run when it exists, snapshotted after; None keeps
+    # the state in memory only
+    "state_path": None,
+    "batch_lines": 10_000,
+}
+
+KINDS = ("unique", "duplicate", "failure")
+
+
+def run_lines(store, lines, fmt, header, outs, counts):
+    # classifies raw lines batch by batch and appends each to its output
+    batch_lines = CONFIG["batch_lines"]
+    while True:
+        batch = [line for line in islice(lines, batch_lines) if line.strip()]
+        if not batch:
+            return
+        buckets = {kind: [] for kind in KINDS}
+        for line, kind in zip(batch, classify(store, batch, fmt, header, CONFIG["key_field"],
+                                              CONFIG["time_field"])):
+            buckets[kind].append(line if line.endswith(b"\n") else line + b"\n")
+        for kind, out in buckets.items():
+            if out:
+                outs[kind].write(b"".join(out))
+                counts[kind] += len(out)
+
+
+def main(from_stdin=False):
+    t0 = time.perf_counter()
+    state_path = CONFIG["state_path"]
+    restored = bool(state_path) and os.path.exists(state_path)
+    if restored:
+        store = restore_store(state_path)
+        if store.mode != CONFIG["dedupe"]["mode"]:
+            print(f"{state_path} holds a {store.mode} store; using it over mode={CONFIG['dedupe']['mode']}",
+                  file=sys.stderr)
+    else:
+        store = open_store(CONFIG["dedupe"])
+
+    out_dir = CONFIG["out_dir"]
+    for kind in KINDS:
+        shutil.rmtree(os.path.join(out_dir, kind), ignore_errors=True)
+        os.makedirs(os.path.join(out_dir, kind))
+    counts = dict.fromkeys(KINDS, 0)
+    files = []
+    if from_stdin:
+        outs = {"unique": sys.stdout.buffer}
+        for kind in ("duplicate", "failure"):
+            outs[kind] = open(os.path.join(out_dir, kind, "stdin.jsonl"), "wb")
+        run_lines(store, iter(sys.stdin.buffer.readline, b""), "jsonl", None, outs, counts)
+        sys.stdout.buffer.flush()
+        for kind in ("duplicate", "failure"):
+            outs[kind].close()
+    else:
+        for path in dataset_files(CONFIG["input_dir"], CONFIG["dataset"]):
+            if (file_format(path) or (None,))[0] in ("jsonl", "csv"):
+                files.append(path)
+            else:
+                print(f"skipping {path} (only jsonl/csv files are deduplicated)")
+        if not files:
+            raise SystemExit(f"no jsonl/csv {CONFIG['dataset']} files in {CONFIG['input_dir']}; "
+                             "run enrich_transactions.py (or point --input-dir at ./data/raw)")
+        for path in files:
+            fmt, compression = file_format(path)
+            name = os.path.basename(path)
+            if compression:
+                name = os.path.splitext(name)[0]
+            header = read_header(path, compression) if fmt == "csv" else None
+            with open_source(path, compression) as f:
+                head = f.readline() if fmt == "csv" else b""
+                outs = {kind: open(os.path.join(out_dir, kind, name), "wb") for kind in KINDS}
+                for out in outs.values():
+                    out.write(head)
+                run_lines(store, iter(f.readline, b""), fmt, header, outs, counts)
+                for out in outs.values():
+                    out.close()
+
+    if state_path:
+        snapshot(store, state_path)
+    wall = time.perf_counter() - t0
+    rows = sum(counts.values())
+    report = {"files": files or ["<stdin>"], "rows": rows, **counts, "mode": store.mode,
+              "ttl_s": store.ttl_s, "watermark": store.watermark, "restored": restored,
+              "state_path": state_path, "store": store.stats(), "wall_s": round(wall, 3)}
+    with open(os.path.join(out_dir, "report.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"{CONFIG['dataset']}: {rows} rows, {counts['unique']} unique, {counts['duplicate']} duplicate, "
+          f"{counts['failure']} failure ({store.mode} store, {report['store']['bytes'] / 1e6:.1f} MB)",
+          file=sys.stderr if from_stdin else sys.stdout)
+    print(f"deduplicated {rows} rows in {wall:.1f}s ({rows / wall if wall > 0 else 0:.0f} rows/s); "
+          f"output in {out_dir}", file=sys.stderr if from_stdin else sys.stdout)
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(
+        description="Split transactions into unique and duplicate records by idempotency_key.")
+    p.add_argument("--input-dir", default=CONFIG["input_dir"],
+                   help="directory with the transactions files")
+    p.add_argument("--out-dir", default=CONFIG["out_dir"],
+                   help="where unique/, duplicate/, failure/ and report.json go")
+    p.add_argument("--stdin", action="store_true",
+                   help="read JSONL from standard input and write unique lines to standard output")
+    p.add_argument("--mode", choices=MODES, default=CONFIG["dedupe"]["mode"],
+                   help="exact: hashed keys; bloom: time-sliced Bloom filters")
+    p.add_argument("--ttl-days", type=float, default=CONFIG["dedupe"]["ttl_days"],
+                   help="age-off, in days of event time")
+    p.add_argument("--lateness-days", type=float, default=CONFIG["dedupe"]["lateness_days"],
+                   help="bound on out-of-order arrival; lets old keys age out of memory")
+    p.add_argument("--capacity", type=int, default=CONFIG["dedupe"]["capacity"],
+                   help="live keys expected within one ttl window")
+    p.add_argument("--fp-rate", type=float, default=CONFIG["dedupe"]["fp_rate"],
+                   help="bloom mode: share of new keys that may be reported as duplicates")
+    p.add_argument("--state", default=CONFIG["state_path"],
+                   help="snapshot file: restored before the run when it exists, written after")
+    return p.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    CONFIG["input_dir"] = args.input_dir
+    CONFIG["out_dir"] = args.out_dir
+    CONFIG["dedupe"]["mode"] = args.mode
+    CONFIG["dedupe"]["ttl_days"] = args.ttl_days
+    CONFIG["dedupe"]["lateness_days"] = args.lateness_days
+    CONFIG["dedupe"]["capacity"] = args.capacity
+    CONFIG["dedupe"]["fp_rate"] = args.fp_rate
+    CONFIG["state_path"] = args.state
+    main(args.stdin)
@@ -0,0 +1,210 @@
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+from itertools import islice
+
+from gen_enrich import UNMATCHED_REASONS, FxIndex, encode_csv, encode_jsonl, enrich, merchant_index
+from gen_io import chunk_ranges, concat, dataset_files, file_format, open_source, read_chunk, read_header
+from gen_validate import parse_lines
+
+# Fills amount_base, fx_rate, base_currency and merchant_risk_tier on the raw
+# transactions, as the Module 2 enrichment flow does, as a reference for the
+# NiFi output and fast enough for hundreds of millions of rows.
+#
+# The merchant and FX indexes are built once (see gen_enrich) and inherited
+# by a process pool; every JSONL/CSV file of the dataset, including part and
+# delta files, is split into byte-range chunks that workers enrich
+# batch_lines at a time, so memory stays at the indexes plus one batch per
+# worker whatever the input size. Matched records keep their file name and
+# format under out_dir; the rest go to out_dir/enrichment_unmatched.jsonl in
+# the Module 2 quarantine envelope:
+#
+#   {"ingest_time": ..., "source_file": ..., "source_offset": <byte offset
+#    of the line>, "reason": "merchant_unmatched" | "fx_unmatched" | ...,
+#    "raw": <the record, or the line when it does not parse>}
+#
+# out_dir/report.json has the counts per reason and how many rates came
+# from the as-of fallback.
+#
+#   python enrich_transactions.py
+#   python enrich_transactions.py --fx-lookup exact --workers 8
+
+# Config block: edit values here
+CONFIG = {
+    "input_dir": "./data/raw",
+    "dataset": "transactions",
+    "reference_dir": "./data/reference",
+    "out_dir": "./data/enriched",
+    # "asof": a date without a rate takes the currency's latest earlier rate
+    # (at most fx_max_lag_days older; None = any age); "exact" only matches
+    # rate_date|quote_ccy, like the Module 2 LookupRecord
+    "fx_lookup": "asof",
+    "fx_max_lag_days": None,
+    "workers": os.cpu_count() or 1,
+    "chunk_mb": 64,
+    "batch_lines": 10_000,
+}
+
+UNMATCHED_NAME = "enrichment_unmatched.jsonl"
+
+_WORKER = {}
+
+
+def _init_worker(merchants, fx, ingest_time, batch_lines):
+    _WORKER.update(merchants=merchants, fx=fx, ingest_time=ingest_time, batch_lines=batch_lines)
+
+
+def enrich_chunk(task):
+    path, fmt, compression, start, end, header, tmp_prefix = task
+    merchants, fx = _WORKER["merchants"], _WORKER["fx"]
+    envelope = {"ingest_time": _WORKER["ingest_time"], "source_file": os.path.basename(path)}
+    rows = filled = 0
+    reasons = dict.fromkeys(UNMATCHED_REASONS, 0)
+    with open_source(path, compression) as f, open(tmp_prefix + ".matched", "wb") as matched_f, \
+            open(tmp_prefix + ".unmatched", "wb") as unmatched_f:
+        lines = read_chunk(f, start, end if compression is None else None)
+        if fmt == "csv" and start == 0:
+            next(lines, None)
+        batch_lines = _WORKER["batch_lines"]
+        while True:
+            batch = list(islice(lines, batch_lines))
+            if not batch:
+                break
+            batch = [(pos, line) for pos, line in batch if line.strip()]
+            matched, unmatched = [], []
+            parsed = parse_lines([line for _, line in batch], fmt, header)
+            for (pos, line), (record, parse_error) in zip(batch, parsed):
+                rows += 1
+                if record is None:
+                    reason = "parse_error"
+                else:
+                    # enrich() leaves an unmatched record as it was read
+                    reason, from_asof = enrich(record, merchants, fx)
+                    if reason is None:
+                        matched.append(record)
+                        filled += from_asof
+                        continue
+                reasons[reason] += 1
+                raw = record if fmt == "jsonl" and record is not None else \
+                    line.decode("utf-8", "replace").rstrip("\r\n")
+                unmatched.append(json.dumps(dict(envelope, source_offset=pos, reason=reason, raw=raw),
+                                            separators=(",", ":"), ensure_ascii=False) + "\n")
+            if matched:
+                matched_f.write(encode_jsonl(matched) if fmt == "jsonl" else encode_csv(matched, header))
+            if unmatched:
+                unmatched_f.write("".join(unmatched).encode("utf-8"))
+    return {"path": path, "rows": rows, "fx_asof": filled, "unmatched": reasons, "tmp_prefix": tmp_prefix}
+
+
+def plan_tasks(files, tmp_dir, chunk_bytes):
+    tasks = []
+    for fi, path in enumerate(files):
+        fmt, compression = file_format(path)
+        header = read_header(path, compression) if fmt == "csv" else None
+        ranges = chunk_ranges(path, chunk_bytes) if compression is None else [(0, None)]
+        for ci, (start, end) in enumerate(ranges):
+            tasks.append((path, fmt, compression, start, end, header,
+                          os.path.join(tmp_dir, f"{fi:05d}-{ci:05d}")))
+    return tasks
+
+
+def main():
+    t0 = time.perf_counter()
+    if CONFIG["fx_lookup"] not in ("asof", "exact"):
+        raise SystemExit(f"unknown fx_lookup {CONFIG['fx_lookup']!r}; expected 'asof' or 'exact'")
+    dataset = CONFIG["dataset"]
+    files = []
+    for path in dataset_files(CONFIG["input_dir"], dataset):
+        if (file_format(path) or (None,))[0] in ("jsonl", "csv"):
+            files.append(path)
+        else:
+            print(f"skipping {path} (only jsonl/csv files are enriched)")
+    if not files:
+        raise SystemExit(f"no jsonl/csv {dataset} files in {CONFIG['input_dir']}; run gen_fintech_data.py first")
+
+    merchants = merchant_index(CONFIG["reference_dir"])
+    fx = FxIndex.load(CONFIG["reference_dir"], asof=CONFIG["fx_lookup"] == "asof",
+                      max_lag_days=CONFIG["fx_max_lag_days"])
+    t_index = time.perf_counter() - t0
+
+    out_dir = CONFIG["out_dir"]
+    os.makedirs(out_dir, exist_ok=True)
+    for path in dataset_files(out_dir, dataset):
+        os.remove(path)
+    tmp_dir = os.path.join(out_dir, ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    ingest_time = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    tasks = plan_tasks(files, tmp_dir, int(CONFIG["chunk_mb"] * 1024 * 1024))
+    with multiprocessing.Pool(CONFIG["workers"], initializer=_init_worker,
+                              initargs=(merchants, fx, ingest_time, CONFIG["batch_lines"])) as pool:
+        results = list(pool.imap(enrich_chunk, tasks))
+
+    # chunk outputs joined in file/chunk order
+    by_file = {}
+    for r in results:
+        by_file.setdefault(r["path"], []).append(r)
+    for path, rs in by_file.items():
+        fmt, compression = file_format(path)
+        name = os.path.basename(path)
+        if compression:
+            name = os.path.splitext(name)[0]
+        head = b""
+        if fmt == "csv":
+            with open_source(path, compression) as f:
+                head = f.readline()
+        concat(os.path.join(out_dir, name), [r["tmp_prefix"] + ".matched" for r in rs], head)
+    concat(os.path.join(out_dir, UNMATCHED_NAME), [r["tmp_prefix"] + ".unmatched" for r in results])
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    rows = sum(r["rows"] for r in results)
+    reasons = {k: sum(r["unmatched"][k] for r in results) for k in UNMATCHED_REASONS}
+    unmatched = sum(reasons.values())
+    wall = time.perf_counter() - t0
+    report = {
+        "ingest_time": ingest_time, "files": files, "rows": rows, "matched": rows - unmatched,
+        "unmatched": unmatched, "reasons": reasons, "fx_asof": sum(r["fx_asof"] for r in results),
+        "fx_lookup": CONFIG["fx_lookup"], "fx_max_lag_days": CONFIG["fx_max_lag_days"],
+        "merchants": len(merchants), "fx_rates": len(fx.exact),
+        "index_s": round(t_index, 3), "wall_s": round(wall, 3),
+    }
+    with open(os.path.join(out_dir, "report.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    top = ", ".join(f"{k} ({v})" for k, v in reasons.items() if v)
+    print(f"{dataset}: {rows} rows, {rows - unmatched} matched ({report['fx_asof']} as-of fx), "
+          f"{unmatched} unmatched" + (f"; {top}" if top else ""))
+    print(f"enriched {rows} rows in {wall:.1f}s ({rows / wall if wall > 0 else 0:.0f} rows/s, "
+          f"{CONFIG['workers']} workers); output in {out_dir}")
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(
+        description="Enrich the raw transactions with merchant risk tier and FX conversion.")
+    p.add_argument("--input-dir", default=CONFIG["input_dir"],
+                   help="directory with the transactions files")
+    p.add_argument("--out-dir", default=CONFIG["out_dir"],
+                   help="where the enriched files, the unmatched file and report.json go")
+    p.add_argument("--fx-lookup", choices=["asof", "exact"], default=CONFIG["fx_lookup"],
+                   help="asof: use the latest earlier rate for dates without one; exact: date match only")
+    p.add_argument("--fx-max-lag-days", type=int, default=CONFIG["fx_max_lag_days"],
+                   help="oldest rate (in days) the as-of lookup may use")
+    p.add_argument("--workers", type=int, default=CONFIG["workers"],
+                   help="enrichment processes")
+    p.add_argument("--chunk-mb", type=float, default=CONFIG["chunk_mb"],
+                   help="size of the byte-range chunk each task enriches")
+    return p.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    CONFIG["input_dir"] = args.input_dir
+    CONFIG["out_dir"] = args.out_dir
+    CONFIG["fx_lookup"] = args.fx_lookup
+    CONFIG["fx_max_lag_days"] = args.fx_max_lag_days
+    CONFIG["workers"] = args.workers
+    CONFIG["chunk_mb"] = args.chunk_mb
+    main()
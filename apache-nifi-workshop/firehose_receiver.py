@@ -0,0 +1,62 @@
+import argparse
+import asyncio
+import time
+
+from gen_firehose import Receiver
+
+# Stand-in for NiFi ListenHTTP / ListenTCP when load-testing the firehose
+# (python gen_fintech_data.py --emit http|tcp): accepts the same traffic,
+# counts events per dataset and prints the received rate:
+#
+#   python firehose_receiver.py
+#   python firehose_receiver.py --host 0.0.0.0 --http-port 8081 --report-every-s 1
+
+# Config block: edit values here
+CONFIG = {
+    "host": "127.0.0.1",
+    "http_port": 8081,
+    "tcp_ports": {"transactions": 9301, "disputes": 9302},
+    "report_every_s": 5,
+}
+
+
+async def serve():
+    receiver = Receiver(CONFIG["host"], CONFIG["http_port"], CONFIG["tcp_ports"])
+    await receiver.start()
+    print(f"listening on http://{CONFIG['host']}:{CONFIG['http_port']}/ and tcp ports "
+          + ", ".join(f"{port} ({name})" for name, port in CONFIG["tcp_ports"].items()))
+    last, last_counts = time.monotonic(), {}
+    while True:
+        await asyncio.sleep(CONFIG["report_every_s"])
+        now = time.monotonic()
+        counts = dict(receiver.counts)
+        print("  ".join(f"{name} {n} ({(n - last_counts.get(name, 0)) / (now - last):.0f}/s)"
+                        for name, n in sorted(counts.items())) or "no events yet", flush=True)
+        last, last_counts = now, counts
+
+
+def main():
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(
+        description="Accept firehose traffic (HTTP and TCP) and print the received rate per dataset.")
+    p.add_argument("--host", default=CONFIG["host"],
+                   help="address to listen on")
+    p.add_argument("--http-port", type=int, default=CONFIG["http_port"],
+                   help="ListenHTTP stand-in port")
+    p.add_argument("--report-every-s", type=float, default=CONFIG["report_every_s"],
+                   help="seconds between rate reports")
+    return p.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    CONFIG["host"] = args.host
+    CONFIG["http_port"] = args.http_port
+    CONFIG["report_every_s"] = args.report_every_s
+    main()
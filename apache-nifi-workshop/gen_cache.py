@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import shutil
+
+from gen_io import PARTITION_INDEX_NAME, remove_dataset_outputs, write_manifest
+
+# Content-addressed cache of generated datasets, so a run only rebuilds
+# what its CONFIG change actually affects.
+#
+# A generator splits its run into stages (one per dataset, or a few files
+# written together) and gives each a key: the hash of the generator version,
+# the seed and the CONFIG slice the stage reads. Datasets drawn from the
+# same RNG/ID streams also chain the previous stage's key into theirs, since
+# their bytes depend on everything drawn before them (accounts ->
+# transactions -> disputes follows from that).
+#
+# An entry is a directory <cache_dir>/<key>/ holding the stage's files (by
+# output role: raw, reference, contracts, ...) and entry.json with the
+# stage's metadata and the generator state after the stage. Entries are
+# written under a temp name and renamed into place, so a half-written one is
+# never seen. Files go in and come back out by hardlink (copy across
+# filesystems or with link "copy"), so a cached run costs a few directory
+# operations per file. The generators replace their output files rather
+# than rewriting them in place, so a hardlinked output never writes through
+# to the cache.
+#
+# put_datasets()/restore_datasets() handle the common case of a stage that
+# writes gen_io datasets: the entry records each dataset's part stats (and
+# keeps a partitioned dataset's layout and partition index), and a restore
+# first drops the dataset's current outputs (any format or layout) and
+# re-records it in manifest.json when the run keeps one.
+#
+# resume() returns the entries of the longest cached prefix of the stages:
+# those are restored, the generator state of the last one is loaded, and
+# the run carries on from the first stage that missed. Delete cache_dir to
+# drop every entry.
+
+CACHE_VERSION = "1.0"
+ENTRY_NAME = "entry.json"
+LINK_MODES = ("hardlink", "copy")
+
+
+def code_version(version, paths):
+    # generator version plus a digest of its source files, so editing the
+    # generator invalidates its entries too
+    h = hashlib.sha256(version.encode("utf-8"))
+    for path in sorted(paths):
+        with open(path, "rb") as f:
+            h.update(os.path.basename(path).encode("utf-8") + b"\0" + f.read())
+    return f"{version}+{h.hexdigest()[:16]}"
+
+
+def cache_key(*parts):
+    blob = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:32]
+
+
+def place(src, dst, link):
+    # dst becomes src's content: a hardlink when allowed and possible, else a copy
+    if os.path.lexists(dst):
+        os.remove(dst)
+    if link == "hardlink":
+        try:
+            os.link(src, dst)
+            return "linked"
+        except OSError:
+            pass
+    shutil.copy2(src, dst)
+    return "copied"
+
+
+class DatasetCache:
+    def __init__(self, cache_dir, link="hardlink"):
+        if link not in LINK_MODES:
+            raise ValueError(f"unknown cache link mode {link!r}; expected one of {LINK_MODES}")
+        self.cache_dir = cache_dir
+        self.link = link
+        self.counts = {"hit": 0, "miss": 0, "linked": 0, "copied": 0}
+
+    def get(self, key):
+        # the entry for key, or None when missing, stale or incomplete
+        path = os.path.join(self.cache_dir, key, ENTRY_NAME)
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("cache_version") != CACHE_VERSION or entry.get("key") != key:
+            return None
+        for role, name in entry["files"]:
+            if not os.path.exists(os.path.join(self.cache_dir, key, role, name)):
+                return None
+        return entry
+
+    def resume(self, stages, keys):
+        # stage -> entry for the longest run of cached stages from the start
+        hits = {}
+        for stage in stages:
+            entry = self.get(keys[stage])
+            if entry is None:
+                break
+            hits[stage] = entry
+        return hits
+
+    def restore(self, entry, dirs):
+        # places the entry's files into dirs (role -> output directory)
+        for role, name in entry["files"]:
+            dst = os.path.join(dirs[role], name)
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            how = place(os.path.join(self.cache_dir, entry["key"], role, name), dst, self.link)
+            self.counts[how] += 1
+        self.counts["hit"] += 1
+        return entry
+
+    def put(self, key, stage, files, meta=None, state=None):
+        # files: [(role, path)] just written by the stage, or [(role, path,
+        # name)] with name the "/"-separated path under the role's directory
+        self.counts["miss"] += 1
+        final = os.path.join(self.cache_dir, key)
+        tmp = os.path.join(self.cache_dir, f".{key}.tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        entry_files = []
+        for role, path, *name in files:
+            name = name[0] if name else os.path.basename(path)
+            dst = os.path.join(tmp, role, *name.split("/"))
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            place(path, dst, self.link)
+            entry_files.append([role, name])
+        os.makedirs(tmp, exist_ok=True)
+        with open(os.path.join(tmp, ENTRY_NAME), "w", encoding="utf-8") as f:
+            json.dump({"cache_version": CACHE_VERSION, "key": key, "stage": stage, "files": entry_files,
+                       "meta": meta or {}, "state": state}, f, separators=(",", ":"), default=json_default)
+        shutil.rmtree(final, ignore_errors=True)
+        os.replace(tmp, final)
+
+    def put_datasets(self, key, stage, dirs, datasets, state=None, extra_files=()):
+        # datasets: [(name, role, fmt, time_field, parts config, part stats)]
+        files = [(role, os.path.join(dirs[role], p["path"]), p["path"])
+                 for _, role, _, _, _, parts in datasets for p in parts]
+        for name, role, _, _, _, _ in datasets:
+            index = os.path.join(dirs[role], name, PARTITION_INDEX_NAME)
+            if os.path.exists(index):
+                files.append((role, index, f"{name}/{PARTITION_INDEX_NAME}"))
+        meta = {"datasets": [{"name": name, "role": role, "format": fmt, "time_field": time_field,
+                              "parts_cfg": parts_cfg, "parts": parts}
+                             for name, role, fmt, time_field, parts_cfg, parts in datasets]}
+        self.put(key, stage, files + list(extra_files), meta, state)
+
+    def restore_datasets(self, entry, dirs):
+        # the entry's datasets in place of their current outputs; returns
+        # name -> part stats
+        datasets = entry["meta"]["datasets"]
+        for d in datasets:
+            remove_dataset_outputs(dirs[d["role"]], d["name"])
+        self.restore(entry, dirs)
+        for d in datasets:
+            if d["parts_cfg"] and d["parts_cfg"].get("manifest"):
+                write_manifest(dirs[d["role"]], d["name"], d["format"], d["parts_cfg"], d["parts"],
+                               d["time_field"])
+        return {d["name"]: d["parts"] for d in datasets}
+
+    def summary(self):
+        c = self.counts
+        return (f"dataset cache {self.cache_dir}: {c['hit']} stages reused, {c['miss']} rebuilt "
+                f"({c['linked']} files linked, {c['copied']} copied)")
+
+
+def json_default(value):
+    # numpy scalars (numpy engine samples) as plain numbers
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
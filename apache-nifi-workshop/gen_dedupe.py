@@ -0,0 +1,293 @@
+import hashlib
+import json
+import math
+import sys
+from array import array
+
+from gen_io import atomic_write, parse_epoch
+from gen_validate import parse_lines
+
+# Idempotency-key dedupe stores, the offline stand-in for Module 2's
+# DetectDuplicate (idempotency_key, 7-day age-off).
+#
+# Keys are hashed to 64 bits (blake2b), so a store never holds the key
+# strings, and age-off follows event time rather than the wall clock: a
+# record is a duplicate when its key was stored for an event less than
+# ttl_s away from its own. The generated files are not in event-time order,
+# so memory is only reclaimed with a lateness_s bound: entries more than
+# ttl_s + lateness_s behind the watermark (the latest event_time seen) are
+# dropped, and a record later than that is never a duplicate. With
+# lateness_s None nothing ages out of memory. Two modes:
+#
+#   exact  open-addressing table (linear probing) of key hashes and event
+#          epoch seconds in two flat arrays, 12 bytes a slot at most
+#          MAX_LOAD full. Reclaimable slots are reused by new keys and
+#          dropped when the table grows. Two different keys collide in 64
+#          bits with probability ~n^2 / 2^65 (about 3e-4 at 100M keys).
+#   bloom  one Bloom filter per time slice (ttl_s / slices seconds); a key
+#          is checked against the slices within ttl_s of its event and
+#          added to its event's slice, so age-off is rounded to whole
+#          slices. Sized from capacity (keys per ttl window) and fp_rate,
+#          the chance that a new key is reported as a duplicate; it never
+#          misses a real one.
+#
+# seen(key, epoch_s) returns True for a duplicate and otherwise records the
+# key; classify() runs a batch of raw JSONL/CSV lines through a store. snapshot(path) writes one file, a JSON header line followed by the
+# raw arrays, and restore_store(path) reads it back, so the dedupe state
+# survives restarts:
+#
+#   {"dedupe_state_version": "1.0", "mode": "exact", "ttl_s": 604800,
+#    "lateness_s": null, "watermark": 1767225600, ...,
+#    "arrays": [["keys", "Q", 2097152], ...]}
+
+DEDUPE_STATE_VERSION = "1.0"
+MODES = ("exact", "bloom")
+MAX_LOAD = 0.7
+EMPTY = 0
+
+
+def key_hash(key):
+    # 64-bit key hash; 0 marks an empty slot, so it maps to 1
+    h = int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+    return h or 1
+
+
+def _table_size(keys):
+    size = 1024
+    while size * MAX_LOAD < keys:
+        size *= 2
+    return size
+
+
+def _horizon(store):
+    # event time before which entries are reclaimed (-1: never)
+    if store.lateness_s is None:
+        return -1
+    return store.watermark - store.ttl_s - store.lateness_s
+
+
+class ExactStore:
+    mode = "exact"
+
+    def __init__(self, ttl_s, capacity=1_000_000, lateness_s=None):
+        self.ttl_s = ttl_s
+        self.lateness_s = lateness_s
+        self.watermark = 0
+        self._alloc(_table_size(capacity))
+
+    def _alloc(self, size):
+        self.keys = array("Q", [EMPTY]) * size
+        self.times = array("I", [0]) * size
+        self.mask = size - 1
+        self.used = 0
+        self.limit = int(size * MAX_LOAD)
+
+    def stats(self):
+        # one pass over the table; for reports, not the hot path
+        cutoff = _horizon(self)
+        live = sum(1 for k, t in zip(self.keys, self.times) if k != EMPTY and t >= cutoff)
+        return {"slots": len(self.keys), "used": self.used, "live_keys": live,
+                "bytes": len(self.keys) * (self.keys.itemsize + self.times.itemsize)}
+
+    def seen(self, key, t):
+        h = key_hash(key)
+        if t > self.watermark:
+            self.watermark = t
+        cutoff = _horizon(self)
+        if t < cutoff:
+            return False
+        keys, times, mask = self.keys, self.times, self.mask
+        i = h & mask
+        free = -1
+        while True:
+            k = keys[i]
+            if k == h:
+                if abs(t - times[i]) <= self.ttl_s:
+                    return True
+                # aged off: this event starts a new window for the key
+                times[i] = t
+                return False
+            if k == EMPTY:
+                break
+            if free < 0 and times[i] < cutoff:
+                free = i
+            i = (i + 1) & mask
+        if free >= 0:
+            # the chain stays intact: the expired slot only changes owner
+            keys[free] = h
+            times[free] = t
+            return False
+        keys[i] = h
+        times[i] = t
+        self.used += 1
+        if self.used > self.limit:
+            self._grow()
+        return False
+
+    def _grow(self):
+        cutoff = _horizon(self)
+        live = [(k, t) for k, t in zip(self.keys, self.times) if k != EMPTY and t >= cutoff]
+        self._alloc(_table_size(2 * len(live)))
+        keys, times, mask = self.keys, self.times, self.mask
+        for k, t in live:
+            i = k & mask
+            while keys[i] != EMPTY:
+                i = (i + 1) & mask
+            keys[i] = k
+            times[i] = t
+        self.used = len(live)
+
+    def header(self):
+        return {"ttl_s": self.ttl_s, "lateness_s": self.lateness_s, "watermark": self.watermark,
+                "used": self.used}
+
+    def arrays(self):
+        return [("keys", self.keys), ("times", self.times)]
+
+    def load(self, header, arrays):
+        self.watermark = header["watermark"]
+        self.keys, self.times = arrays["keys"], arrays["times"]
+        self.mask = len(self.keys) - 1
+        self.used = header["used"]
+        self.limit = int(len(self.keys) * MAX_LOAD)
+
+
+class BloomStore:
+    mode = "bloom"
+
+    def __init__(self, ttl_s, capacity=1_000_000, fp_rate=0.001, slices=7, lateness_s=None):
+        self.ttl_s = ttl_s
+        self.lateness_s = lateness_s
+        self.slice_s = max(1, -(-ttl_s // slices))
+        self.slices = slices
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        # a lookup checks up to 2 * slices + 1 filters, each sized for its
+        # share of the keys and of the false-positive budget
+        n = max(1, capacity // slices)
+        p = fp_rate / (2 * slices + 1)
+        self.bits = max(64, int(-n * math.log(p) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / n * math.log(2)))
+        self.watermark = 0
+        self.filters = {}
+
+    def stats(self):
+        return {"slices": len(self.filters), "bits_per_slice": self.bits, "hashes": self.hashes,
+                "bytes": sum(len(b) for b in self.filters.values())}
+
+    def _positions(self, key):
+        # double hashing: k (byte, bit mask) positions from two 64-bit
+        # halves of one digest
+        d = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        m = self.bits
+        h1, h2 = int.from_bytes(d[:8], "little") % m, int.from_bytes(d[8:], "little") % m or 1
+        positions = []
+        for _ in range(self.hashes):
+            positions.append((h1 >> 3, 1 << (h1 & 7)))
+            h1 = (h1 + h2) % m
+        return positions
+
+    def seen(self, key, t):
+        if t > self.watermark:
+            self.watermark = t
+            if self.lateness_s is not None:
+                oldest = _horizon(self) // self.slice_s
+                for s in [s for s in self.filters if s < oldest]:
+                    del self.filters[s]
+        if t < _horizon(self):
+            return False
+        positions = self._positions(key)
+        lo, hi = (t - self.ttl_s) // self.slice_s, (t + self.ttl_s) // self.slice_s
+        for s, bits in self.filters.items():
+            if lo <= s <= hi:
+                for byte, mask in positions:
+                    if not bits[byte] & mask:
+                        break
+                else:
+                    return True
+        s = t // self.slice_s
+        bits = self.filters.get(s)
+        if bits is None:
+            bits = self.filters[s] = bytearray(-(-self.bits // 8))
+        for byte, mask in positions:
+            bits[byte] |= mask
+        return False
+
+    def header(self):
+        return {"ttl_s": self.ttl_s, "lateness_s": self.lateness_s, "watermark": self.watermark,
+                "capacity": self.capacity,
+                "fp_rate": self.fp_rate, "slices": self.slices, "filters": sorted(self.filters)}
+
+    def arrays(self):
+        return [(f"slice-{s}", self.filters[s]) for s in sorted(self.filters)]
+
+    def load(self, header, arrays):
+        self.watermark = header["watermark"]
+        self.filters = {s: arrays[f"slice-{s}"] for s in header["filters"]}
+
+
+def open_store(cfg):
+    # cfg: {"mode", "ttl_days", "lateness_days", "capacity", "fp_rate", "slices"}
+    ttl_s = int(cfg["ttl_days"] * 86400)
+    lateness_s = None if cfg["lateness_days"] is None else int(cfg["lateness_days"] * 86400)
+    if cfg["mode"] == "exact":
+        return ExactStore(ttl_s, cfg["capacity"], lateness_s)
+    if cfg["mode"] == "bloom":
+        return BloomStore(ttl_s, cfg["capacity"], cfg["fp_rate"], cfg["slices"], lateness_s)
+    raise ValueError(f"unknown dedupe mode {cfg['mode']!r}; expected one of {MODES}")
+
+
+def snapshot(store, path):
+    arrays = store.arrays()
+    header = dict(store.header(), dedupe_state_version=DEDUPE_STATE_VERSION, mode=store.mode,
+                  byteorder=sys.byteorder,
+                  arrays=[[name, getattr(a, "typecode", "B"), len(a)] for name, a in arrays])
+    with atomic_write(path, "wb") as f:
+        f.write(json.dumps(header, separators=(",", ":")).encode("utf-8") + b"\n")
+        for _, a in arrays:
+            f.write(a)
+
+
+def restore_store(path):
+    with open(path, "rb") as f:
+        header = json.loads(f.readline())
+        if header.get("dedupe_state_version") != DEDUPE_STATE_VERSION:
+            raise SystemExit(f"{path}: unsupported dedupe state version "
+                             f"{header.get('dedupe_state_version')!r}; delete it to start empty")
+        if header["byteorder"] != sys.byteorder:
+            raise SystemExit(f"{path}: written on a {header['byteorder']}-endian machine")
+        arrays = {}
+        for name, typecode, length in header["arrays"]:
+            # Bloom slices are bytearrays ("B"), the exact table arrays
+            if typecode == "B":
+                a = bytearray(f.read(length))
+            else:
+                a = array(typecode)
+                a.frombytes(f.read(length * a.itemsize))
+            if len(a) != length:
+                raise SystemExit(f"{path}: truncated dedupe state ({name})")
+            arrays[name] = a
+    if header["mode"] == "exact":
+        store = ExactStore(header["ttl_s"], 0, header["lateness_s"])
+    else:
+        store = BloomStore(header["ttl_s"], header["capacity"], header["fp_rate"], header["slices"],
+                           header["lateness_s"])
+    store.load(header, arrays)
+    return store
+
+
+def classify(store, lines, fmt, header=None, key_field="idempotency_key", time_field="event_time"):
+    # "unique" | "duplicate" | "failure" (unparseable, no key or no event
+    # time; DetectDuplicate's failure route) per raw line, in order
+    kinds = []
+    for record, _ in parse_lines(lines, fmt, header):
+        if record is None:
+            kinds.append("failure")
+            continue
+        # times outside what the exact store's uint32 times hold fail too
+        key, t = record.get(key_field), parse_epoch(record.get(time_field), -1)
+        if not key or not isinstance(key, str) or not 0 <= t < 1 << 32:
+            kinds.append("failure")
+        else:
+            kinds.append("duplicate" if store.seen(key, t) else "unique")
+    return kinds
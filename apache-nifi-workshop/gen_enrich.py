@@ -0,0 +1,144 @@
+import csv
+import io
+import json
+from bisect import bisect_right
+from datetime import date
+
+from gen_io import dataset_files, read_records
+from gen_validate import BAD, to_int_or_number
+
+# Reference indexes and record enrichment for enrich_transactions.py.
+#
+# The Module 2 flow enriches one record at a time through two LookupRecord
+# services. Here both lookups are in-memory hash indexes, built once from
+# the reference files:
+#
+#   merchants  merchant_id -> risk_tier, read from merchants and then its
+#              delta files in run order, so a merchant's latest tier wins
+#   fx         (rate_date, quote_ccy) -> rate, plus each currency's sorted
+#              rate dates for the as-of lookup: a date without a rate (the
+#              current day before the daily load, a gap in the feed) takes
+#              the currency's latest earlier rate, at most max_lag_days old
+#
+# enrich() applies the Module 2 rules to one parsed transaction, in the
+# flow's order:
+#
+#   merchant_id not in merchants      -> "merchant_unmatched"
+#   currency == the fx base (USD)     -> fx_rate 1.0, amount_base = amount
+#   rate for the event_time date      -> fx_rate = rate,
+#                                        amount_base = int(amount / rate)
+#   no rate                           -> "fx_unmatched"
+#
+# A matched record also gets base_currency = the fx base and
+# merchant_risk_tier. amount that is not a number -> "amount_invalid".
+
+UNMATCHED_REASONS = ("parse_error", "merchant_unmatched", "fx_unmatched", "amount_invalid")
+
+_json_dumps = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False).encode
+
+
+def merchant_index(reference_dir, name="merchants"):
+    # merchant_id -> risk_tier; the tier strings are shared, not one per row
+    paths = dataset_files(reference_dir, name)
+    if not paths:
+        raise SystemExit(f"no {name} files in {reference_dir}; run gen_fintech_data.py first")
+    tiers, index = {}, {}
+    for path in paths:
+        for row in read_records(path):
+            tier = row["risk_tier"]
+            index[row["merchant_id"]] = tiers.setdefault(tier, tier)
+    return index
+
+
+class FxIndex:
+    def __init__(self, rows, asof=True, max_lag_days=None):
+        self.exact = {}
+        self.base = None
+        for row in rows:
+            if self.base is None:
+                self.base = row["base_ccy"]
+            elif row["base_ccy"] != self.base:
+                raise ValueError(f"fx rates mix base currencies {self.base} and {row['base_ccy']}")
+            self.exact[(row["rate_date"], row["quote_ccy"])] = float(row["rate"])
+        self.asof = asof
+        self.max_lag_days = max_lag_days
+        # rate dates are ISO strings, so they sort as dates
+        self.days = {}
+        for day, ccy in sorted(self.exact):
+            self.days.setdefault(ccy, []).append(day)
+        # (day, currency) -> (rate or None, filled from an earlier date)
+        self._asof = {}
+
+    @classmethod
+    def load(cls, reference_dir, name="fx_rates", asof=True, max_lag_days=None):
+        paths = dataset_files(reference_dir, name)
+        if not paths:
+            raise SystemExit(f"no {name} files in {reference_dir}; run gen_fintech_data.py first")
+        return cls((row for path in paths for row in read_records(path)), asof, max_lag_days)
+
+    def lookup(self, day, ccy):
+        # (rate or None, True when the rate comes from an earlier date)
+        rate = self.exact.get((day, ccy))
+        if rate is not None or not self.asof:
+            return rate, False
+        key = (day, ccy)
+        hit = self._asof.get(key)
+        if hit is None:
+            hit = self._asof[key] = self._lookup_asof(day, ccy)
+        return hit
+
+    def _lookup_asof(self, day, ccy):
+        days = self.days.get(ccy)
+        try:
+            wanted = date.fromisoformat(day)
+        except (TypeError, ValueError):
+            return None, False
+        if not days:
+            return None, False
+        i = bisect_right(days, day)
+        if i == 0:
+            return None, False
+        found = days[i - 1]
+        if self.max_lag_days is not None and (wanted - date.fromisoformat(found)).days > self.max_lag_days:
+            return None, False
+        return self.exact[(found, ccy)], True
+
+
+def enrich(record, merchants, fx):
+    # fills the record in place; returns (unmatched reason or None, as-of fill)
+    tier = merchants.get(record.get("merchant_id"))
+    if tier is None:
+        return "merchant_unmatched", False
+    amount = record.get("amount")
+    if isinstance(amount, str):
+        amount = to_int_or_number(amount)
+    if amount is BAD or isinstance(amount, bool) or not isinstance(amount, (int, float)):
+        return "amount_invalid", False
+    currency = record.get("currency")
+    filled = False
+    if currency == fx.base:
+        rate, amount_base = 1.0, amount
+    else:
+        event_time = record.get("event_time")
+        rate, filled = fx.lookup(event_time[:10], currency) if isinstance(event_time, str) else (None, False)
+        if rate is None:
+            return "fx_unmatched", False
+        amount_base = int(amount / rate)
+    record["fx_rate"] = rate
+    record["amount_base"] = amount_base
+    record["base_currency"] = fx.base
+    record["merchant_risk_tier"] = tier
+    return None, filled
+
+
+def encode_jsonl(records):
+    return "".join([_json_dumps(r) + "\n" for r in records]).encode("utf-8")
+
+
+def encode_csv(records, header):
+    # None -> empty field, as the generator writes nulls
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    for r in records:
+        w.writerow(["" if r.get(f) is None else r.get(f) for f in header])
+    return buf.getvalue().encode("utf-8")
@@ -0,0 +1,228 @@
+import csv
+import glob
+import io
+import json
+import math
+import os
+import random
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+# Fault injection for the raw transaction files.
+#
+# A FaultInjector sits between a gen_io DatasetWriter's encoder and its file:
+# it picks lines at the configured per-kind rates (geometric skips, so the
+# cost follows the number of faults rather than the number of lines),
+# rewrites or duplicates them, and appends one label per injected record to
+# a side file so the quarantine / duplicate / unmatched branches can be
+# scored:
+#
+#   bad_currency      currency of length != 3           (schema, quality rule)
+#   negative_amount   amount < 0                        (schema, quality rule)
+#   missing_field     a required field removed (CSV: left empty)
+#   malformed_line    line cut in half: broken JSON / short CSV row
+#   duplicate_replay  an extra copy of a recent record (same idempotency_key)
+#                     with event_time up to replay_window_s later
+#   unknown_merchant  merchant_id not in merchants.csv
+#   missing_fx_date   event_time moved before the first fx_rates.csv date
+#
+# Labels, {"seq": <line number in the writer's output>, "fault": ...,
+# "transaction_id": ..., "idempotency_key": ..., "detail": ...}, are
+# written to labels_dir/<dataset>.faults.jsonl (<dataset>.part-SSSSS.faults.jsonl
+# per shard). A partitioned writer faults the dataset's stream before it
+# routes the lines, so there seq counts lines of that stream and each label
+# also carries "partition", the directory (dt=YYYY-MM-DD) its record is in. The injector draws from its own seeded RNG, so the records it
+# leaves alone are byte-identical to a run without faults.
+
+FAULT_KINDS = ("bad_currency", "negative_amount", "missing_field", "malformed_line",
+               "duplicate_replay", "unknown_merchant", "missing_fx_date")
+BAD_CURRENCIES = ["US", "EURO", "", "GBPX", "X"]
+ISO_UTC_FMT = "%Y-%m-%dT%H:%M:%SZ"
+RECENT_LINES = 1024
+
+
+class FaultInjector:
+    def __init__(self, cfg, seed, fmt, fields, label_path, required, fx_first_date):
+        if fmt not in ("jsonl", "csv"):
+            raise SystemExit(f"fault injection needs a jsonl or csv transactions format, not {fmt}")
+        rates = {k: v for k, v in cfg["rates"].items() if v}
+        unknown = set(rates) - set(FAULT_KINDS)
+        if unknown:
+            raise ValueError(f"unknown fault kinds {sorted(unknown)}; expected {FAULT_KINDS}")
+        total = sum(rates.values())
+        if total >= 1:
+            raise ValueError(f"fault rates add up to {total}; they must stay below 1")
+        self.rng = random.Random(seed)
+        self.fmt = fmt
+        self.fields = fields
+        self.required = [f for f in required if f in fields]
+        self.fx_first_date = fx_first_date
+        self.replay_window_s = cfg["replay_window_s"]
+        self.kinds = list(rates)
+        self.cum = []
+        acc = 0.0
+        for k in self.kinds:
+            acc += rates[k]
+            self.cum.append(acc)
+        self.total = total
+        self._log_q = math.log(1.0 - total) if total else None
+        self._skip = self._gap()
+        self.seq = 0
+        self.recent = deque(maxlen=RECENT_LINES)
+        self.counts = dict.fromkeys(self.kinds, 0)
+        self.label_path = label_path
+        self._labels = None
+        # row -> partition path, set by gen_io.PartitionedWriter
+        self.partition_of = None
+
+    def _gap(self):
+        # lines to leave alone before the next fault
+        if self._log_q is None:
+            return math.inf
+        return int(math.log(1.0 - self.rng.random()) / self._log_q)
+
+    def _decode(self, line):
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        if self.fmt == "jsonl":
+            return json.loads(line)
+        return dict(zip(self.fields, next(csv.reader([line]))))
+
+    def _encode(self, row, binary):
+        if self.fmt == "jsonl":
+            s = json.dumps(row, separators=(",", ":"), ensure_ascii=False) + "\n"
+        else:
+            buf = io.StringIO()
+            csv.writer(buf).writerow([row.get(f, "") for f in self.fields])
+            s = buf.getvalue()
+        return s.encode("utf-8") if binary else s
+
+    def _label(self, kind, row, detail):
+        if self._labels is None:
+            os.makedirs(os.path.dirname(self.label_path) or ".", exist_ok=True)
+            self._labels = open(self.label_path, "w", encoding="utf-8", newline="")
+        label = {
+            "seq": self.seq, "fault": kind, "transaction_id": row.get("transaction_id"),
+            "idempotency_key": row.get("idempotency_key"), "detail": detail,
+        }
+        if self.partition_of is not None:
+            label["partition"] = self.partition_of(row)
+        self._labels.write(json.dumps(label, separators=(",", ":")) + "\n")
+        self.counts[kind] += 1
+
+    def _kind(self):
+        u = self.rng.random() * self.total
+        for k, c in zip(self.kinds, self.cum):
+            if u < c:
+                return k
+        return self.kinds[-1]
+
+    def _shift_time(self, value, seconds):
+        t = datetime.strptime(value, ISO_UTC_FMT).replace(tzinfo=timezone.utc)
+        return (t + timedelta(seconds=seconds)).strftime(ISO_UTC_FMT)
+
+    def _fault(self, kind, line, time, binary):
+        # returns the lines that replace `line` and their event times (the
+        # label goes to the record that carries the fault)
+        rng = self.rng
+        row = self._decode(line)
+        if kind == "duplicate_replay":
+            if not self.recent:
+                return [line], [time]
+            dup = self._decode(rng.choice(self.recent))
+            delay = rng.randint(0, self.replay_window_s)
+            dup["event_time"] = self._shift_time(dup["event_time"], delay)
+            self.seq += 1
+            self._label(kind, dup, {"delay_s": delay})
+            return [line, self._encode(dup, binary)], [time, dup["event_time"]]
+        if kind == "malformed_line":
+            self._label(kind, row, None)
+            text = line.decode("utf-8") if binary else line
+            cut = text[:max(1, len(text) // 2)] + "\n"
+            return [cut.encode("utf-8") if binary else cut], [time]
+        if kind == "bad_currency":
+            row["currency"] = rng.choice(BAD_CURRENCIES)
+            detail = {"currency": row["currency"]}
+        elif kind == "negative_amount":
+            row["amount"] = -abs(int(row["amount"])) or -1
+            detail = {"amount": row["amount"]}
+        elif kind == "missing_field":
+            field = rng.choice(self.required)
+            if self.fmt == "jsonl":
+                del row[field]
+            else:
+                row[field] = ""
+            detail = {"field": field}
+        elif kind == "unknown_merchant":
+            row["merchant_id"] = (f"{rng.getrandbits(32):08x}-{rng.getrandbits(16):04x}-"
+                                  f"4{rng.getrandbits(12):03x}-{0x8000 | rng.getrandbits(14):04x}-"
+                                  f"{rng.getrandbits(48):012x}")
+            detail = {"merchant_id": row["merchant_id"]}
+        else:  # missing_fx_date
+            day = self.fx_first_date - timedelta(days=rng.randint(1, 30))
+            row["event_time"] = f"{day.isoformat()}T{row['event_time'][11:]}"
+            detail = {"event_time": row["event_time"]}
+        self._label(kind, row, detail)
+        # a removed event_time (CSV: empty) leaves the line without one
+        return [self._encode(row, binary)], [row.get("event_time") or None]
+
+    def apply(self, lines, times=None):
+        # lines (and their event times, when tracked) after injection
+        n = len(lines)
+        if self._skip >= n:
+            self._skip -= n
+            self.seq += n
+            self.recent.extend(lines[-RECENT_LINES:])
+            return lines, times
+        binary = isinstance(lines[0], bytes)
+        out, out_times, i = [], [] if times is not None else None, 0
+        while self._skip < n - i:
+            j = i + self._skip
+            out += lines[i:j]
+            self.recent.extend(lines[max(i, j - RECENT_LINES):j])
+            self.seq += j - i
+            replaced, replaced_times = self._fault(self._kind(), lines[j],
+                                                   times[j] if times is not None else None, binary)
+            out += replaced
+            self.seq += 1
+            self.recent.append(lines[j])
+            if times is not None:
+                out_times += times[i:j]
+                out_times += replaced_times
+            i = j + 1
+            self._skip = self._gap()
+        self._skip -= n - i
+        out += lines[i:]
+        self.recent.extend(lines[max(i, n - RECENT_LINES):])
+        self.seq += n - i
+        if times is not None:
+            out_times += times[i:]
+        return out, out_times
+
+    def close(self):
+        if self._labels is not None:
+            self._labels.close()
+            self._labels = None
+        return self.counts
+
+
+def label_path(labels_dir, dataset, shard=None):
+    stem = dataset if shard is None else f"{dataset}.part-{shard:05d}"
+    return os.path.join(labels_dir, stem + ".faults.jsonl")
+
+
+def label_files(labels_dir, dataset):
+    pattern = glob.escape(dataset)
+    return sorted(glob.glob(os.path.join(glob.escape(labels_dir), pattern + ".faults.jsonl")) +
+                  glob.glob(os.path.join(glob.escape(labels_dir), pattern + ".part-*.faults.jsonl")))
+
+
+def count_labels(paths):
+    # fault kind -> labelled records, over label files
+    counts = {}
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                kind = json.loads(line)["fault"]
+                counts[kind] = counts.get(kind, 0) + 1
+    return counts
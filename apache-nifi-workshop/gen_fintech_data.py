@@ -1,12 +1,41 @@
-import csv
+import argparse
+import copy
+import glob
+import hashlib
+import heapq
 import json
+import math
+import multiprocessing
 import os
 import random
-import uuid
-from datetime import datetime, timedelta, timezone
+import shutil
+import tempfile
+import time
+from datetime import date, datetime, timedelta, timezone
+from functools import partial
 
 from faker import Faker
 
+from gen_cache import DatasetCache, cache_key, code_version
+from gen_faults import FaultInjector, count_labels, label_files, label_path
+from gen_firehose import PROFILES, SINKS, local_receiver, run_emit
+from gen_ids import ID_MODES, IdFactory, np_ids
+from gen_io import (COMPRESSIONS, FORMATS, SERIALIZERS, TEXT_BATCH_ROWS, JsonlEncoder, atomic_write, block_len,
+                    open_writer, remove_dataset_outputs, write_dataset, write_manifest, write_partition_index)
+from gen_metrics import Instrumentation
+from gen_pipeline import Pipeline
+from gen_plan import (costs_source, estimate, load_costs, measure_costs, parse_scale, print_plan, save_costs,
+                      scale_volumes, set_value, traced_bytes)
+from gen_pools import load_pools, value_sources
+from gen_refstore import EntityTable
+from gen_skew import SKEW_PRESETS, apply_preset, time_profile, zipf_table
+from gen_state import load_state, restore_rng, rng_state, save_state
+
+try:
+    import numpy as np
+except ImportError:  # only the "numpy" transaction engine needs it
+    np = None
+
 # Config block: edit values here
 CONFIG = {
     "base_dir": "./data",
@@ -16,6 +45,36 @@ CONFIG = {
         "contracts": "contracts",
     },
     "seed": 7,
+    # IDs come from the seeded RNG: "uuid4" (contract-shaped) or "ulid"
+    "id_mode": "uuid4",
+    # fixed "now" (e.g. "2026-01-01T00:00:00Z") makes seeded runs
+    # byte-identical; None uses the wall clock
+    "anchor_time": None,
+    # stream transactions straight to disk; False keeps every row in memory
+    "streaming": True,
+    # parallel transaction generation: each shard writes its own
+    # transactions.part-NNNNN.jsonl; shards defaults to workers
+    "workers": 1,
+    "shards": None,
+    # "python" draws one row at a time; "numpy" builds column blocks of
+    # batch_rows transactions and only renders text at write time
+    "engine": "python",
+    "batch_rows": 1_000_000,
+    # pre-generated Faker pools: each column draws from `size` distinct values
+    # (its real cardinality); cache_dir keeps pools on disk per seed and locale
+    "value_pools": {
+        "enabled": False,
+        "locale": "en_US",
+        "cache_dir": "./.cache/value_pools",
+        "sizes": {
+            "full_name": 50000,
+            "email": 50000,
+            "phone_e164": 50000,
+            "dob": 10000,
+            "merchant_name": 20000,
+            "ip_address": 100000,
+        },
+    },
     "volumes": {
         "customers": 500,
         "accounts": 800,
@@ -24,14 +83,180 @@ CONFIG = {
         "disputes": 200,
         "fx_days": 30,
     },
+    # output format per dataset: "jsonl", "csv", "parquet" or "arrow"
+    # (parquet/arrow need pyarrow; columnar sets row groups and codec)
+    "formats": {
+        "customers": "csv",
+        "accounts": "csv",
+        "merchants": "csv",
+        "fx_rates": "csv",
+        "transactions": "jsonl",
+        "disputes": "jsonl",
+    },
+    "columnar": {"row_group_rows": 250_000, "compression": "zstd"},
+    # roll each dataset into part files of at most max_rows rows / max_bytes
+    # uncompressed bytes (None = one file), gzip/zstd-compress jsonl/csv
+    # parts, and list every part in <dir>/manifest.json
+    "parts": {"max_rows": None, "max_bytes": None, "compression": None, "manifest": False},
+    # Hive-style layout (see gen_io) for the datasets listed ("transactions",
+    # "disputes"): <dir>/<name>/dt=YYYY-MM-DD/ part files by event date
+    # (transactions event_time, disputes opened_at) plus per-partition stats
+    # in <dir>/<name>/_partitions.json, with at most max_open_files partition
+    # files open at once; incremental delta files stay flat
+    "partitioning": {"datasets": [], "max_open_files": 64},
+    # pipelined writes (see gen_pipeline) for full runs to files: each
+    # dataset's batches go through a bounded queue of queue_batches batches
+    # to its own writer thread, so encoding, compression and file I/O overlap
+    # with generation; the run reports how long each side spent blocked
+    "pipeline": {"enabled": False, "queue_batches": 4},
+    # JSON encoder: "auto" (orjson when installed, else stdlib), "orjson" or "stdlib";
+    # every choice writes the same bytes
+    "serializer": "auto",
+    # real-time mode: with a sink set, reference data and contracts are
+    # written as usual and transactions/disputes then stream to the sink at
+    # the profile's target events/sec instead of going to files
+    "emit": {
+        "sink": None,  # "http", "tcp" or "dir"
+        "profile": "steady",  # "steady", "ramp" or "burst"
+        "rate": 1000,
+        "ramp_from_rate": 10,
+        "ramp_s": 30,
+        "burst_rate": 5000,
+        "burst_s": 5,
+        "burst_every_s": 60,
+        "duration_s": 60,  # None = until Ctrl-C
+        "batch_events": 100,  # max events per request / file / write
+        "linger_ms": 50,  # max wait for a batch to fill
+        "concurrency": 4,  # in-flight sends
+        "report_every_s": 5,
+        "dispute_delay_s": 30,  # disputes follow their transaction within this
+        "http_url": "http://127.0.0.1:8081/contentListener",
+        "tcp_host": "127.0.0.1",
+        "tcp_ports": {"transactions": 9301, "disputes": 9302},
+        "drop_dir": "./data/raw/stream",
+        "local_receiver": False,  # run the stand-in receiver in-process
+    },
+    # self-instrumentation: per-stage wall time, rows, rows/sec, bytes and
+    # peak memory appended to path as flow_kpis records (see gen_metrics)
+    "metrics": {
+        "enabled": False,
+        "path": "./data/obs/raw/generator_kpis.jsonl",
+        "dimensions": {"env": "dev", "cluster": "c1"},
+        "tracemalloc": False,
+        "profile_path": None,  # e.g. "./gen_fintech_data.prof"
+    },
+    # hot keys and time shape of transactions (see gen_skew; --skew PRESET
+    # fills these from gen_skew.SKEW_PRESETS): Zipf exponents over accounts,
+    # merchants and devices, diurnal/weekly curve names or weight lists, and
+    # bursts [{"ago_hours": .., "hours": .., "multiplier": ..}]; None = uniform
+    "skew": {
+        "accounts_zipf": None,
+        "merchants_zipf": None,
+        "devices_zipf": None,
+        "diurnal": None,
+        "weekly": None,
+        "bursts": [],
+    },
+    # fault injection into the raw transaction files (see gen_faults): the
+    # share of records given each fault, with one label per injected record
+    # in labels_dir; jsonl/csv transactions only, ignored with emit
+    "faults": {
+        "enabled": False,
+        "rates": {
+            "bad_currency": 0.002,
+            "negative_amount": 0.002,
+            "missing_field": 0.002,
+            "malformed_line": 0.001,
+            "duplicate_replay": 0.01,
+            "unknown_merchant": 0.005,
+            "missing_fx_date": 0.005,
+        },
+        "replay_window_s": 300,
+        "labels_dir": "./data/labels",
+    },
+    # incremental mode: the first run is a full run that saves its state to
+    # state_path; every later run appends only the window since the saved
+    # watermark (to advance_days after it, or to anchor_time / the wall clock
+    # when None) as <name>.delta-NNNNN files: new transactions, disputes and
+    # FX days plus new or changed reference entities. per_day volumes scale
+    # with the window. Delete state_path to start over; ignored with emit.
+    "incremental": {
+        "enabled": False,
+        "state_path": "./data/state/gen_fintech_data.json",
+        "advance_days": None,
+        "per_day": {
+            "transactions": 667,
+            "disputes": 7,
+            "new_customers": 5,
+            "new_accounts": 8,
+            "new_merchants": 2,
+            "changed_customers": 2,
+            "changed_accounts": 4,
+            "changed_merchants": 1,
+        },
+    },
     "fx": {
         "base_ccy": "USD",
         "quote_ccys": ["USD", "EUR", "GBP", "INR", "SGD", "AED"],
     },
+    # dataset cache (see gen_cache): with a fixed anchor_time, a full run
+    # reuses each dataset whose CONFIG slice, seed and generator version are
+    # unchanged (as are those of the datasets drawn before it), hardlinking
+    # or copying it from dir instead of regenerating; ignored with emit and
+    # incremental
+    "cache": {"enabled": False, "dir": "./.cache/datasets", "link": "hardlink"},
+    # run planning (see gen_plan): per-row costs measured by --calibrate are
+    # kept in costs_path; calibration runs at calibration_scale times the
+    # volumes above, sized (in both generators) for a run of about two
+    # seconds: SF1 here is ~22k rows, enough for steady rows_per_s
+    "plan": {"costs_path": "./bench/plan_costs.json", "calibration_scale": 1},
 }
 
 ISO_UTC_FMT = "%Y-%m-%dT%H:%M:%SZ"
 
+# bump when the generated bytes change for an unchanged CONFIG (the dataset
+# cache also hashes the generator sources)
+GENERATOR_VERSION = "1.0"
+
+# datasets CONFIG["partitioning"] can lay out by event date
+PARTITIONABLE = ("transactions", "disputes")
+
+# full-run datasets in RNG draw order: the dataset cache stages
+CACHE_STAGES = ("customers", "accounts", "merchants", "transactions", "disputes", "fx_rates")
+
+# volumes multiplied by --scale (fx_days is a time span and stays)
+SCALED_VOLUMES = ("customers", "accounts", "merchants", "transactions", "disputes")
+
+# rough per-row costs for --plan when there is no calibration for the
+# current settings: one --calibrate run of the default CONFIG on the machine
+# named below (a 1-CPU Xeon container); other hardware should --calibrate
+DEFAULT_PLAN_COSTS = {
+    "created_at": "2026-10-18T16:55:46Z",
+    "machine": {"system": "Linux x86_64", "cpus": 1, "python": "3.11.7"},
+    "profile": {
+        "formats": {"customers": "csv", "accounts": "csv", "merchants": "csv", "transactions": "jsonl",
+                    "disputes": "jsonl", "fx_rates": "csv"},
+        "engine": "python", "streaming": True, "compression": None, "columnar": "zstd",
+        "value_pools": False, "faults": False,
+    },
+    "base_mb": 125.0,
+    "setup_s": 0.05,
+    "stages": {
+        "reference_entities": {"rows_per_s": 4200.0},
+        "transactions": {"rows_per_s": 11300.0},
+        "disputes": {"rows_per_s": 18600.0},
+        "fx_rates": {"rows_per_s": 35400.0},
+    },
+    "datasets": {
+        "customers": {"bytes_per_row": 132.4, "row_mem_bytes": 0.0, "table_mem_bytes": 166.8},
+        "accounts": {"bytes_per_row": 114.9, "row_mem_bytes": 0.0, "table_mem_bytes": 72.9},
+        "merchants": {"bytes_per_row": 89.9, "row_mem_bytes": 0.0, "table_mem_bytes": 94.5},
+        "transactions": {"bytes_per_row": 675.4, "row_mem_bytes": 1342.5, "table_mem_bytes": 0.0},
+        "disputes": {"bytes_per_row": 273.1, "row_mem_bytes": 187.6, "table_mem_bytes": 0.0},
+        "fx_rates": {"bytes_per_row": 34.4, "row_mem_bytes": 0.0, "table_mem_bytes": 0.0},
+    },
+}
+
 RAW_TRANSACTIONS_SCHEMA = {
     "$schema": "https://json-schema.org/draft/2020-12/schema",
     "title": "raw_transactions",
@@ -179,6 +404,12 @@ def utc_now():
     return datetime.now(timezone.utc)
 
 
+def anchor_now(anchor_time):
+    if anchor_time is None:
+        return utc_now()
+    return datetime.strptime(anchor_time, ISO_UTC_FMT).replace(tzinfo=timezone.utc)
+
+
 def iso_utc(dt):
     return dt.astimezone(timezone.utc).strftime(ISO_UTC_FMT)
 
@@ -189,24 +420,15 @@ def ensure_dirs(base_dir, subdirs):
         os.makedirs(os.path.join(base_dir, rel), exist_ok=True)
 
 
-def write_csv(path, fieldnames, rows):
-    with open(path, "w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=fieldnames)
-        w.writeheader()
-        for r in rows:
-            w.writerow(r)
-
-
-def write_jsonl(path, rows):
-    with open(path, "w", encoding="utf-8") as f:
-        for r in rows:
-            f.write(json.dumps(r, separators=(
-                ",", ":"), ensure_ascii=False) + "\n")
+def replace_text(path, text):
+    # written aside and renamed over path, so a cached (hardlinked) copy of
+    # the previous file is never overwritten in place
+    with atomic_write(path) as f:
+        f.write(text)
 
 
 def write_json(path, obj):
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(obj, f, indent=2, ensure_ascii=False)
+    replace_text(path, json.dumps(obj, indent=2, ensure_ascii=False))
 
 
 def yaml_escape(s):
@@ -249,8 +471,7 @@ def to_yaml(obj, indent=0):
 
 
 def write_yaml(path, obj):
-    with open(path, "w", encoding="utf-8") as f:
-        f.write(to_yaml(obj) + "\n")
+    replace_text(path, to_yaml(obj) + "\n")
 
 
 def weighted_choice(rng, items):
@@ -259,125 +480,298 @@ def weighted_choice(rng, items):
     return rng.choices(values, weights=weights, k=1)[0]
 
 
-def gen_fx_rates(rng, start_date, days, base_ccy, quote_ccys):
-    providers = ["provider_a", "provider_b"]
-    rows = []
-    for i in range(days):
-        d = start_date + timedelta(days=i)
-        for q in quote_ccys:
-            if q == base_ccy:
-                continue
-            rate = round(rng.uniform(0.2, 120.0), 6)
-            rows.append({
-                "rate_date": d.strftime("%Y-%m-%d"),
-                "base_ccy": base_ccy,
-                "quote_ccy": q,
-                "rate": str(rate),
-                "provider": rng.choice(providers),
-            })
-    return rows
+def compile_weights(items):
+    values = [v for v, _ in items]
+    cum, total = [], 0
+    for _, w in items:
+        total += w
+        cum.append(total)
+    return values, cum
 
 
-def main():
-    base_dir = CONFIG["base_dir"]
-    subdirs = CONFIG["subdirs"]
-    seed = CONFIG["seed"]
-    vols = CONFIG["volumes"]
-    fx_cfg = CONFIG["fx"]
+def compiled_choice(rng, compiled):
+    values, cum = compiled
+    return rng.choices(values, cum_weights=cum, k=1)[0]
 
-    ensure_dirs(base_dir, subdirs)
 
-    raw_dir = os.path.join(base_dir, subdirs["raw"])
-    ref_dir = os.path.join(base_dir, subdirs["reference"])
-    contracts_dir = os.path.join(base_dir, subdirs["contracts"])
+FAKER_PROVIDERS = {
+    "full_name": lambda fake: fake.name(),
+    "email": lambda fake: fake.email(),
+    "phone_e164": lambda fake: fake.msisdn()[:15],
+    "dob": lambda fake: fake.date_of_birth(minimum_age=18, maximum_age=75).strftime("%Y-%m-%d"),
+    "merchant_name": lambda fake: fake.company(),
+    "ip_address": lambda fake: fake.ipv4_public(),
+}
 
-    rng = random.Random(seed)
-    Faker.seed(seed)
-    fake = Faker()
+TX_FAKER_PROVIDERS = {"ip_address": FAKER_PROVIDERS["ip_address"]}
+
+TX_STATUS_WEIGHTS = [("AUTHORIZED", 25), ("CAPTURED", 30),
+                     ("SETTLED", 35), ("DECLINED", 10)]
+TX_CHANNEL_WEIGHTS = [("CARD", 55), ("UPI", 25), ("ACH", 15), ("WIRE", 5)]
+TX_DIRECTION_WEIGHTS = [("DEBIT", 85), ("CREDIT", 15)]
+
+# Column specs for gen_io: names set the CSV header order, types drive the
+# parquet/arrow schema ("dict" columns are dictionary-encoded).
+CUSTOMER_COLUMNS = [
+    ("customer_id", "string"), ("full_name", "string"), ("email", "string"),
+    ("phone_e164", "string"), ("dob", "string"), ("kyc_level", "dict"),
+    ("country", "dict"), ("created_at", "string"),
+]
+ACCOUNT_COLUMNS = [
+    ("account_id", "string"), ("customer_id", "string"), ("account_type", "dict"),
+    ("status", "dict"), ("base_currency", "dict"), ("opened_at", "string"),
+]
+MERCHANT_COLUMNS = [
+    ("merchant_id", "string"), ("merchant_name", "string"), ("mcc", "dict"),
+    ("country", "dict"), ("risk_tier", "dict"), ("created_at", "string"),
+]
+FX_RATE_COLUMNS = [
+    ("rate_date", "dict"), ("base_ccy", "dict"), ("quote_ccy", "dict"),
+    ("rate", "string"), ("provider", "dict"),
+]
+TX_COLUMNS = [
+    ("transaction_id", "string"), ("correlation_id", "string"), ("event_time", "string"),
+    ("customer_id", "string"), ("account_id", "string"), ("merchant_id", "string"),
+    ("channel", "dict"), ("direction", "dict"), ("amount", "int64"), ("currency", "dict"),
+    ("status", "dict"), ("auth_code", "string"), ("card_last4", "string"),
+    ("device_id", "string"), ("ip_address", "string"), ("idempotency_key", "string"),
+    ("amount_base", "int64"), ("base_currency", "dict"), ("fx_rate", "float64"),
+    ("merchant_risk_tier", "dict"),
+]
+DISPUTE_COLUMNS = [
+    ("dispute_id", "string"), ("correlation_id", "string"), ("transaction_id", "string"),
+    ("opened_at", "string"), ("reason_code", "dict"), ("status", "dict"),
+    ("amount", "int64"), ("currency", "dict"),
+]
+
+# Packed column kinds of the reference entities kept in memory (see
+# gen_refstore); accounts.customer_id is a row index into customers.
+CUSTOMER_STORE = [
+    ("customer_id", "id"), ("full_name", "text"), ("email", "text"), ("phone_e164", "text"),
+    ("dob", "text"), ("kyc_level", "enum"), ("country", "enum"), ("created_at", "time"),
+]
+ACCOUNT_STORE = [
+    ("account_id", "id"), ("customer_id", "ref"), ("account_type", "enum"), ("status", "enum"),
+    ("base_currency", "enum"), ("opened_at", "time"),
+]
+MERCHANT_STORE = [
+    ("merchant_id", "id"), ("merchant_name", "text"), ("mcc", "enum"), ("country", "enum"),
+    ("risk_tier", "enum"), ("created_at", "time"),
+]
+
+# per-dataset field whose min/max the manifest records for each part
+TIME_FIELDS = {
+    "customers": "created_at",
+    "accounts": "opened_at",
+    "merchants": "created_at",
+    "fx_rates": "rate_date",
+    "transactions": "event_time",
+    "disputes": "opened_at",
+}
+
+
+class Reservoir:
+    # Single-pass uniform sample of k items (Li's Algorithm L): after the
+    # reservoir fills, the index of the next replaced item is drawn directly,
+    # so the per-item cost is one integer comparison.
+    def __init__(self, rng, k):
+        self.rng = rng
+        self.k = k
+        self.items = []
+        self.seen = 0
+        self._w = 1.0
+        self._next = k - 1
+
+    def _skip(self):
+        self._w *= math.exp(math.log(1.0 - self.rng.random()) / self.k)
+        self._next += int(math.log(1.0 - self.rng.random()) /
+                          math.log(1.0 - self._w)) + 1
 
-    countries = ["US", "IN", "GB", "SG", "AE", "DE", "FR"]
-    currencies = ["USD", "EUR", "GBP", "INR", "SGD", "AED"]
-    mccs = ["5411", "5812", "5999", "4111", "4812", "6012", "5732"]
-    kyc_levels = ["BASIC", "STANDARD", "ENHANCED"]
-
-    now = utc_now()
-
-    customer_rows = []
-    customer_ids = []
-    for _ in range(vols["customers"]):
-        cid = str(uuid.uuid4())
-        customer_ids.append(cid)
-        created_at = now - \
-            timedelta(days=rng.randint(0, 365), seconds=rng.randint(0, 86400))
-        customer_rows.append({
+    def offer_block(self, n, get):
+        # offer n consecutive items; get(i) builds the i-th one on demand
+        base = self.seen
+        self.seen += n
+        for i in range(base, min(self.seen, self.k)):
+            self.items.append(get(i - base))
+            if i == self.k - 1:
+                self._skip()
+        if self.k == 0 or len(self.items) < self.k:
+            return
+        while self._next < self.seen:
+            self.items[self.rng.randrange(self.k)] = get(self._next - base)
+            self._skip()
+
+    def offer(self, item):
+        i = self.seen
+        self.seen += 1
+        if i < self.k:
+            self.items.append(item)
+            if self.seen == self.k:
+                self._skip()
+        elif i == self._next:
+            self.items[self.rng.randrange(self.k)] = item
+            self._skip()
+
+
+DISPUTE_SOURCE_FIELDS = ("transaction_id", "correlation_id",
+                         "event_time", "amount", "currency")
+
+
+def sample_into(rows, reservoir):
+    for r in rows:
+        reservoir.offer({k: r[k] for k in DISPUTE_SOURCE_FIELDS})
+        yield r
+
+
+COUNTRIES = ["US", "IN", "GB", "SG", "AE", "DE", "FR"]
+CURRENCIES = ["USD", "EUR", "GBP", "INR", "SGD", "AED"]
+MCCS = ["5411", "5812", "5999", "4111", "4812", "6012", "5732"]
+KYC_LEVELS = ["BASIC", "STANDARD", "ENHANCED"]
+
+
+def random_past(rng, now, days, window_s=None):
+    # up to `days` days (plus a day's seconds) before now; incremental runs
+    # pass window_s to stay within the seconds since the last watermark
+    if window_s is None:
+        return now - timedelta(days=rng.randint(0, days), seconds=rng.randint(0, 86400))
+    return now - timedelta(seconds=rng.randrange(window_s))
+
+
+def new_store(id_mode):
+    # empty customers/accounts/merchants tables, filled by the gen_* functions
+    customers = EntityTable(CUSTOMER_STORE, id_mode)
+    return {
+        "customers": customers,
+        "accounts": EntityTable(ACCOUNT_STORE, id_mode, {"customer_id": customers}),
+        "merchants": EntityTable(MERCHANT_STORE, id_mode),
+    }
+
+
+# The entity generators yield row dicts for writing and, given a table, also
+# append each row to it.
+def gen_customers(rng, ids, values, now, n, window_s=None, table=None):
+    for _ in range(n):
+        cid = ids.next()
+        created_at = random_past(rng, now, 365, window_s)
+        row = {
             "customer_id": cid,
-            "full_name": fake.name(),
-            "email": fake.email(),
-            "phone_e164": fake.msisdn()[:15],
-            "dob": fake.date_of_birth(minimum_age=18, maximum_age=75).strftime("%Y-%m-%d"),
-            "kyc_level": rng.choice(kyc_levels),
-            "country": rng.choice(countries),
+            "full_name": values["full_name"](),
+            "email": values["email"](),
+            "phone_e164": values["phone_e164"](),
+            "dob": values["dob"](),
+            "kyc_level": rng.choice(KYC_LEVELS),
+            "country": rng.choice(COUNTRIES),
             "created_at": iso_utc(created_at),
-        })
-
-    account_rows = []
-    account_ids = []
-    for _ in range(vols["accounts"]):
-        aid = str(uuid.uuid4())
-        account_ids.append(aid)
-        opened_at = now - \
-            timedelta(days=rng.randint(0, 365), seconds=rng.randint(0, 86400))
-        base_ccy = rng.choice(currencies)
-        account_rows.append({
+        }
+        if table is not None:
+            table.append(row)
+        yield row
+
+
+def gen_accounts(rng, ids, now, n, customer_ids, window_s=None, table=None):
+    # customer_ids: any sequence of customer IDs, e.g. customers["customer_id"]
+    for _ in range(n):
+        aid = ids.next()
+        opened_at = random_past(rng, now, 365, window_s)
+        base_ccy = rng.choice(CURRENCIES)
+        # randrange(n) draws exactly what rng.choice(customer_ids) would
+        ci = rng.randrange(len(customer_ids))
+        row = {
             "account_id": aid,
-            "customer_id": rng.choice(customer_ids),
+            "customer_id": customer_ids[ci],
             "account_type": weighted_choice(rng, [("WALLET", 60), ("CHECKING", 30), ("CREDIT", 10)]),
             "status": weighted_choice(rng, [("ACTIVE", 92), ("SUSPENDED", 6), ("CLOSED", 2)]),
             "base_currency": base_ccy,
             "opened_at": iso_utc(opened_at),
-        })
-
-    merchant_rows = []
-    merchant_ids = []
-    for _ in range(vols["merchants"]):
-        mid = str(uuid.uuid4())
-        merchant_ids.append(mid)
-        created_at = now - \
-            timedelta(days=rng.randint(0, 900), seconds=rng.randint(0, 86400))
-        merchant_rows.append({
+        }
+        if table is not None:
+            table.append(row, customer_id=ci)
+        yield row
+
+
+def gen_merchants(rng, ids, values, now, n, window_s=None, table=None):
+    for _ in range(n):
+        mid = ids.next()
+        created_at = random_past(rng, now, 900, window_s)
+        row = {
             "merchant_id": mid,
-            "merchant_name": fake.company(),
-            "mcc": rng.choice(mccs),
-            "country": rng.choice(countries),
+            "merchant_name": values["merchant_name"](),
+            "mcc": rng.choice(MCCS),
+            "country": rng.choice(COUNTRIES),
             "risk_tier": weighted_choice(rng, [("LOW", 70), ("MEDIUM", 25), ("HIGH", 5)]),
             "created_at": iso_utc(created_at),
-        })
-
-    account_by_id = {r["account_id"]: r for r in account_rows}
-
-    tx_rows = []
-    for _ in range(vols["transactions"]):
-        txid = str(uuid.uuid4())
-        corr = str(uuid.uuid4())
-        aid = rng.choice(account_ids)
-        acct = account_by_id[aid]
-        event_time = now - \
-            timedelta(days=rng.randint(0, 30), seconds=rng.randint(0, 86400))
+        }
+        if table is not None:
+            table.append(row)
+        yield row
+
+
+DEVICE_COUNT = 20000
+# seconds covered by a full run's event times (random_past with 30 days)
+TX_WINDOW_S = 31 * 86400 + 1
+
+
+def build_skew(now, window_s, n_accounts, n_merchants):
+    # alias tables / time profile for the configured skew; None entries are
+    # uniform picks
+    cfg = CONFIG["skew"]
+    return {
+        "accounts": zipf_table(n_accounts, cfg["accounts_zipf"]),
+        "merchants": zipf_table(n_merchants, cfg["merchants_zipf"]),
+        "devices": zipf_table(DEVICE_COUNT, cfg["devices_zipf"]),
+        "time": time_profile(cfg, now, window_s or TX_WINDOW_S),
+    }
+
+
+def index_picker(rng, table, n):
+    # zero-arg callable drawing an index in [0, n); rng.randrange(n) draws
+    # exactly what rng.choice over n items would
+    return table.sampler(rng) if table is not None else partial(rng.randrange, n)
+
+
+def np_pick(nrng, table, n, m):
+    return table.np_sample(nrng, m) if table is not None else nrng.integers(0, n, size=m)
+
+
+def gen_transactions(rng, ids, values, now, n, accounts, merchants, currencies, window_s=None,
+                     skew=None):
+    # accounts/merchants: EntityTables from new_store(); skew: build_skew()
+    status_w = compile_weights(TX_STATUS_WEIGHTS)
+    channel_w = compile_weights(TX_CHANNEL_WEIGHTS)
+    direction_w = compile_weights(TX_DIRECTION_WEIGHTS)
+    account_ids, account_customers = accounts["account_id"], accounts["customer_id"]
+    account_ccys, merchant_ids = accounts["base_currency"], merchants["merchant_id"]
+    skew = skew or {}
+    pick_account = index_picker(rng, skew.get("accounts"), len(account_ids))
+    pick_merchant = index_picker(rng, skew.get("merchants"), len(merchant_ids))
+    pick_device = index_picker(rng, skew.get("devices"), DEVICE_COUNT)
+    if skew.get("time"):
+        offset = skew["time"].sampler(rng)
+
+        def pick_time():
+            return now - timedelta(seconds=offset())
+    else:
+        pick_time = partial(random_past, rng, now, 30, window_s)
+    for _ in range(n):
+        txid = ids.next()
+        corr = ids.next()
+        ai = pick_account()
+        aid = account_ids[ai]
+        customer_id = account_customers[ai]
+        event_time = pick_time()
         ccy = rng.choice(currencies)
         amt_minor = rng.randint(100, 250000)
-        status = weighted_choice(
-            rng, [("AUTHORIZED", 25), ("CAPTURED", 30), ("SETTLED", 35), ("DECLINED", 10)])
-        channel = weighted_choice(
-            rng, [("CARD", 55), ("UPI", 25), ("ACH", 15), ("WIRE", 5)])
-        direction = weighted_choice(rng, [("DEBIT", 85), ("CREDIT", 15)])
-        idemp = f"{acct['customer_id']}:{aid}:{txid[:8]}"
-        tx_rows.append({
+        status = compiled_choice(rng, status_w)
+        channel = compiled_choice(rng, channel_w)
+        direction = compiled_choice(rng, direction_w)
+        idemp = f"{customer_id}:{aid}:{txid[ids.short]}"
+        yield {
             "transaction_id": txid,
             "correlation_id": corr,
             "event_time": iso_utc(event_time),
-            "customer_id": acct["customer_id"],
+            "customer_id": customer_id,
             "account_id": aid,
-            "merchant_id": rng.choice(merchant_ids),
+            "merchant_id": merchant_ids[pick_merchant()],
             "channel": channel,
             "direction": direction,
             "amount": amt_minor,
@@ -385,24 +779,220 @@ def main():
             "status": status,
             "auth_code": str(rng.randint(100000, 999999)),
             "card_last4": str(rng.randint(0, 9999)).zfill(4) if channel == "CARD" else None,
-            "device_id": f"dev_{rng.randint(1, 20000)}",
-            "ip_address": fake.ipv4_public(),
+            "device_id": f"dev_{pick_device() + 1}",
+            "ip_address": values["ip_address"](),
             "idempotency_key": idemp,
             "amount_base": None,
-            "base_currency": acct["base_currency"],
+            "base_currency": account_ccys[ai],
+            "fx_rate": None,
+            "merchant_risk_tier": None,
+        }
+
+
+# IPv4 ranges that Faker's ipv4_public() never returns (private, loopback,
+# link-local, CGNAT, documentation, benchmarking, multicast, reserved).
+NON_PUBLIC_IPV4 = [
+    ("0.0.0.0", 8), ("10.0.0.0", 8), ("100.64.0.0", 10), ("127.0.0.0", 8),
+    ("169.254.0.0", 16), ("172.16.0.0", 12), ("192.0.0.0", 24), ("192.0.2.0", 24),
+    ("192.168.0.0", 16), ("198.18.0.0", 15), ("198.51.100.0", 24), ("203.0.113.0", 24),
+    ("224.0.0.0", 3),
+]
+
+
+OCTETS = [str(i) for i in range(256)]
+
+
+def np_public_ipv4(nrng, m):
+    out = np.empty(0, dtype=np.uint32)
+    while len(out) < m:
+        cand = nrng.integers(0, 2 ** 32, size=m - len(out) + 64, dtype=np.uint32)
+        keep = np.ones(len(cand), dtype=bool)
+        for net, bits in NON_PUBLIC_IPV4:
+            a, b, c, d = (int(x) for x in net.split("."))
+            shift = 32 - bits
+            keep &= (cand >> shift) != (((a << 24) | (b << 16) | (c << 8) | d) >> shift)
+        out = np.concatenate([out, cand[keep]])
+    out = out[:m]
+    o = OCTETS
+    return [f"{o[a]}.{o[b]}.{o[c]}.{o[d]}" for a, b, c, d in zip(
+        (out >> 24).tolist(), ((out >> 16) & 255).tolist(),
+        ((out >> 8) & 255).tolist(), (out & 255).tolist())]
+
+
+def np_weighted_codes(nrng, items, m):
+    cum = np.cumsum([w for _, w in items])
+    return np.searchsorted(cum, nrng.random(m) * cum[-1], side="right")
+
+
+def gen_transaction_blocks(nrng, ids, now, n, accounts, merchants, currencies,
+                           batch_rows, ip_pool=None, window_s=None, skew=None):
+    # account/merchant columns are decoded from the packed tables per block
+    acct_ids, acct_customers = accounts["account_id"], accounts["customer_id"]
+    acct_ccys, merchant_ids = accounts["base_currency"], merchants["merchant_id"]
+    ccys = np.array(currencies, dtype=object)
+    statuses = np.array([v for v, _ in TX_STATUS_WEIGHTS], dtype=object)
+    channels = np.array([v for v, _ in TX_CHANNEL_WEIGHTS], dtype=object)
+    directions = np.array([v for v, _ in TX_DIRECTION_WEIGHTS], dtype=object)
+    card_code = [v for v, _ in TX_CHANNEL_WEIGHTS].index("CARD")
+    last4 = np.array([f"{i:04d}" for i in range(10000)], dtype=object)
+    ips = np.array(ip_pool, dtype=object) if ip_pool else None
+    now_s = int(now.timestamp())
+    short = ids.short
+    skew = skew or {}
+    n_accounts, n_merchants = len(acct_ids), len(merchant_ids)
+
+    for start in range(0, n, batch_rows):
+        m = min(batch_rows, n - start)
+        txids = np_ids(nrng, ids, m)
+        acct = np_pick(nrng, skew.get("accounts"), n_accounts, m)
+        if skew.get("time"):
+            offsets = skew["time"].np_sample(nrng, m)
+        elif window_s is None:
+            offsets = nrng.integers(0, 31, size=m) * 86400 + \
+                nrng.integers(0, 86401, size=m)
+        else:
+            offsets = nrng.integers(0, window_s, size=m)
+        event_times = np.datetime_as_string(
+            (now_s - offsets).astype("datetime64[s]"), unit="s")
+        channel = np_weighted_codes(nrng, TX_CHANNEL_WEIGHTS, m)
+        card = np.where(channel == card_code,
+                        last4[nrng.integers(0, 10000, size=m)], None)
+        customers = acct_customers.take(acct)
+        aids = acct_ids.take(acct)
+        yield {
+            "transaction_id": txids,
+            "correlation_id": np_ids(nrng, ids, m),
+            "event_time": np.char.add(event_times, "Z").tolist(),
+            "customer_id": customers,
+            "account_id": aids,
+            "merchant_id": merchant_ids.take(np_pick(nrng, skew.get("merchants"), n_merchants, m)),
+            "channel": channels[channel].tolist(),
+            "direction": directions[np_weighted_codes(nrng, TX_DIRECTION_WEIGHTS, m)].tolist(),
+            "amount": nrng.integers(100, 250001, size=m).tolist(),
+            "currency": ccys[nrng.integers(0, len(ccys), size=m)].tolist(),
+            "status": statuses[np_weighted_codes(nrng, TX_STATUS_WEIGHTS, m)].tolist(),
+            "auth_code": nrng.integers(100000, 1000000, size=m).astype(str).tolist(),
+            "card_last4": card.tolist(),
+            "device_id": np.char.add("dev_", (np_pick(nrng, skew.get("devices"), DEVICE_COUNT, m) + 1)
+                                     .astype(str)).tolist(),
+            "ip_address": np_public_ipv4(nrng, m) if ips is None
+            else ips[nrng.integers(0, len(ips), size=m)].tolist(),
+            "idempotency_key": [f"{c}:{a}:{t[short]}" for c, a, t in zip(customers, aids, txids)],
+            "amount_base": None,
+            "base_currency": acct_ccys.take(acct),
             "fx_rate": None,
             "merchant_risk_tier": None,
-        })
+        }
+
+
+# text rendering kinds of transaction columns, for the numpy engine's blocks
+# and templated row encoding (see gen_io)
+TX_COLUMN_KINDS = {"amount": "int", "card_last4": "nullable",
+                   "amount_base": "null", "fx_rate": "null", "merchant_risk_tier": "null"}
+
+
+def sample_blocks_into(blocks, reservoir):
+    for b in blocks:
+        reservoir.offer_block(block_len(b), lambda i: {
+                              k: b[k][i] for k in DISPUTE_SOURCE_FIELDS})
+        yield b
+
+
+def fault_injector(refs, shard=None):
+    cfg = refs["faults"]
+    if cfg is None:
+        return None
+    return FaultInjector(cfg, derive_seed(refs["seed"], "faults", shard), refs["format"],
+                         [name for name, _ in TX_COLUMNS],
+                         label_path(cfg["labels_dir"], refs["dataset"], shard),
+                         RAW_TRANSACTIONS_SCHEMA["required"], cfg["fx_first_date"])
+
+
+def write_transactions(directory, shard, rng, ids, fake, nrng, now, n, k, refs):
+    # returns the dispute reservoir sample for the n transactions written and
+    # the stats of the part files holding them
+    reservoir = Reservoir(rng, k)
+    faults = fault_injector(refs, shard)
+    w = open_writer(directory, refs["dataset"], refs["format"], TX_COLUMNS, refs["columnar"],
+                    refs["parts"], shard, TIME_FIELDS["transactions"], TX_COLUMN_KINDS,
+                    refs["serializer"], faults, refs["partition"], refs["pipeline"])
+    try:
+        if refs["engine"] == "numpy":
+            blocks = gen_transaction_blocks(nrng, ids, now, n, refs["accounts"], refs["merchants"],
+                                            refs["currencies"], refs["batch_rows"],
+                                            refs["pools"].get("ip_address"), refs["window_s"], refs["skew"])
+            for b in sample_blocks_into(blocks, reservoir):
+                w.write_block(b, TX_COLUMN_KINDS)
+        else:
+            values = value_sources(TX_FAKER_PROVIDERS, refs["pools"], rng, fake)
+            rows = gen_transactions(rng, ids, values, now, n, refs["accounts"], refs["merchants"],
+                                    refs["currencies"], refs["window_s"], refs["skew"])
+            w.write_rows(sample_into(rows, reservoir))
+        # before the fault labels close: a pipelined writer is still writing
+        w.close()
+    except BaseException:
+        w.abort()
+        raise
+    finally:
+        if faults is not None:
+            faults.close()
+    return reservoir.items, w.parts
+
+
+def derive_seed(seed, *parts):
+    key = ":".join(str(p) for p in (seed,) + parts).encode("utf-8")
+    return int.from_bytes(hashlib.sha256(key).digest()[:8], "big")
+
+
+def split_evenly(total, parts):
+    q, r = divmod(total, parts)
+    return [q + (1 if i < r else 0) for i in range(parts)]
+
+
+_SHARD_REFS = {}
+
+
+def _init_shard_worker(refs):
+    _SHARD_REFS.update(refs)
+
+
+def gen_transaction_shard(task):
+    shard, n, k, directory = task
+    refs = _SHARD_REFS
+    shard_seed = derive_seed(refs["seed"], "transactions", shard)
+    rng = random.Random(shard_seed)
+    Faker.seed(shard_seed)
+    fake = Faker()
+    ids = IdFactory(derive_seed(refs["seed"], "ids", "transactions", shard), refs["id_mode"],
+                    clock_ms=int(refs["now"].timestamp()) * 1000)
+    nrng = np.random.default_rng(shard_seed) if refs["engine"] == "numpy" else None
+    # a fresh pipeline per shard, whose blocked times go back to the parent
+    pipeline = Pipeline(refs["pipeline"].queue_batches) if refs["pipeline"] is not None else None
+    sample, parts = write_transactions(directory, shard, rng, ids, fake, nrng, refs["now"], n, k,
+                                       dict(refs, pipeline=pipeline))
+    return sample, parts, pipeline.totals if pipeline is not None else {}
+
 
-    dispute_rows = []
-    tx_sample = rng.sample(tx_rows, k=min(vols["disputes"], len(tx_rows)))
+def gen_transactions_sharded(raw_dir, shards, workers, refs, n, k):
+    tasks = [(i, shard_n, shard_k, raw_dir)
+             for i, (shard_n, shard_k) in enumerate(zip(split_evenly(n, shards), split_evenly(k, shards)))]
+    with multiprocessing.Pool(workers, initializer=_init_shard_worker, initargs=(refs,)) as pool:
+        results = pool.map(gen_transaction_shard, tasks, chunksize=1)
+    if refs["pipeline"] is not None:
+        for _, _, totals in results:
+            refs["pipeline"].merge(totals)
+    return ([t for sample, _, _ in results for t in sample],
+            [p for _, parts, _ in results for p in parts])
+
+
+def gen_disputes(rng, ids, tx_sample):
     for t in tx_sample:
-        did = str(uuid.uuid4())
+        did = ids.next()
         event_dt = datetime.strptime(
             t["event_time"], ISO_UTC_FMT).replace(tzinfo=timezone.utc)
         opened_at = event_dt + \
             timedelta(days=rng.randint(1, 10), seconds=rng.randint(0, 86400))
-        dispute_rows.append({
+        yield {
             "dispute_id": did,
             "correlation_id": t["correlation_id"],
             "transaction_id": t["transaction_id"],
@@ -411,34 +1001,539 @@ def main():
             "status": weighted_choice(rng, [("OPEN", 55), ("WON", 15), ("LOST", 15), ("CLOSED", 15)]),
             "amount": int(max(100, t["amount"] * rng.uniform(0.2, 1.0))),
             "currency": t["currency"],
-        })
+        }
+
+
+def stream_events(rng, ids, values, refs, dispute_ratio, dispute_delay_s):
+    # endless (dataset, row) source for the firehose: a transaction is stamped
+    # with the wall-clock time it is pulled, and dispute_ratio of them are
+    # followed by a dispute within dispute_delay_s
+    pending = []
+    txs = gen_transactions(rng, ids, values, refs["now"], 2 ** 62, refs["accounts"],
+                           refs["merchants"], refs["currencies"], skew=refs["skew"])
+    for seq, tx in enumerate(txs):
+        clock = time.monotonic()
+        while pending and pending[0][0] <= clock:
+            d = heapq.heappop(pending)[2]
+            d["opened_at"] = iso_utc(utc_now())
+            yield "disputes", d
+        tx["event_time"] = iso_utc(utc_now())
+        if rng.random() < dispute_ratio:
+            heapq.heappush(pending, (clock + rng.uniform(0, dispute_delay_s), seq,
+                                     next(gen_disputes(rng, ids, [tx]))))
+        yield "transactions", tx
+
+
+def emit_transactions(rng, ids, values, refs, vols):
+    cfg = CONFIG["emit"]
+    events = stream_events(rng, ids, values, refs, vols["disputes"] / max(1, vols["transactions"]),
+                           cfg["dispute_delay_s"])
+    encoders = {
+        "transactions": JsonlEncoder(TX_COLUMNS, TX_COLUMN_KINDS, refs["serializer"]),
+        "disputes": JsonlEncoder(DISPUTE_COLUMNS, None, refs["serializer"]),
+    }
+    receiver = local_receiver(cfg) if cfg["local_receiver"] else None
+    print(f"emitting transactions/disputes to the {cfg['sink']} sink, {cfg['profile']} profile, "
+          f"{cfg['rate']} events/s" + (" (local receiver)" if receiver else ""))
+    summary = run_emit(events, encoders, cfg, receiver)
+    print(json.dumps(summary, indent=2))
+    return summary
+
+
+def gen_fx_rates(rng, start_date, days, base_ccy, quote_ccys):
+    providers = ["provider_a", "provider_b"]
+    rows = []
+    for i in range(days):
+        d = start_date + timedelta(days=i)
+        for q in quote_ccys:
+            if q == base_ccy:
+                continue
+            rate = round(rng.uniform(0.2, 120.0), 6)
+            rows.append({
+                "rate_date": d.strftime("%Y-%m-%d"),
+                "base_ccy": base_ccy,
+                "quote_ccy": q,
+                "rate": str(rate),
+                "provider": rng.choice(providers),
+            })
+    return rows
+
+
+def main():
+    inst = Instrumentation("gen_fintech_data", CONFIG["metrics"])
+    try:
+        generate(inst)
+    finally:
+        inst.close()
+
+
+def partition_spec(name):
+    # gen_io partition config for a full-run dataset, or None to write it flat
+    cfg = CONFIG["partitioning"]
+    unknown = set(cfg["datasets"]) - set(PARTITIONABLE)
+    if unknown:
+        raise SystemExit(f'CONFIG["partitioning"]["datasets"]: cannot partition {sorted(unknown)}; '
+                         f"expected some of {PARTITIONABLE}")
+    if name not in cfg["datasets"]:
+        return None
+    return {"by": [["dt", [TIME_FIELDS[name]]]], "max_open_files": cfg["max_open_files"]}
+
+
+def transaction_refs(seed, now, pools, store, fx_first_date, dataset="transactions", window_s=None,
+                     pipeline=None):
+    # everything a transaction writer (or shard worker) needs
+    faults = None
+    if CONFIG["faults"]["enabled"]:
+        if CONFIG["formats"]["transactions"] not in ("jsonl", "csv"):
+            raise SystemExit("fault injection needs jsonl or csv transactions "
+                             f"(got {CONFIG['formats']['transactions']})")
+        faults = dict(CONFIG["faults"], fx_first_date=fx_first_date)
+    return {
+        "seed": seed,
+        "now": now,
+        "window_s": window_s,
+        "dataset": dataset,
+        "engine": CONFIG["engine"],
+        "batch_rows": CONFIG["batch_rows"],
+        "id_mode": CONFIG["id_mode"],
+        "format": CONFIG["formats"]["transactions"],
+        "columnar": CONFIG["columnar"],
+        "parts": CONFIG["parts"],
+        "serializer": CONFIG["serializer"],
+        "accounts": store["accounts"],
+        "merchants": store["merchants"],
+        "skew": build_skew(now, window_s, len(store["accounts"]), len(store["merchants"])),
+        "currencies": CURRENCIES,
+        "pools": {k: v for k, v in pools.items() if k in TX_FAKER_PROVIDERS},
+        "faults": faults,
+        # delta runs (dataset transactions.delta-NNNNN) stay flat
+        "partition": partition_spec(dataset) if dataset == "transactions" else None,
+        "pipeline": pipeline,
+    }
+
+
+def write_transaction_dataset(raw_dir, rng, ids, fake, values, refs, n, k):
+    # writes n transactions as refs["dataset"]; returns the dispute sample
+    # and the part stats
+    name = refs["dataset"]
+    shards = CONFIG["shards"] or CONFIG["workers"]
+    remove_dataset_outputs(raw_dir, name)
+    for path in label_files(CONFIG["faults"]["labels_dir"], name):
+        os.remove(path)
+    # the writer-based paths leave the manifest entry to us; write_dataset
+    # records its own
+    writer_paths = shards > 1 or CONFIG["streaming"] or refs["engine"] == "numpy"
+    if shards > 1:
+        tx_sample, tx_parts = gen_transactions_sharded(raw_dir, shards, min(CONFIG["workers"], shards),
+                                                       refs, n, k)
+    elif writer_paths:
+        nrng = None
+        if refs["engine"] == "numpy":
+            nrng = np.random.default_rng(
+                derive_seed(refs["seed"], "transactions", 0))
+        tx_sample, tx_parts = write_transactions(raw_dir, None, rng, ids, fake, nrng, refs["now"],
+                                                 n, k, refs)
+    else:
+        tx_rows = list(gen_transactions(rng, ids, values, refs["now"], n, refs["accounts"],
+                                        refs["merchants"], CURRENCIES, refs["window_s"], refs["skew"]))
+        tx_sample = rng.sample(
+            tx_rows, k=min(k, len(tx_rows)))
+        faults = fault_injector(refs)
+        try:
+            tx_parts = write_dataset(raw_dir, name, refs["format"], TX_COLUMNS, tx_rows,
+                                     CONFIG["columnar"], CONFIG["parts"], TIME_FIELDS["transactions"],
+                                     TX_COLUMN_KINDS, refs["serializer"], faults, refs["partition"],
+                                     refs["pipeline"])
+        finally:
+            if faults is not None:
+                faults.close()
+    if CONFIG["parts"]["manifest"] and writer_paths:
+        write_manifest(raw_dir, name, refs["format"], CONFIG["parts"], tx_parts,
+                       TIME_FIELDS["transactions"])
+    if refs["partition"] and writer_paths:
+        write_partition_index(raw_dir, name, refs["format"], refs["partition"], tx_parts,
+                              TIME_FIELDS["transactions"])
+    if refs["faults"] is not None:
+        labels_dir = refs["faults"]["labels_dir"]
+        counts = count_labels(label_files(labels_dir, name))
+        print(f"injected {sum(counts.values())} faults into {name} "
+              f"({', '.join(f'{k} {v}' for k, v in sorted(counts.items())) or 'none'}); "
+              f"labels in {labels_dir}")
+    return tx_sample, tx_parts
+
+
+def generate(inst):
+    base_dir = CONFIG["base_dir"]
+    subdirs = CONFIG["subdirs"]
+    seed = CONFIG["seed"]
+    vols = CONFIG["volumes"]
+    fx_cfg = CONFIG["fx"]
+    inc = CONFIG["incremental"]
+
+    ensure_dirs(base_dir, subdirs)
+
+    raw_dir = os.path.join(base_dir, subdirs["raw"])
+    ref_dir = os.path.join(base_dir, subdirs["reference"])
+    contracts_dir = os.path.join(base_dir, subdirs["contracts"])
+
+    incremental = inc["enabled"] and not CONFIG["emit"]["sink"]
+    state = load_state(inc["state_path"]) if incremental else None
+    if state is not None:
+        generate_delta(inst, state, raw_dir, ref_dir)
+        return
+    if incremental:
+        # a fresh full run starts a new chain: drop the previous chain's deltas
+        for directory in (raw_dir, ref_dir, CONFIG["faults"]["labels_dir"]):
+            for path in glob.glob(os.path.join(glob.escape(directory), "*.delta-*")):
+                os.remove(path)
+
+    cache = open_cache(incremental)
+    keys = cache_keys() if cache is not None else {}
+    hits = cache.resume(CACHE_STAGES, keys) if cache is not None else {}
+    pipeline = open_pipeline()
+
+    rng = random.Random(seed)
+    Faker.seed(seed)
+    fake = Faker()
+
+    now = anchor_now(CONFIG["anchor_time"])
+    ids = IdFactory(derive_seed(seed, "ids"), CONFIG["id_mode"],
+                    clock_ms=int(now.timestamp()) * 1000)
+
+    pools = load_pools(FAKER_PROVIDERS, CONFIG["value_pools"], seed)
+    values = value_sources(FAKER_PROVIDERS, pools, rng, fake)
+
+    # entities stream straight to their files; only the packed tables stay
+    # in memory
+    store = new_store(CONFIG["id_mode"])
+    customers, accounts, merchants = store["customers"], store["accounts"], store["merchants"]
+    tx_sample = None
+    if hits:
+        # carry on from the generator state after the last cached stage
+        tx_sample = load_stage_state(hits[CACHE_STAGES[len(hits) - 1]]["state"], rng, fake, ids, store)
+    dirs = {"raw": raw_dir, "reference": ref_dir, "labels": CONFIG["faults"]["labels_dir"],
+            "contracts": contracts_dir}
+
+    def cached(stage, role, build):
+        # build() writes the stage and returns its part stats; a cached stage
+        # is restored instead, and a built one stored with the state after it
+        if stage in hits:
+            return restore_stage(cache, hits[stage], dirs)
+        parts = build()
+        if cache is not None:
+            store_stage(cache, keys[stage], stage, role, dirs, parts,
+                        stage_state(rng, fake, ids, store, tx_sample if stage == "transactions" else None))
+        return parts
+
+    with inst.stage("reference_entities") as m:
+        m.add_parts(cached("customers", "reference", lambda: write_reference_dataset(
+            ref_dir, "customers", gen_customers(rng, ids, values, now, vols["customers"], table=customers),
+            pipeline=pipeline)))
+        m.add_parts(cached("accounts", "reference", lambda: write_reference_dataset(
+            ref_dir, "accounts", gen_accounts(rng, ids, now, vols["accounts"], customers["customer_id"],
+                                              table=accounts), pipeline=pipeline)))
+        m.add_parts(cached("merchants", "reference", lambda: write_reference_dataset(
+            ref_dir, "merchants", gen_merchants(rng, ids, values, now, vols["merchants"], table=merchants),
+            pipeline=pipeline)))
+
+    fx_start = (now - timedelta(days=vols["fx_days"])).date()
+    refs = transaction_refs(seed, now, pools, store, fx_start, pipeline=pipeline)
+    if refs["engine"] == "numpy" and np is None:
+        raise SystemExit('CONFIG["engine"] = "numpy" requires numpy (pip install numpy)')
+
+    if CONFIG["emit"]["sink"]:
+        with inst.stage("fx_rates") as m:
+            m.add_parts(write_reference_dataset(ref_dir, "fx_rates", gen_fx_rates(
+                rng, fx_start, vols["fx_days"], fx_cfg["base_ccy"], fx_cfg["quote_ccys"])))
+        with inst.stage("contracts"):
+            write_contracts(contracts_dir, raw_dir, ref_dir, now)
+        with inst.stage("emit") as m:
+            summary = emit_transactions(rng, ids, values, refs, vols)
+            m.rows, m.bytes = summary["events"], summary["bytes"]
+        return
+
+    def build_transactions():
+        nonlocal tx_sample
+        tx_sample, tx_parts = write_transaction_dataset(raw_dir, rng, ids, fake, values, refs,
+                                                        vols["transactions"], vols["disputes"])
+        return tx_parts
+
+    with inst.stage("transactions") as m:
+        m.add_parts(cached("transactions", "raw", build_transactions))
 
-    fx_start = (utc_now() - timedelta(days=vols["fx_days"])).date()
-    fx_rows = gen_fx_rates(
-        rng, fx_start, vols["fx_days"], fx_cfg["base_ccy"], fx_cfg["quote_ccys"])
+    with inst.stage("disputes") as m:
+        m.add_parts(cached("disputes", "raw", lambda: write_dataset(
+            raw_dir, "disputes", CONFIG["formats"]["disputes"], DISPUTE_COLUMNS,
+            gen_disputes(rng, ids, tx_sample), CONFIG["columnar"], CONFIG["parts"], TIME_FIELDS["disputes"],
+            serializer=CONFIG["serializer"], partition=partition_spec("disputes"), pipeline=pipeline)))
 
-    write_csv(os.path.join(ref_dir, "customers.csv"),
-              ["customer_id", "full_name", "email", "phone_e164",
-                  "dob", "kyc_level", "country", "created_at"],
-              customer_rows)
+    with inst.stage("fx_rates") as m:
+        m.add_parts(cached("fx_rates", "reference", lambda: write_reference_dataset(
+            ref_dir, "fx_rates", gen_fx_rates(rng, fx_start, vols["fx_days"], fx_cfg["base_ccy"],
+                                              fx_cfg["quote_ccys"]), pipeline=pipeline)))
 
-    write_csv(os.path.join(ref_dir, "accounts.csv"),
-              ["account_id", "customer_id", "account_type",
-                  "status", "base_currency", "opened_at"],
-              account_rows)
+    with inst.stage("contracts"):
+        # keyed apart: contracts depend on the paths and anchor time, not the draws
+        entry = cache.get(keys["contracts"]) if cache is not None else None
+        if entry is not None:
+            cache.restore(entry, dirs)
+        else:
+            paths = write_contracts(contracts_dir, raw_dir, ref_dir, now)
+            if cache is not None:
+                cache.put(keys["contracts"], "contracts", [("contracts", p) for p in paths])
 
-    write_csv(os.path.join(ref_dir, "merchants.csv"),
-              ["merchant_id", "merchant_name", "mcc",
-                  "country", "risk_tier", "created_at"],
-              merchant_rows)
+    if cache is not None:
+        print(cache.summary())
+    if pipeline is not None:
+        print(pipeline.summary())
 
-    write_csv(os.path.join(ref_dir, "fx_rates.csv"),
-              ["rate_date", "base_ccy", "quote_ccy", "rate", "provider"],
-              fx_rows)
+    if incremental:
+        save_state(inc["state_path"], generator_state(
+            0, now, fx_start, fx_start + timedelta(days=vols["fx_days"] - 1), rng, fake, ids, store))
+        print(f"incremental state saved to {inc['state_path']} (watermark {iso_utc(now)})")
 
-    write_jsonl(os.path.join(raw_dir, "transactions.jsonl"), tx_rows)
-    write_jsonl(os.path.join(raw_dir, "disputes.jsonl"), dispute_rows)
 
+def open_pipeline():
+    # a Pipeline for a full run to files, or None to write inline
+    cfg = CONFIG["pipeline"]
+    if not cfg["enabled"] or CONFIG["emit"]["sink"]:
+        return None
+    return Pipeline(cfg["queue_batches"])
+
+
+def open_cache(incremental):
+    cfg = CONFIG["cache"]
+    if not cfg["enabled"]:
+        return None
+    if incremental or CONFIG["emit"]["sink"]:
+        print("dataset cache skipped: incremental and emit runs always generate")
+        return None
+    if CONFIG["anchor_time"] is None:
+        print("dataset cache skipped: it needs a fixed anchor_time (the wall clock changes every run)")
+        return None
+    return DatasetCache(cfg["dir"], cfg["link"])
+
+
+def cache_keys():
+    # stage -> cache key; each dataset chains the key of the one drawn before it
+    version = code_version(GENERATOR_VERSION, glob.glob(
+        os.path.join(glob.escape(os.path.dirname(os.path.abspath(__file__))), "gen_*.py")))
+    vols, fmts = CONFIG["volumes"], CONFIG["formats"]
+    common = {
+        "generator": "gen_fintech_data", "version": version, "seed": CONFIG["seed"],
+        "id_mode": CONFIG["id_mode"], "anchor_time": CONFIG["anchor_time"],
+        "value_pools": CONFIG["value_pools"], "columnar": CONFIG["columnar"], "parts": CONFIG["parts"],
+    }
+    slices = {
+        "customers": {"n": vols["customers"], "format": fmts["customers"]},
+        "accounts": {"n": vols["accounts"], "format": fmts["accounts"]},
+        "merchants": {"n": vols["merchants"], "format": fmts["merchants"]},
+        "transactions": {
+            "n": vols["transactions"], "sample": vols["disputes"],
+            # fault injection reads the first FX date
+            "fx_days": vols["fx_days"] if CONFIG["faults"]["enabled"] else None,
+            "format": fmts["transactions"], "streaming": CONFIG["streaming"],
+            "shards": CONFIG["shards"] or CONFIG["workers"], "engine": CONFIG["engine"],
+            "batch_rows": CONFIG["batch_rows"], "skew": CONFIG["skew"], "faults": CONFIG["faults"],
+            "partition": partition_spec("transactions"),
+        },
+        "disputes": {"format": fmts["disputes"], "partition": partition_spec("disputes")},
+        "fx_rates": {"days": vols["fx_days"], "fx": CONFIG["fx"], "format": fmts["fx_rates"]},
+    }
+    keys, prev = {}, None
+    for stage in CACHE_STAGES:
+        keys[stage] = prev = cache_key(common, stage, slices[stage], prev)
+    keys["contracts"] = cache_key("gen_fintech_data", version, "contracts", CONFIG["base_dir"],
+                                  CONFIG["subdirs"], CONFIG["anchor_time"])
+    return keys
+
+
+def stage_state(rng, fake, ids, store, tx_sample=None):
+    # everything the stages after this one draw from
+    return {
+        "rng": rng_state(rng),
+        "faker_rng": rng_state(fake.random),
+        "ids": ids.getstate(exact=True),
+        "entities": {name: table.getstate() for name, table in store.items()},
+        "tx_sample": tx_sample,
+    }
+
+
+def load_stage_state(state, rng, fake, ids, store):
+    # restores a stage_state(); returns its transaction sample
+    restore_rng(rng, state["rng"])
+    restore_rng(fake.random, state["faker_rng"])
+    ids.setstate(state["ids"])
+    for name, table in store.items():
+        table.setstate(state["entities"][name])
+    return state["tx_sample"]
+
+
+def store_stage(cache, key, name, role, dirs, parts, state):
+    extra = []
+    if name == "transactions":
+        extra = [("labels", path) for path in label_files(dirs["labels"], name)]
+    dataset = (name, role, CONFIG["formats"][name], TIME_FIELDS[name], CONFIG["parts"], parts)
+    cache.put_datasets(key, name, dirs, [dataset], state, extra)
+
+
+def restore_stage(cache, entry, dirs):
+    # a cached dataset back in place of whatever was there; returns its parts
+    name = entry["stage"]
+    if name == "transactions":
+        for path in label_files(dirs["labels"], name):
+            os.remove(path)
+    return cache.restore_datasets(entry, dirs)[name]
+
+
+def generator_state(run, watermark, fx_first_date, fx_last_date, rng, fake, ids, store):
+    return {
+        "seed": CONFIG["seed"],
+        "id_mode": CONFIG["id_mode"],
+        "run": run,
+        "watermark": iso_utc(watermark),
+        "fx_first_date": fx_first_date.isoformat(),
+        "fx_last_date": fx_last_date.isoformat(),
+        "rng": rng_state(rng),
+        "faker_rng": rng_state(fake.random),
+        "ids": ids.getstate(),
+        "entities": {name: table.getstate() for name, table in store.items()},
+    }
+
+
+def delta_name(name, run):
+    return f"{name}.delta-{run:05d}"
+
+
+def change_entities(rng, table, n, field, choices):
+    # moves `field` of n random existing rows to a different value; returns
+    # the changed row indices
+    column = table[field]
+    changed = rng.sample(range(len(table)), k=min(n, len(table)))
+    for i in changed:
+        column[i] = rng.choice([c for c in choices if c != column[i]])
+    return changed
+
+
+def generate_delta(inst, state, raw_dir, ref_dir):
+    # one incremental run: everything between the saved watermark and the new
+    # one, written as delta files next to the full datasets
+    seed = CONFIG["seed"]
+    inc = CONFIG["incremental"]
+    fx_cfg = CONFIG["fx"]
+    if (state["seed"], state["id_mode"]) != (seed, CONFIG["id_mode"]):
+        raise SystemExit(f"{inc['state_path']} was written with seed {state['seed']} / id_mode "
+                         f"{state['id_mode']!r}; delete it to start a fresh full run")
+
+    watermark = anchor_now(state["watermark"])
+    if inc["advance_days"]:
+        now = watermark + timedelta(days=inc["advance_days"])
+    else:
+        now = anchor_now(CONFIG["anchor_time"])
+    window_s = int((now - watermark).total_seconds())
+    if window_s <= 0:
+        print(f"nothing to append: {iso_utc(now)} is not after the watermark {state['watermark']}")
+        return
+    run = state["run"] + 1
+
+    def vol(key):
+        return int(round(inc["per_day"][key] * window_s / 86400))
+
+    rng = random.Random()
+    restore_rng(rng, state["rng"])
+    Faker.seed(seed)
+    fake = Faker()
+    restore_rng(fake.random, state["faker_rng"])
+    ids = IdFactory(derive_seed(seed, "ids"), CONFIG["id_mode"],
+                    clock_ms=int(now.timestamp()) * 1000)
+    ids.setstate(state["ids"])
+
+    pools = load_pools(FAKER_PROVIDERS, CONFIG["value_pools"], seed)
+    values = value_sources(FAKER_PROVIDERS, pools, rng, fake)
+
+    store = new_store(CONFIG["id_mode"])
+    for name, table in store.items():
+        table.setstate(state["entities"][name])
+    customers, accounts, merchants = store["customers"], store["accounts"], store["merchants"]
+    with inst.stage("reference_entities") as m:
+        # changes are drawn from the entities that existed before this run;
+        # a delta row is the entity's full current row
+        delta = {
+            "customers": change_entities(rng, customers, vol("changed_customers"), "kyc_level", KYC_LEVELS),
+            "accounts": change_entities(rng, accounts, vol("changed_accounts"), "status",
+                                        ["ACTIVE", "SUSPENDED", "CLOSED"]),
+            "merchants": change_entities(rng, merchants, vol("changed_merchants"), "risk_tier",
+                                         ["LOW", "MEDIUM", "HIGH"]),
+        }
+        first_new = {name: len(table) for name, table in store.items()}
+        for _ in gen_customers(rng, ids, values, now, vol("new_customers"), window_s, customers):
+            pass
+        for _ in gen_accounts(rng, ids, now, vol("new_accounts"), customers["customer_id"], window_s,
+                              accounts):
+            pass
+        for _ in gen_merchants(rng, ids, values, now, vol("new_merchants"), window_s, merchants):
+            pass
+        for name, table in store.items():
+            delta[name] += range(first_new[name], len(table))
+            m.add_parts(write_reference_dataset(ref_dir, name, [table.row(i) for i in delta[name]], run))
+
+    fx_first = date.fromisoformat(state["fx_first_date"])
+    refs = transaction_refs(derive_seed(seed, "run", run), now, pools, store, fx_first,
+                            delta_name("transactions", run), window_s)
+    if refs["engine"] == "numpy" and np is None:
+        raise SystemExit('CONFIG["engine"] = "numpy" requires numpy (pip install numpy)')
+
+    with inst.stage("transactions") as m:
+        tx_sample, tx_parts = write_transaction_dataset(raw_dir, rng, ids, fake, values, refs,
+                                                        vol("transactions"), vol("disputes"))
+        m.add_parts(tx_parts)
+
+    with inst.stage("disputes") as m:
+        dispute_rows = gen_disputes(rng, ids, tx_sample)
+        m.add_parts(write_dataset(raw_dir, delta_name("disputes", run), CONFIG["formats"]["disputes"],
+                                  DISPUTE_COLUMNS, dispute_rows, CONFIG["columnar"], CONFIG["parts"],
+                                  TIME_FIELDS["disputes"], serializer=CONFIG["serializer"]))
+
+    with inst.stage("fx_rates") as m:
+        # FX days after the last one written, up to the day before now (as in
+        # a full run)
+        fx_last = date.fromisoformat(state["fx_last_date"])
+        fx_days = max(0, (now.date() - fx_last).days - 1)
+        fx_rows = gen_fx_rates(
+            rng, fx_last + timedelta(days=1), fx_days, fx_cfg["base_ccy"], fx_cfg["quote_ccys"])
+        m.add_parts(write_reference_dataset(ref_dir, "fx_rates", fx_rows, run))
+
+    save_state(inc["state_path"], generator_state(
+        run, now, fx_first, fx_last + timedelta(days=fx_days), rng, fake, ids, store))
+    print(f"appended run {run}: {state['watermark']} -> {iso_utc(now)}, "
+          f"{sum(p['rows'] for p in tx_parts)} transactions, {len(fx_rows)} fx rates, "
+          f"{len(delta['customers'])}/{len(delta['accounts'])}/{len(delta['merchants'])} "
+          f"customer/account/merchant changes")
+
+
+REFERENCE_COLUMNS = {
+    "customers": CUSTOMER_COLUMNS,
+    "accounts": ACCOUNT_COLUMNS,
+    "merchants": MERCHANT_COLUMNS,
+    "fx_rates": FX_RATE_COLUMNS,
+}
+
+
+def write_reference_dataset(ref_dir, name, rows, run=None, pipeline=None):
+    # returns the part stats; with run set (incremental mode) the rows go to
+    # the run's delta file, and an empty delta is skipped
+    if run is not None:
+        if not rows:
+            return []
+        name, dataset = delta_name(name, run), name
+    else:
+        dataset = name
+    return write_dataset(ref_dir, name, CONFIG["formats"][dataset], REFERENCE_COLUMNS[dataset], rows,
+                         CONFIG["columnar"], CONFIG["parts"], TIME_FIELDS[dataset],
+                         serializer=CONFIG["serializer"], pipeline=pipeline)
+
+
+def write_contracts(contracts_dir, raw_dir, ref_dir, now):
     write_json(os.path.join(contracts_dir,
                "raw_transactions.schema.json"), RAW_TRANSACTIONS_SCHEMA)
     write_yaml(os.path.join(contracts_dir,
@@ -471,7 +1566,7 @@ def main():
 
     bundle = {
         "version": "1.0",
-        "generated_at": iso_utc(utc_now()),
+        "generated_at": iso_utc(now),
         "paths": {
             "raw": raw_dir,
             "reference": ref_dir,
@@ -490,7 +1585,243 @@ def main():
 
     write_json(os.path.join(contracts_dir, "contracts_bundle.json"), bundle)
     write_yaml(os.path.join(contracts_dir, "contracts_bundle.yaml"), bundle)
+    # the files written, for the dataset cache
+    return [os.path.join(contracts_dir, name + ext) for name in
+            [n + ".schema" for n in bundle["schemas"]] + ["contracts_bundle"] for ext in (".json", ".yaml")]
+
+
+def plan_datasets():
+    # what a full run writes (see gen_plan): rows, the instrumentation stage,
+    # rows held in memory at once and rows kept in the packed entity tables
+    vols = CONFIG["volumes"]
+    shards = CONFIG["shards"] or CONFIG["workers"]
+    n = vols["transactions"]
+    if CONFIG["engine"] == "numpy":
+        batch = CONFIG["batch_rows"]
+    elif CONFIG["formats"]["transactions"] in ("parquet", "arrow"):
+        batch = CONFIG["columnar"]["row_group_rows"]
+    else:
+        batch = TEXT_BATCH_ROWS
+    held = n if shards == 1 and not CONFIG["streaming"] and CONFIG["engine"] == "python" \
+        else min(-(-n // shards), batch)
+    entities = [{"name": name, "stage": "reference_entities", "dir": "reference", "rows": vols[name],
+                 "table_rows": vols[name]} for name in ("customers", "accounts", "merchants")]
+    return entities + [
+        {"name": "transactions", "stage": "transactions", "dir": "raw", "rows": n, "held_rows": held,
+         "parallel": max(1, min(CONFIG["workers"], shards, os.cpu_count() or 1)),
+         "processes": max(1, min(CONFIG["workers"], shards))},
+        {"name": "disputes", "stage": "disputes", "dir": "raw", "rows": vols["disputes"],
+         "held_rows": vols["disputes"]},
+        {"name": "fx_rates", "stage": "fx_rates", "dir": "reference",
+         "rows": vols["fx_days"] * len(CONFIG["fx"]["quote_ccys"])},
+    ]
+
+
+def cost_profile():
+    # the settings the per-row costs depend on
+    return {
+        "formats": CONFIG["formats"], "engine": CONFIG["engine"], "streaming": CONFIG["streaming"],
+        "compression": CONFIG["parts"]["compression"], "columnar": CONFIG["columnar"]["compression"],
+        "value_pools": CONFIG["value_pools"]["enabled"], "faults": CONFIG["faults"]["enabled"],
+    }
+
+
+def memory_costs(n=2000):
+    # tracemalloc bytes per packed entity row and per row held in memory
+    rng = random.Random(CONFIG["seed"])
+    now = anchor_now(CONFIG["anchor_time"])
+    ids = IdFactory(derive_seed(CONFIG["seed"], "ids"), CONFIG["id_mode"])
+    ids.next()
+    pools = load_pools(FAKER_PROVIDERS, CONFIG["value_pools"], CONFIG["seed"])
+    values = value_sources(FAKER_PROVIDERS, pools, rng, Faker())
+    store = new_store(CONFIG["id_mode"])
+
+    def fill(name, rows):
+        for _ in rows:
+            pass
+        return store[name]
+
+    table = {
+        "customers": traced_bytes(lambda: fill("customers", gen_customers(
+            rng, ids, values, now, n, table=store["customers"]))) / n,
+        "accounts": traced_bytes(lambda: fill("accounts", gen_accounts(
+            rng, ids, now, n, store["customers"]["customer_id"], table=store["accounts"]))) / n,
+        "merchants": traced_bytes(lambda: fill("merchants", gen_merchants(
+            rng, ids, values, now, n, table=store["merchants"]))) / n,
+    }
+    tx_rows = list(gen_transactions(rng, ids, values, now, 1000, store["accounts"], store["merchants"],
+                                    CURRENCIES))
+    if CONFIG["engine"] == "numpy" and np is not None:
+        tx = traced_bytes(lambda: list(gen_transaction_blocks(
+            np.random.default_rng(0), ids, now, n, store["accounts"], store["merchants"], CURRENCIES, n))) / n
+    else:
+        tx = traced_bytes(lambda: list(gen_transactions(
+            rng, ids, values, now, n, store["accounts"], store["merchants"], CURRENCIES))) / n
+    rows = {
+        "transactions": tx,
+        # the dispute reservoir keeps these fields of the sampled transactions
+        "disputes": traced_bytes(lambda: [{k: r[k] for k in DISPUTE_SOURCE_FIELDS} for r in tx_rows]) / 1000,
+    }
+    return table, rows
+
+
+def calibrate():
+    # per-row costs of the current settings from a calibration_scale run in
+    # a temp directory; stored in costs_path and returned
+    saved = copy.deepcopy(CONFIG)
+    tmp = tempfile.mkdtemp(prefix="plan-calibrate-")
+    try:
+        scale_volumes(CONFIG["volumes"], CONFIG["plan"]["calibration_scale"], SCALED_VOLUMES)
+        CONFIG["base_dir"] = tmp
+        CONFIG["faults"]["labels_dir"] = os.path.join(tmp, "labels")
+        CONFIG["metrics"] = {"enabled": True, "path": os.path.join(tmp, "metrics.jsonl"), "dimensions": {},
+                             "tracemalloc": False, "profile_path": None}
+        CONFIG["emit"]["sink"] = None
+        CONFIG["incremental"]["enabled"] = False
+        CONFIG["cache"]["enabled"] = False
+        inst = Instrumentation("gen_fintech_data", CONFIG["metrics"])
+        t0 = time.perf_counter()
+        generate(inst)
+        wall = time.perf_counter() - t0
+        dirs = {"raw": os.path.join(tmp, CONFIG["subdirs"]["raw"]),
+                "reference": os.path.join(tmp, CONFIG["subdirs"]["reference"])}
+        table_mem, row_mem = memory_costs()
+        costs = measure_costs(plan_datasets(), inst.records, wall, dirs, row_mem, table_mem)
+    finally:
+        CONFIG.clear()
+        CONFIG.update(saved)
+        shutil.rmtree(tmp, ignore_errors=True)
+    costs["profile"] = cost_profile()
+    save_costs(CONFIG["plan"]["costs_path"], "gen_fintech_data", cost_profile(), costs)
+    print(f"calibrated per-row costs saved to {CONFIG['plan']['costs_path']}")
+    return costs
+
+
+def plan(costs=None):
+    source = "costs just calibrated"
+    if costs is None:
+        costs = load_costs(CONFIG["plan"]["costs_path"], "gen_fintech_data", cost_profile())
+        source = costs_source(costs or DEFAULT_PLAN_COSTS, costs is None)
+    note = None
+    if costs is None:
+        costs = DEFAULT_PLAN_COSTS
+        if costs["profile"] != cost_profile():
+            note = ("the built-in costs were measured with the default formats/engine/compression; "
+                    "run --calibrate with these settings for a closer estimate")
+    if CONFIG["incremental"]["enabled"] or CONFIG["emit"]["sink"]:
+        note = (note + "\n" if note else "") + "the plan covers a full run to files"
+    print_plan("gen_fintech_data", estimate(plan_datasets(), costs), source, CONFIG["base_dir"], note)
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(
+        description="Generate the fintech workshop datasets and contracts.")
+    p.add_argument("--workers", type=int, default=CONFIG["workers"],
+                   help="processes generating transaction shards")
+    p.add_argument("--shards", type=int, default=CONFIG["shards"],
+                   help="transaction part files (default: --workers); "
+                        "output is reproducible for a given seed and shard count")
+    p.add_argument("--engine", choices=["python", "numpy"], default=CONFIG["engine"],
+                   help="transaction engine: per-row python or column-block numpy")
+    p.add_argument("--id-mode", choices=ID_MODES, default=CONFIG["id_mode"],
+                   help="uuid4-shaped IDs or monotonic ULIDs, both drawn from the seed")
+    p.add_argument("--anchor-time", default=CONFIG["anchor_time"],
+                   help="fixed current time (YYYY-MM-DDTHH:MM:SSZ) for byte-identical seeded runs")
+    p.add_argument("--format", action="append", default=[], metavar="DATASET=FORMAT",
+                   help=f"output format for one dataset ({', '.join(FORMATS)}); repeatable")
+    p.add_argument("--max-part-rows", type=int, default=CONFIG["parts"]["max_rows"],
+                   help="roll each dataset into part files of at most this many rows")
+    p.add_argument("--max-part-bytes", type=int, default=CONFIG["parts"]["max_bytes"],
+                   help="roll each dataset into part files of about this many uncompressed bytes")
+    p.add_argument("--compress", choices=[c for c in COMPRESSIONS if c], default=CONFIG["parts"]["compression"],
+                   help="compress jsonl/csv output files")
+    p.add_argument("--manifest", action="store_true", default=CONFIG["parts"]["manifest"],
+                   help="write manifest.json (rows, bytes, time range, sha256 per part) next to the data")
+    p.add_argument("--partition", action="append", choices=PARTITIONABLE, default=[], metavar="DATASET",
+                   help="write DATASET Hive-partitioned by event date (<raw>/DATASET/dt=YYYY-MM-DD/) with "
+                        "a _partitions.json index; repeatable")
+    p.add_argument("--pipeline", action="store_true", default=CONFIG["pipeline"]["enabled"],
+                   help="write each dataset from a background thread fed through a bounded queue, "
+                        "overlapping I/O with generation (CONFIG[\"pipeline\"])")
+    p.add_argument("--serializer", choices=SERIALIZERS, default=CONFIG["serializer"],
+                   help="JSON encoder backend; output bytes are the same for all of them")
+    p.add_argument("--emit", choices=SINKS, default=CONFIG["emit"]["sink"],
+                   help="stream transactions/disputes to a sink in real time instead of writing files")
+    p.add_argument("--profile", choices=PROFILES, default=CONFIG["emit"]["profile"],
+                   help="emit load profile (CONFIG[\"emit\"] holds the ramp/burst settings)")
+    p.add_argument("--rate", type=float, default=CONFIG["emit"]["rate"],
+                   help="emit target events/sec")
+    p.add_argument("--duration", type=float, default=CONFIG["emit"]["duration_s"],
+                   help="emit run time in seconds (0 = until Ctrl-C)")
+    p.add_argument("--local-receiver", action="store_true", default=CONFIG["emit"]["local_receiver"],
+                   help="run the stand-in HTTP/TCP receiver in-process, so no NiFi is needed")
+    p.add_argument("--value-pools", action="store_true", default=CONFIG["value_pools"]["enabled"],
+                   help="draw Faker columns from pre-generated pools (CONFIG[\"value_pools\"])")
+    p.add_argument("--skew", choices=sorted(SKEW_PRESETS), default=None,
+                   help="hot-key / diurnal / burst preset for transaction picks (gen_skew.SKEW_PRESETS)")
+    p.add_argument("--faults", action="store_true", default=CONFIG["faults"]["enabled"],
+                   help="inject labelled faults into the transaction files (CONFIG[\"faults\"] holds the rates)")
+    p.add_argument("--incremental", action="store_true", default=CONFIG["incremental"]["enabled"],
+                   help="save generator state after a full run and append delta files on later runs")
+    p.add_argument("--advance-days", type=float, default=CONFIG["incremental"]["advance_days"],
+                   help="with --incremental, append this many days after the saved watermark")
+    p.add_argument("--scale", metavar="SF",
+                   help="scale factor: SF1 is CONFIG[\"volumes\"], SF100 multiplies every entity and event count "
+                        "by 100 (fx_days stays)")
+    p.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                   help="override a CONFIG value by dotted path, e.g. volumes.transactions=5e6; "
+                        "repeatable, applied after every other option")
+    p.add_argument("--plan", action="store_true",
+                   help="print the predicted rows, bytes, runtime and peak memory and exit without writing")
+    p.add_argument("--calibrate", action="store_true",
+                   help="measure per-row costs for these settings with a small run, save them "
+                        "(CONFIG[\"plan\"][\"costs_path\"]) and print the plan")
+    p.add_argument("--cache", action="store_true", default=CONFIG["cache"]["enabled"],
+                   help="reuse unchanged datasets from CONFIG[\"cache\"][\"dir\"] (needs --anchor-time)")
+    p.add_argument("--metrics", nargs="?", const=CONFIG["metrics"]["path"], default=None, metavar="PATH",
+                   help="append per-stage flow_kpis records to PATH (default: CONFIG[\"metrics\"][\"path\"])")
+    p.add_argument("--tracemalloc", action="store_true", default=CONFIG["metrics"]["tracemalloc"],
+                   help="with --metrics, also record each stage's traced Python heap peak (slower)")
+    p.add_argument("--cprofile", default=CONFIG["metrics"]["profile_path"], metavar="PATH",
+                   help="write a cProfile dump of the whole run to PATH")
+    return p.parse_args(argv)
 
 
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    CONFIG["workers"] = args.workers
+    CONFIG["shards"] = args.shards
+    CONFIG["engine"] = args.engine
+    CONFIG["id_mode"] = args.id_mode
+    CONFIG["anchor_time"] = args.anchor_time
+    CONFIG["value_pools"]["enabled"] = args.value_pools
+    CONFIG["serializer"] = args.serializer
+    CONFIG["emit"].update(sink=args.emit, profile=args.profile, rate=args.rate,
+                          duration_s=args.duration or None, local_receiver=args.local_receiver)
+    if args.skew:
+        apply_preset(CONFIG["skew"], args.skew)
+    CONFIG["faults"]["enabled"] = args.faults
+    CONFIG["incremental"].update(enabled=args.incremental, advance_days=args.advance_days)
+    CONFIG["cache"]["enabled"] = args.cache
+    CONFIG["pipeline"]["enabled"] = args.pipeline
+    if args.partition:
+        CONFIG["partitioning"]["datasets"] = args.partition
+    if args.metrics:
+        CONFIG["metrics"].update(enabled=True, path=args.metrics)
+    CONFIG["metrics"].update(tracemalloc=args.tracemalloc, profile_path=args.cprofile)
+    CONFIG["parts"].update(max_rows=args.max_part_rows, max_bytes=args.max_part_bytes,
+                           compression=args.compress, manifest=args.manifest)
+    for spec in args.format:
+        name, _, fmt = spec.partition("=")
+        if name not in CONFIG["formats"] or fmt not in FORMATS:
+            raise SystemExit(f"--format expects DATASET=FORMAT with DATASET in "
+                             f"{sorted(CONFIG['formats'])} and FORMAT in {FORMATS}")
+        CONFIG["formats"][name] = fmt
+    if args.scale:
+        scale_volumes(CONFIG["volumes"], parse_scale(args.scale), SCALED_VOLUMES)
+    for spec in args.set:
+        set_value(CONFIG, spec)
+    if args.plan or args.calibrate:
+        plan(calibrate() if args.calibrate else None)
+    else:
+        main()
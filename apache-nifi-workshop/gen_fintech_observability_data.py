@@ -1,11 +1,33 @@
+import argparse
+import copy
+import glob
+import hashlib
+import heapq
 import json
 import os
 import random
-import uuid
+import shutil
+import tempfile
+import time
 from datetime import datetime, timedelta, timezone
+from functools import partial
+from operator import itemgetter
 
 from faker import Faker
 
+from gen_cache import DatasetCache, cache_key, code_version
+from gen_ids import IdFactory
+from gen_io import TEXT_BATCH_ROWS, JsonlEncoder, atomic_write, open_writer, remove_dataset_outputs, write_dataset
+from gen_metrics import Instrumentation
+from gen_ordering import ascending_uniforms, node_getter, ordered
+from gen_pipeline import Pipeline
+from gen_plan import (costs_source, estimate, load_costs, measure_costs, parse_scale, print_plan, save_costs,
+                      scale_volumes, set_value, traced_bytes)
+from gen_pools import load_pools, value_sources
+from gen_skew import SKEW_PRESETS, AliasTable, apply_preset, time_profile
+from gen_slo import DERIVED_SLO_COLUMNS, SloAggregator
+from gen_state import restore_rng, rng_state
+
 # Config block: edit values here
 CONFIG = {
     "base_dir": "./data",
@@ -15,6 +37,11 @@ CONFIG = {
         "obs_curated": "obs/curated",
     },
     "seed": 11,
+    # IDs come from the seeded RNG: "uuid4" (contract-shaped) or "ulid"
+    "id_mode": "uuid4",
+    # fixed "now" (e.g. "2026-01-01T00:00:00Z") makes seeded runs
+    # byte-identical; None uses the wall clock
+    "anchor_time": None,
     "volumes": {
         "bulletins": 2000,
         "provenance": 5000,
@@ -24,10 +51,193 @@ CONFIG = {
     },
     "flows": ["ingest_validate", "enrich_post", "dlq_replay", "observability_plane"],
     "nodes": ["n1", "n2", "n3"],
+    # node imbalance and event-time shape (see gen_skew; --skew PRESET fills
+    # these from gen_skew.SKEW_PRESETS): node_weights is one weight per
+    # node, diurnal/weekly are curve names or weight lists, bursts are
+    # [{"ago_hours": .., "hours": .., "multiplier": ..}]; None = uniform
+    "skew": {"node_weights": None, "diurnal": None, "weekly": None, "bursts": []},
+    # output format per dataset: "jsonl", "csv", "parquet" or "arrow"
+    # (parquet/arrow need pyarrow; columnar sets row groups and codec)
+    "formats": {
+        "nifi_bulletins": "jsonl",
+        "nifi_provenance": "jsonl",
+        "flow_kpis": "jsonl",
+        "alerts": "jsonl",
+    },
+    "columnar": {"row_group_rows": 250_000, "compression": "zstd"},
+    # roll each dataset into part files of at most max_rows rows / max_bytes
+    # uncompressed bytes (None = one file), gzip/zstd-compress jsonl/csv
+    # parts, and list every part in <dir>/manifest.json
+    "parts": {"max_rows": None, "max_bytes": None, "compression": None, "manifest": False},
+    # Hive-style layout (see gen_io) for the datasets listed (e.g.
+    # "nifi_provenance"): <dir>/<name>/dt=YYYY-MM-DD/ part files by event
+    # date, then /node_id=n1/ with by_node (datasets with a node), plus
+    # per-partition stats in <dir>/<name>/_partitions.json; at most
+    # max_open_files partition files are open at once
+    "partitioning": {"datasets": [], "by_node": False, "max_open_files": 64},
+    # pipelined writes (see gen_pipeline) for batch runs: each dataset's
+    # batches go through a bounded queue of queue_batches batches to its own
+    # writer thread, so encoding, compression and file I/O overlap with
+    # generation; the run reports how long each side spent blocked
+    "pipeline": {"enabled": False, "queue_batches": 4},
+    # JSON encoder: "auto" (orjson when installed, else stdlib), "orjson" or "stdlib";
+    # every choice writes the same bytes
+    "serializer": "auto",
+    # event-time order (see gen_ordering): "none" writes rows as they are
+    # drawn; "event_time" draws each node's stream in time order and k-way
+    # merges the nodes (memory for one row per node); "sort" keeps the rows
+    # of an unordered run and sorts them instead, holding at most max_rows
+    # rows in memory (None = all of them) and spilling sorted runs to
+    # tmp_dir (None = the system temp dir)
+    "ordering": {"mode": "none", "max_rows": 1_000_000, "tmp_dir": None},
+    # live tail: instead of the batch files, append bulletins, provenance and
+    # alerts stamped with the wall clock to base_dir/dir/<node>/
+    # <dataset>-<roll start>.jsonl, at events_per_s per dataset (spread over
+    # the nodes), starting a new file every roll_s seconds; runs for
+    # duration_s seconds (None = until Ctrl-C)
+    "live_tail": {
+        "enabled": False,
+        "dir": "obs/live",
+        "events_per_s": {"nifi_bulletins": 20, "nifi_provenance": 50, "alerts": 0.5},
+        "roll_s": 60,
+        "duration_s": None,
+    },
+    # derive the Module 3 SLO records (see gen_slo) from the KPIs as they are
+    # generated, into base_dir/path: one pass, no re-reading flow_kpis. A
+    # window is written and dropped once the KPIs are lateness_s past its
+    # end; unordered KPIs (ordering "none") can be the whole days window
+    # late, so that is the lateness then
+    "derived_slos": {"enabled": False, "window_s": 300, "lateness_s": 600,
+                     "path": "obs/kpis/derived_slos/derived_slos.jsonl"},
+    # self-instrumentation: per-stage wall time, rows, rows/sec, bytes and
+    # peak memory appended to path as flow_kpis records (see gen_metrics)
+    "metrics": {
+        "enabled": False,
+        "path": "./data/obs/raw/generator_kpis.jsonl",
+        "dimensions": {"env": "dev", "cluster": "c1"},
+        "tracemalloc": False,
+        "profile_path": None,
+    },
+    # pre-generated Faker pools: each column draws from `size` distinct values
+    # (its real cardinality); cache_dir keeps pools on disk per seed and locale
+    "value_pools": {
+        "enabled": False,
+        "locale": "en_US",
+        "cache_dir": "./.cache/value_pools",
+        "sizes": {"message": 20000},
+    },
+    # dataset cache (see gen_cache): with a fixed anchor_time, reuse each
+    # dataset whose CONFIG slice, seed and generator version are unchanged
+    # (as are those of the datasets drawn before it) from dir
+    "cache": {"enabled": False, "dir": "./.cache/datasets", "link": "hardlink"},
+    # --plan / --calibrate (see gen_plan): per-row costs measured by
+    # --calibrate, kept per output settings; calibration runs at
+    # calibration_scale times the volumes above, sized (in both generators)
+    # for a run of about two seconds: SF1 here is only ~7k rows, over too
+    # fast for steady rows_per_s, so SF20 (~150k rows)
+    "plan": {"costs_path": "./bench/plan_costs.json", "calibration_scale": 20},
 }
 
 ISO_UTC_FMT = "%Y-%m-%dT%H:%M:%SZ"
 
+# bump when the generated bytes change for an unchanged CONFIG (the dataset
+# cache also hashes the generator sources)
+GENERATOR_VERSION = "1.0"
+
+# volumes multiplied by --scale (days is a time span and stays)
+SCALED_VOLUMES = ("bulletins", "provenance", "kpis", "alerts")
+
+# rough per-row costs for --plan when there is no calibration for the
+# current settings: one --calibrate run of the default CONFIG on the machine
+# named below (a 1-CPU Xeon container); other hardware should --calibrate
+DEFAULT_PLAN_COSTS = {
+    "created_at": "2026-10-18T16:58:03Z",
+    "machine": {"system": "Linux x86_64", "cpus": 1, "python": "3.11.7"},
+    "profile": {
+        "formats": {"nifi_bulletins": "jsonl", "nifi_provenance": "jsonl", "flow_kpis": "jsonl",
+                    "alerts": "jsonl"},
+        "compression": None, "columnar": "zstd", "value_pools": False, "ordering": "none",
+        "derived_slos": False,
+    },
+    "base_mb": 108.0,
+    "setup_s": 0.06,
+    "stages": {
+        "nifi_bulletins": {"rows_per_s": 23800.0},
+        "nifi_provenance": {"rows_per_s": 67800.0},
+        "flow_kpis": {"rows_per_s": 48000.0},
+        "alerts": {"rows_per_s": 42800.0},
+    },
+    "datasets": {
+        "nifi_bulletins": {"bytes_per_row": 446.2, "row_mem_bytes": 654.8, "table_mem_bytes": 0.0},
+        "nifi_provenance": {"bytes_per_row": 399.6, "row_mem_bytes": 811.1, "table_mem_bytes": 0.0},
+        "flow_kpis": {"bytes_per_row": 209.3, "row_mem_bytes": 623.6, "table_mem_bytes": 0.0},
+        "alerts": {"bytes_per_row": 336.7, "row_mem_bytes": 645.7, "table_mem_bytes": 0.0},
+    },
+}
+
+# Column specs for gen_io: types drive the parquet/arrow schema ("dict"
+# columns are dictionary-encoded, nested objects become structs).
+TRACE_FIELDS = [
+    ("trace.correlation_id", "string"),
+    ("trace.transaction_id", "string"),
+    ("trace.idempotency_key", "string"),
+]
+
+DATASET_COLUMNS = {
+    "nifi_bulletins": [
+        ("event_time", "string"), ("node_id", "dict"), ("group_id", "string"),
+        ("component_id", "string"), ("component_type", "dict"),
+        ("bulletin_level", "dict"), ("category", "dict"), ("message", "string"),
+    ] + TRACE_FIELDS,
+    "nifi_provenance": [
+        ("event_time", "string"), ("node_id", "dict"), ("flowfile_uuid", "string"),
+        ("event_type", "dict"), ("component_id", "string"), ("transit_uri", "dict"),
+        ("file_size", "int64"),
+        ("attributes", ("struct", TRACE_FIELDS + [("schema_version", "string")])),
+    ],
+    "flow_kpis": [
+        ("window_start", "string"), ("window_end", "string"), ("flow_name", "dict"),
+        ("metric_name", "dict"), ("metric_value", "float64"),
+        ("dimensions", ("struct", [("env", "string"), ("cluster", "string")])),
+    ],
+    "alerts": [
+        ("alert_time", "string"), ("alert_type", "dict"), ("severity", "dict"),
+        ("signal", ("struct", [("value", "float64"), ("window_minutes", "int64")])),
+        ("context", ("struct", [
+            ("flow_name", "string"), ("node_id", "string"), ("component_id", "string"),
+        ] + TRACE_FIELDS[:2])),
+    ],
+}
+
+# per-dataset field whose min/max the manifest records for each part
+TIME_FIELDS = {
+    "nifi_bulletins": "event_time",
+    "nifi_provenance": "event_time",
+    "flow_kpis": "window_start",
+    "alerts": "alert_time",
+}
+
+# per-dataset path of the node a row belongs to, for event-time ordering
+# and the live tail (flow_kpis are not per node)
+NODE_FIELDS = {
+    "nifi_bulletins": ("node_id",),
+    "nifi_provenance": ("node_id",),
+    "flow_kpis": None,
+    "alerts": ("context", "node_id"),
+}
+
+ORDERING_MODES = ("none", "event_time", "sort")
+
+# text rendering kinds for fixed-shape datasets encoded from a "%"-template
+# (see gen_io); other datasets go through the JSON encoder
+DATASET_KINDS = {
+    "flow_kpis": {"metric_value": "float", "dimensions": "json"},
+}
+
+FAKER_PROVIDERS = {
+    "message": lambda fake: fake.sentence(nb_words=10),
+}
+
 CONTRACTS = {
     "version": "1.0",
     "datasets": {
@@ -55,22 +265,32 @@ def iso_utc(dt):
     return dt.astimezone(timezone.utc).strftime(ISO_UTC_FMT)
 
 
+def anchor_now(anchor_time):
+    if anchor_time is None:
+        return datetime.now(timezone.utc)
+    return datetime.strptime(anchor_time, ISO_UTC_FMT).replace(tzinfo=timezone.utc)
+
+
+def derive_seed(seed, *parts):
+    key = ":".join(str(p) for p in (seed,) + parts).encode("utf-8")
+    return int.from_bytes(hashlib.sha256(key).digest()[:8], "big")
+
+
 def ensure_dirs(base_dir, subdirs):
     os.makedirs(base_dir, exist_ok=True)
     for _, rel in subdirs.items():
         os.makedirs(os.path.join(base_dir, rel), exist_ok=True)
 
 
-def write_jsonl(path, rows):
-    with open(path, "w", encoding="utf-8") as f:
-        for r in rows:
-            f.write(json.dumps(r, separators=(
-                ",", ":"), ensure_ascii=False) + "\n")
+def replace_text(path, text):
+    # written aside and renamed over path, so a cached (hardlinked) copy of
+    # the previous file is never overwritten in place
+    with atomic_write(path) as f:
+        f.write(text)
 
 
 def write_json(path, obj):
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(obj, f, indent=2, ensure_ascii=False)
+    replace_text(path, json.dumps(obj, indent=2, ensure_ascii=False))
 
 
 def yaml_escape(s):
@@ -113,124 +333,606 @@ def to_yaml(obj, indent=0):
 
 
 def write_yaml(path, obj):
-    with open(path, "w", encoding="utf-8") as f:
-        f.write(to_yaml(obj) + "\n")
-
-
-def main():
-    base_dir = CONFIG["base_dir"]
-    subdirs = CONFIG["subdirs"]
-    rng = random.Random(CONFIG["seed"])
-    Faker.seed(CONFIG["seed"])
-    fake = Faker()
-
-    ensure_dirs(base_dir, subdirs)
-
-    raw_dir = os.path.join(base_dir, subdirs["obs_raw"])
-    contracts_dir = os.path.join(base_dir, subdirs["obs_contracts"])
-
-    now = datetime.now(timezone.utc)
-    start = now - timedelta(days=CONFIG["volumes"]["days"])
-
-    flowfile_uuids = [str(uuid.uuid4()) for _ in range(2000)]
-    trace_pool = [{
-        "trace.correlation_id": str(uuid.uuid4()),
-        "trace.transaction_id": str(uuid.uuid4()),
-        "trace.idempotency_key": f"k:{uuid.uuid4().hex[:12]}",
+    replace_text(path, to_yaml(obj) + "\n")
+
+
+BULLETIN_LEVELS = ["INFO", "WARN", "ERROR"]
+EVENT_TYPES = ["RECEIVE", "FETCH", "ROUTE",
+               "CONTENT_MODIFIED", "SEND", "DROP", "FORK", "JOIN", "CLONE"]
+COMPONENT_TYPES = ["Processor", "ControllerService", "ReportingTask"]
+KPI_METRICS = ["postings_succeeded", "postings_failed", "dlq_count",
+               "queue_depth", "backpressure_engaged", "latency_ms_p95"]
+
+
+def random_time(rng, start, now):
+    return start + timedelta(seconds=rng.randint(0, int((now - start).total_seconds())))
+
+
+def skew_pickers(rng, skew, start, now, lane=None):
+    # (pick_time, pick_node) zero-arg callables; uniform unless skew (from
+    # build_skew) shapes them. lane (node, ascending quantiles) draws one
+    # node's stream in time order instead (see in_time_order)
+    skew = skew or {}
+    if lane is not None:
+        node, quantiles = lane
+        if skew.get("time"):
+            quantile = skew["time"].quantile
+
+            def pick_time():
+                return now - timedelta(seconds=quantile(next(quantiles)))
+        else:
+            span = int((now - start).total_seconds()) + 1
+
+            def pick_time():
+                return start + timedelta(seconds=int(next(quantiles) * span))
+        return pick_time, lambda: node
+    if skew.get("time"):
+        offset = skew["time"].sampler(rng)
+
+        def pick_time():
+            return now - timedelta(seconds=offset())
+    else:
+        pick_time = partial(random_time, rng, start, now)
+    nodes = CONFIG["nodes"]
+    if skew.get("nodes"):
+        node = skew["nodes"].sampler(rng)
+
+        def pick_node():
+            return nodes[node()]
+    else:
+        pick_node = partial(rng.choice, nodes)
+    return pick_time, pick_node
+
+
+def build_skew(start, now):
+    cfg = CONFIG["skew"]
+    weights = cfg.get("node_weights")
+    if weights and len(weights) != len(CONFIG["nodes"]):
+        raise SystemExit(f'CONFIG["skew"]["node_weights"] needs one weight per node {CONFIG["nodes"]}')
+    return {
+        "nodes": AliasTable(weights) if weights else None,
+        "time": time_profile(cfg, now, int((now - start).total_seconds()) + 1),
+    }
+
+
+def gen_trace_pool(ids, n):
+    return [{
+        "trace.correlation_id": ids.next(),
+        "trace.transaction_id": ids.next(),
+        "trace.idempotency_key": f"k:{ids.next()[-12:].lower()}",
         "schema_version": "1.0",
-    } for _ in range(1000)]
-
-    bulletin_levels = ["INFO", "WARN", "ERROR"]
-    event_types = ["RECEIVE", "FETCH", "ROUTE",
-                   "CONTENT_MODIFIED", "SEND", "DROP", "FORK", "JOIN", "CLONE"]
-    component_types = ["Processor", "ControllerService", "ReportingTask"]
-
-    bulletins = []
-    for _ in range(CONFIG["volumes"]["bulletins"]):
-        t = start + timedelta(seconds=rng.randint(0,
-                              int((now - start).total_seconds())))
+    } for _ in range(n)]
+
+
+def in_time_order(make, rng, skew, start, now, n, name):
+    # the n rows of a dataset in event-time order, holding one row per node:
+    # the rows are split over the nodes (node weights apply), each node's
+    # stream is drawn at ascending times by make(count, lane) and the
+    # streams are k-way merged
+    if NODE_FIELDS[name] is None:
+        counts = {None: n}
+    else:
+        _, pick_node = skew_pickers(rng, skew, start, now)
+        counts = dict.fromkeys(CONFIG["nodes"], 0)
+        for _ in range(n):
+            counts[pick_node()] += 1
+    streams = [make(count, (node, ascending_uniforms(rng, count))) for node, count in counts.items() if count]
+    yield from heapq.merge(*streams, key=itemgetter(TIME_FIELDS[name]))
+
+
+def gen_bulletins(rng, ids, values, start, now, n, trace_pool, skew=None, lane=None):
+    pick_time, pick_node = skew_pickers(rng, skew, start, now, lane)
+    for _ in range(n):
+        t = pick_time()
         trace = rng.choice(trace_pool) if rng.random() < 0.6 else {}
-        bulletins.append({
+        yield {
             "event_time": iso_utc(t),
-            "node_id": rng.choice(CONFIG["nodes"]),
-            "group_id": str(uuid.uuid4()),
-            "component_id": str(uuid.uuid4()),
-            "component_type": rng.choice(component_types),
-            "bulletin_level": rng.choices(bulletin_levels, weights=[70, 20, 10], k=1)[0],
+            "node_id": pick_node(),
+            "group_id": ids.next(),
+            "component_id": ids.next(),
+            "component_type": rng.choice(COMPONENT_TYPES),
+            "bulletin_level": rng.choices(BULLETIN_LEVELS, weights=[70, 20, 10], k=1)[0],
             "category": rng.choice(["Backpressure", "Repository", "Security", "FlowFile", "Processor"]),
-            "message": fake.sentence(nb_words=10),
+            "message": values["message"](),
             "trace.correlation_id": trace.get("trace.correlation_id"),
             "trace.transaction_id": trace.get("trace.transaction_id"),
             "trace.idempotency_key": trace.get("trace.idempotency_key"),
-        })
+        }
 
-    provenance = []
-    for _ in range(CONFIG["volumes"]["provenance"]):
-        t = start + timedelta(seconds=rng.randint(0,
-                              int((now - start).total_seconds())))
+
+def gen_provenance(rng, ids, start, now, n, flowfile_uuids, trace_pool, skew=None, lane=None):
+    pick_time, pick_node = skew_pickers(rng, skew, start, now, lane)
+    for _ in range(n):
+        t = pick_time()
         ff = rng.choice(flowfile_uuids)
         trace = rng.choice(trace_pool) if rng.random() < 0.8 else {
             "schema_version": "1.0"}
-        provenance.append({
+        yield {
             "event_time": iso_utc(t),
-            "node_id": rng.choice(CONFIG["nodes"]),
+            "node_id": pick_node(),
             "flowfile_uuid": ff,
-            "event_type": rng.choice(event_types),
-            "component_id": str(uuid.uuid4()),
+            "event_type": rng.choice(EVENT_TYPES),
+            "component_id": ids.next(),
             "transit_uri": rng.choice([None, "file://data", "s2s://nifi", "https://sink/api"]),
             "file_size": rng.randint(50, 250000),
             "attributes": trace,
-        })
+        }
+
 
-    kpis = []
-    for _ in range(CONFIG["volumes"]["kpis"]):
-        w_end = start + \
-            timedelta(seconds=rng.randint(
-                0, int((now - start).total_seconds())))
+def gen_kpis(rng, start, now, n, skew=None, lane=None):
+    pick_time, _ = skew_pickers(rng, skew, start, now, lane)
+    for _ in range(n):
+        w_end = pick_time()
         w_start = w_end - timedelta(minutes=5)
         flow = rng.choice(CONFIG["flows"])
-        metric = rng.choice(["postings_succeeded", "postings_failed", "dlq_count",
-                            "queue_depth", "backpressure_engaged", "latency_ms_p95"])
+        metric = rng.choice(KPI_METRICS)
         val = rng.uniform(
             0, 500) if metric != "backpressure_engaged" else rng.choice([0, 1])
-        kpis.append({
+        yield {
             "window_start": iso_utc(w_start),
             "window_end": iso_utc(w_end),
             "flow_name": flow,
             "metric_name": metric,
             "metric_value": float(val),
             "dimensions": {"env": "dev", "cluster": "c1"},
-        })
+        }
+
 
-    alerts = []
-    for _ in range(CONFIG["volumes"]["alerts"]):
-        t = start + timedelta(seconds=rng.randint(0,
-                              int((now - start).total_seconds())))
+def gen_alerts(rng, ids, start, now, n, trace_pool, skew=None, lane=None):
+    pick_time, pick_node = skew_pickers(rng, skew, start, now, lane)
+    for _ in range(n):
+        t = pick_time()
         trace = rng.choice(trace_pool) if rng.random() < 0.4 else {}
-        alerts.append({
+        yield {
             "alert_time": iso_utc(t),
             "alert_type": rng.choice(["stall_detected", "error_rate_high", "dlq_rate_high", "backpressure_engaged"]),
             "severity": rng.choice(["LOW", "MEDIUM", "HIGH"]),
             "signal": {"value": rng.uniform(0, 1), "window_minutes": 5},
             "context": {
                 "flow_name": rng.choice(CONFIG["flows"]),
-                "node_id": rng.choice(CONFIG["nodes"]),
-                "component_id": str(uuid.uuid4()),
+                "node_id": pick_node(),
+                "component_id": ids.next(),
                 "trace.correlation_id": trace.get("trace.correlation_id"),
                 "trace.transaction_id": trace.get("trace.transaction_id"),
             },
-        })
+        }
 
-    write_jsonl(os.path.join(raw_dir, "nifi_bulletins.jsonl"), bulletins)
-    write_jsonl(os.path.join(raw_dir, "nifi_provenance.jsonl"), provenance)
-    write_jsonl(os.path.join(raw_dir, "flow_kpis.jsonl"), kpis)
-    write_jsonl(os.path.join(raw_dir, "alerts.jsonl"), alerts)
 
-    write_json(os.path.join(contracts_dir,
-               "observability_contracts.json"), CONTRACTS)
-    write_yaml(os.path.join(contracts_dir,
-               "observability_contracts.yaml"), CONTRACTS)
+def main():
+    inst = Instrumentation("gen_fintech_observability_data", CONFIG["metrics"])
+    try:
+        if CONFIG["live_tail"]["enabled"]:
+            live_tail(inst)
+        else:
+            generate(inst)
+    finally:
+        inst.close()
+
+
+def generate(inst):
+    base_dir = CONFIG["base_dir"]
+    subdirs = CONFIG["subdirs"]
+    rng = random.Random(CONFIG["seed"])
+    Faker.seed(CONFIG["seed"])
+    fake = Faker()
+    values = value_sources(FAKER_PROVIDERS, load_pools(
+        FAKER_PROVIDERS, CONFIG["value_pools"], CONFIG["seed"]), rng, fake)
+
+    ensure_dirs(base_dir, subdirs)
+
+    raw_dir = os.path.join(base_dir, subdirs["obs_raw"])
+    contracts_dir = os.path.join(base_dir, subdirs["obs_contracts"])
+
+    now = anchor_now(CONFIG["anchor_time"])
+    ids = IdFactory(derive_seed(CONFIG["seed"], "ids"), CONFIG["id_mode"],
+                    clock_ms=int(now.timestamp()) * 1000)
+    start = now - timedelta(days=CONFIG["volumes"]["days"])
+
+    with inst.stage("id_pools") as m:
+        flowfile_uuids = ids.take(2000)
+        trace_pool = gen_trace_pool(ids, 1000)
+        m.rows = len(flowfile_uuids) + len(trace_pool)
+    vols = CONFIG["volumes"]
+    skew = build_skew(start, now)
+    order = CONFIG["ordering"]
+    if order["mode"] not in ORDERING_MODES:
+        raise SystemExit(f'unknown CONFIG["ordering"]["mode"] {order["mode"]!r}; expected one of {ORDERING_MODES}')
+    # make(n, lane) draws a dataset's rows; generators run one after another
+    # as each dataset is written, so the RNG/ID draw order (and seeded
+    # output) matches a list-building pass
+    makers = (
+        ("nifi_bulletins", vols["bulletins"],
+         lambda n, lane=None: gen_bulletins(rng, ids, values, start, now, n, trace_pool, skew, lane)),
+        ("nifi_provenance", vols["provenance"],
+         lambda n, lane=None: gen_provenance(rng, ids, start, now, n, flowfile_uuids, trace_pool, skew, lane)),
+        ("flow_kpis", vols["kpis"], lambda n, lane=None: gen_kpis(rng, start, now, n, skew, lane)),
+        ("alerts", vols["alerts"], lambda n, lane=None: gen_alerts(rng, ids, start, now, n, trace_pool, skew, lane)),
+    )
+    datasets = tuple((name, in_time_order(make, rng, skew, start, now, n, name)
+                      if order["mode"] == "event_time" else make(n)) for name, n, make in makers)
+    slo_cfg = CONFIG["derived_slos"]
+    slo = slo_aggregator()
+    slo_path = os.path.join(base_dir, slo_cfg["path"])
+    slo_name = os.path.splitext(os.path.basename(slo_path))[0]
+
+    cache = open_cache()
+    keys = cache_keys() if cache is not None else {}
+    hits = cache.resume([name for name, _ in datasets], keys) if cache is not None else {}
+    if hits:
+        # carry on from the generator state after the last cached dataset
+        state = hits[datasets[len(hits) - 1][0]]["state"]
+        restore_rng(rng, state["rng"])
+        restore_rng(fake.random, state["faker_rng"])
+        ids.setstate(state["ids"])
+    dirs = {"raw": raw_dir, "slo": os.path.dirname(slo_path), "contracts": contracts_dir}
+    pipeline = Pipeline(CONFIG["pipeline"]["queue_batches"]) if CONFIG["pipeline"]["enabled"] else None
+
+    for name, rows in datasets:
+        if name in hits:
+            restored = cache.restore_datasets(hits[name], dirs)
+            with inst.stage(name) as m:
+                m.add_parts(restored[name])
+            if len(restored) > 1:
+                # the derived SLOs, cached with flow_kpis
+                with inst.stage("derived_slos") as m:
+                    m.add_parts([p for other, parts in restored.items() if other != name for p in parts])
+            continue
+        if order["mode"] == "sort":
+            rows = ordered(rows, TIME_FIELDS[name], NODE_FIELDS[name], CONFIG["nodes"],
+                           order["max_rows"], order["tmp_dir"])
+        slo_writer = None
+        if name == "flow_kpis" and slo is not None:
+            # windows the watermark closes are written as the KPIs go by
+            os.makedirs(dirs["slo"], exist_ok=True)
+            remove_dataset_outputs(dirs["slo"], slo_name)
+            slo_writer = open_writer(dirs["slo"], slo_name, "jsonl", DERIVED_SLO_COLUMNS,
+                                     serializer=CONFIG["serializer"])
+            rows = slo.tee(rows, slo_writer.write_rows)
+        try:
+            with inst.stage(name) as m:
+                parts = write_dataset(raw_dir, name, CONFIG["formats"][name], DATASET_COLUMNS[name],
+                                      rows, CONFIG["columnar"], CONFIG["parts"], TIME_FIELDS[name],
+                                      DATASET_KINDS.get(name), CONFIG["serializer"],
+                                      partition=partition_spec(name), pipeline=pipeline)
+                m.add_parts(parts)
+            written = [(name, "raw", CONFIG["formats"][name], TIME_FIELDS[name], CONFIG["parts"], parts)]
+            if slo_writer is not None:
+                # every KPI has gone through the aggregator: the open windows are final
+                with inst.stage("derived_slos") as m:
+                    slo_writer.write_rows(slo.flush())
+                    slo_writer.close()
+                    m.add_parts(slo_writer.parts)
+                written.append((slo_name, "slo", "jsonl", None, None, slo_writer.parts))
+        except BaseException:
+            if slo_writer is not None:
+                slo_writer.abort()
+            raise
+        if cache is not None:
+            cache.put_datasets(keys[name], name, dirs, written, {
+                "rng": rng_state(rng), "faker_rng": rng_state(fake.random), "ids": ids.getstate(exact=True)})
+
+    write_contracts(inst, contracts_dir, cache, keys.get("contracts"))
+    if cache is not None:
+        print(cache.summary())
+    if pipeline is not None:
+        print(pipeline.summary())
+
+
+def slo_aggregator():
+    # the derived SLO aggregator, or None when derived_slos is off
+    cfg = CONFIG["derived_slos"]
+    if not cfg["enabled"]:
+        return None
+    lateness = cfg["lateness_s"] if CONFIG["ordering"]["mode"] != "none" else CONFIG["volumes"]["days"] * 86400
+    return SloAggregator(cfg["window_s"], lateness)
+
+
+def partition_spec(name):
+    # gen_io partition config for a dataset, or None to write it flat
+    cfg = CONFIG["partitioning"]
+    unknown = set(cfg["datasets"]) - set(DATASET_COLUMNS)
+    if unknown:
+        raise SystemExit(f'CONFIG["partitioning"]["datasets"]: unknown datasets {sorted(unknown)}; '
+                         f"expected some of {sorted(DATASET_COLUMNS)}")
+    if name not in cfg["datasets"]:
+        return None
+    by = [["dt", [TIME_FIELDS[name]]]]
+    if cfg["by_node"] and NODE_FIELDS[name]:
+        by.append(["node_id", list(NODE_FIELDS[name])])
+    return {"by": by, "max_open_files": cfg["max_open_files"]}
+
+
+def write_contracts(inst, contracts_dir, cache=None, key=None):
+    with inst.stage("contracts"):
+        entry = cache.get(key) if cache is not None else None
+        if entry is not None:
+            cache.restore(entry, {"contracts": contracts_dir})
+            return
+        paths = [os.path.join(contracts_dir, "observability_contracts" + ext) for ext in (".json", ".yaml")]
+        write_json(paths[0], CONTRACTS)
+        write_yaml(paths[1], CONTRACTS)
+        if cache is not None:
+            cache.put(key, "contracts", [("contracts", p) for p in paths])
+
+
+def open_cache():
+    cfg = CONFIG["cache"]
+    if not cfg["enabled"]:
+        return None
+    if CONFIG["anchor_time"] is None:
+        print("dataset cache skipped: it needs a fixed anchor_time (the wall clock changes every run)")
+        return None
+    return DatasetCache(cfg["dir"], cfg["link"])
+
+
+def cache_keys():
+    # dataset -> cache key; each dataset chains the key of the one drawn before it
+    version = code_version(GENERATOR_VERSION, glob.glob(
+        os.path.join(glob.escape(os.path.dirname(os.path.abspath(__file__))), "gen_*.py")))
+    vols, fmts = CONFIG["volumes"], CONFIG["formats"]
+    common = {
+        "generator": "gen_fintech_observability_data", "version": version, "seed": CONFIG["seed"],
+        "id_mode": CONFIG["id_mode"], "anchor_time": CONFIG["anchor_time"], "days": vols["days"],
+        "flows": CONFIG["flows"], "nodes": CONFIG["nodes"], "skew": CONFIG["skew"],
+        "value_pools": CONFIG["value_pools"], "columnar": CONFIG["columnar"], "parts": CONFIG["parts"],
+        "ordering": CONFIG["ordering"]["mode"],
+    }
+    slices = {
+        "nifi_bulletins": {"n": vols["bulletins"]},
+        "nifi_provenance": {"n": vols["provenance"]},
+        "flow_kpis": {"n": vols["kpis"],
+                      "derived_slos": CONFIG["derived_slos"] if CONFIG["derived_slos"]["enabled"] else None},
+        "alerts": {"n": vols["alerts"]},
+    }
+    keys, prev = {}, None
+    for name, dataset_slice in slices.items():
+        keys[name] = prev = cache_key(common, name, dict(dataset_slice, format=fmts[name],
+                                                          partition=partition_spec(name)), prev)
+    keys["contracts"] = cache_key("gen_fintech_observability_data", version, "contracts")
+    return keys
+
+
+def plan_datasets():
+    # what a batch run writes (see gen_plan): rows, the instrumentation stage
+    # and rows held in memory at once (all of them when sorting without a
+    # max_rows, else one write batch)
+    vols = CONFIG["volumes"]
+    order = CONFIG["ordering"]
+    out = []
+    for name, key in (("nifi_bulletins", "bulletins"), ("nifi_provenance", "provenance"),
+                      ("flow_kpis", "kpis"), ("alerts", "alerts")):
+        n = vols[key]
+        if order["mode"] == "sort":
+            held = n if order["max_rows"] is None else min(n, order["max_rows"])
+        elif CONFIG["formats"][name] in ("parquet", "arrow"):
+            held = min(n, CONFIG["columnar"]["row_group_rows"])
+        else:
+            held = min(n, TEXT_BATCH_ROWS)
+        out.append({"name": name, "stage": name, "dir": "raw", "rows": n, "held_rows": held})
+    return out
+
+
+def cost_profile():
+    # the settings the per-row costs depend on
+    return {
+        "formats": CONFIG["formats"], "compression": CONFIG["parts"]["compression"],
+        "columnar": CONFIG["columnar"]["compression"], "value_pools": CONFIG["value_pools"]["enabled"],
+        "ordering": CONFIG["ordering"]["mode"], "derived_slos": CONFIG["derived_slos"]["enabled"],
+    }
+
+
+def memory_costs(n=2000):
+    # tracemalloc bytes per row dict of each dataset
+    rng = random.Random(CONFIG["seed"])
+    now = anchor_now(CONFIG["anchor_time"])
+    start = now - timedelta(days=CONFIG["volumes"]["days"])
+    ids = IdFactory(derive_seed(CONFIG["seed"], "ids"), CONFIG["id_mode"])
+    values = value_sources(FAKER_PROVIDERS, load_pools(
+        FAKER_PROVIDERS, CONFIG["value_pools"], CONFIG["seed"]), rng, Faker())
+    flowfile_uuids = ids.take(2000)
+    trace_pool = gen_trace_pool(ids, 1000)
+    skew = build_skew(start, now)
+    rows = {
+        "nifi_bulletins": lambda: list(gen_bulletins(rng, ids, values, start, now, n, trace_pool, skew)),
+        "nifi_provenance": lambda: list(gen_provenance(rng, ids, start, now, n, flowfile_uuids, trace_pool,
+                                                       skew)),
+        "flow_kpis": lambda: list(gen_kpis(rng, start, now, n, skew)),
+        "alerts": lambda: list(gen_alerts(rng, ids, start, now, n, trace_pool, skew)),
+    }
+    return {name: traced_bytes(make) / n for name, make in rows.items()}
+
+
+def calibrate():
+    # per-row costs of the current settings from a calibration_scale run in
+    # a temp directory; stored in costs_path and returned
+    saved = copy.deepcopy(CONFIG)
+    tmp = tempfile.mkdtemp(prefix="plan-calibrate-")
+    try:
+        scale_volumes(CONFIG["volumes"], CONFIG["plan"]["calibration_scale"], SCALED_VOLUMES)
+        CONFIG["base_dir"] = tmp
+        CONFIG["metrics"] = {"enabled": True, "path": os.path.join(tmp, "metrics.jsonl"), "dimensions": {},
+                             "tracemalloc": False, "profile_path": None}
+        CONFIG["live_tail"]["enabled"] = False
+        CONFIG["cache"]["enabled"] = False
+        inst = Instrumentation("gen_fintech_observability_data", CONFIG["metrics"])
+        t0 = time.perf_counter()
+        generate(inst)
+        wall = time.perf_counter() - t0
+        costs = measure_costs(plan_datasets(), inst.records, wall,
+                              {"raw": os.path.join(tmp, CONFIG["subdirs"]["obs_raw"])}, memory_costs(), {})
+    finally:
+        CONFIG.clear()
+        CONFIG.update(saved)
+        shutil.rmtree(tmp, ignore_errors=True)
+    costs["profile"] = cost_profile()
+    save_costs(CONFIG["plan"]["costs_path"], "gen_fintech_observability_data", cost_profile(), costs)
+    print(f"calibrated per-row costs saved to {CONFIG['plan']['costs_path']}")
+    return costs
+
+
+def plan(costs=None):
+    source = "costs just calibrated"
+    if costs is None:
+        costs = load_costs(CONFIG["plan"]["costs_path"], "gen_fintech_observability_data", cost_profile())
+        source = costs_source(costs or DEFAULT_PLAN_COSTS, costs is None)
+    note = None
+    if costs is None:
+        costs = DEFAULT_PLAN_COSTS
+        if costs["profile"] != cost_profile():
+            note = ("the built-in costs were measured with the default formats/ordering/compression; "
+                    "run --calibrate with these settings for a closer estimate")
+    if CONFIG["live_tail"]["enabled"]:
+        note = (note + "\n" if note else "") + "the plan covers a batch run; live tail writes at events_per_s"
+    print_plan("gen_fintech_observability_data", estimate(plan_datasets(), costs), source,
+               CONFIG["base_dir"], note)
+
+
+class RollingFiles:
+    # per (node, dataset) append-mode file named after the start of its
+    # roll_s period; a period's file is closed once the clock moves past it
+    def __init__(self, live_dir, roll_s):
+        self.live_dir = live_dir
+        self.roll_s = roll_s
+        self.files = {}
+
+    def write(self, node, dataset, epoch, data):
+        period = epoch - epoch % self.roll_s
+        cur = self.files.get((node, dataset))
+        if cur is None or cur[0] != period:
+            if cur is not None:
+                cur[1].close()
+            name = f"{dataset}-{datetime.fromtimestamp(period, timezone.utc):%Y%m%dT%H%M%SZ}.jsonl"
+            os.makedirs(os.path.join(self.live_dir, node), exist_ok=True)
+            cur = self.files[(node, dataset)] = (period, open(os.path.join(self.live_dir, node, name), "ab"))
+        # one write per tick, flushed, so a tailing reader only sees whole lines
+        cur[1].write(data)
+        cur[1].flush()
+
+    def close(self):
+        for _, f in self.files.values():
+            f.close()
+        self.files.clear()
+
+
+def live_tail(inst):
+    cfg = CONFIG["live_tail"]
+    base_dir = CONFIG["base_dir"]
+    rng = random.Random(CONFIG["seed"])
+    Faker.seed(CONFIG["seed"])
+    values = value_sources(FAKER_PROVIDERS, load_pools(
+        FAKER_PROVIDERS, CONFIG["value_pools"], CONFIG["seed"]), rng, Faker())
+    ensure_dirs(base_dir, CONFIG["subdirs"])
+    write_contracts(inst, os.path.join(base_dir, CONFIG["subdirs"]["obs_contracts"]))
+
+    now = datetime.now(timezone.utc)
+    ids = IdFactory(derive_seed(CONFIG["seed"], "ids"), CONFIG["id_mode"],
+                    clock_ms=int(now.timestamp()) * 1000)
+    flowfile_uuids = ids.take(2000)
+    trace_pool = gen_trace_pool(ids, 1000)
+    # node weights apply; every event of a tick carries the tick's second
+    skew = {"nodes": build_skew(now, now)["nodes"], "time": None}
+    makers = {
+        "nifi_bulletins": lambda t, n: gen_bulletins(rng, ids, values, t, t, n, trace_pool, skew),
+        "nifi_provenance": lambda t, n: gen_provenance(rng, ids, t, t, n, flowfile_uuids, trace_pool, skew),
+        "alerts": lambda t, n: gen_alerts(rng, ids, t, t, n, trace_pool, skew),
+    }
+    rates = {name: r for name, r in cfg["events_per_s"].items() if r}
+    unknown = sorted(set(rates) - set(makers))
+    if unknown:
+        raise SystemExit(f"live tail cannot generate {unknown}; expected some of {sorted(makers)}")
+    encoders = {name: JsonlEncoder(DATASET_COLUMNS[name], DATASET_KINDS.get(name), CONFIG["serializer"])
+                for name in rates}
+    live_dir = os.path.join(base_dir, cfg["dir"])
+    files = RollingFiles(live_dir, cfg["roll_s"])
+    print(f"live tail to {live_dir}: " + ", ".join(f"{n} {r}/s" for n, r in rates.items())
+          + (f" for {cfg['duration_s']}s" if cfg["duration_s"] is not None else " until Ctrl-C"))
+
+    counts = {name: 0 for name in rates}
+    credit = {name: 0.0 for name in rates}
+    start = last = time.time()
+    with inst.stage("live_tail") as m:
+        try:
+            while cfg["duration_s"] is None or last - start < cfg["duration_s"]:
+                # sleep to the next second boundary, then emit what is owed
+                time.sleep(max(0.0, 1 - time.time() % 1))
+                wall = time.time()
+                tick = datetime.fromtimestamp(int(wall), timezone.utc)
+                for name, rate in rates.items():
+                    credit[name] += rate * (wall - last)
+                    n = int(credit[name])
+                    if not n:
+                        continue
+                    credit[name] -= n
+                    node_of = node_getter(NODE_FIELDS[name])
+                    by_node = {}
+                    for row in makers[name](tick, n):
+                        by_node.setdefault(node_of(row), []).append(row)
+                    for node, rows in by_node.items():
+                        lines = encoders[name].encode_rows(rows)
+                        data = b"".join(lines) if isinstance(lines[0], bytes) else "".join(lines).encode("utf-8")
+                        files.write(node, name, int(wall), data)
+                        m.bytes += len(data)
+                    counts[name] += n
+                    m.rows += n
+                last = wall
+        except KeyboardInterrupt:
+            pass
+        finally:
+            files.close()
+    elapsed = time.time() - start
+    print(f"appended {sum(counts.values())} events in {elapsed:.0f}s: "
+          + ", ".join(f"{n} {c} ({c / elapsed if elapsed > 0 else 0:.1f}/s)" for n, c in counts.items()))
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(
+        description="Generate the NiFi observability datasets (bulletins, provenance, KPIs, alerts).")
+    p.add_argument("--scale", metavar="SF",
+                   help="scale factor: SF1 is CONFIG[\"volumes\"], SF100 multiplies every event count by 100 "
+                        "(days stays)")
+    p.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                   help="override a CONFIG value by dotted path, e.g. volumes.provenance=5e6; repeatable")
+    p.add_argument("--skew", choices=sorted(SKEW_PRESETS), default=None,
+                   help="node imbalance / diurnal / burst preset for event picks (gen_skew.SKEW_PRESETS)")
+    p.add_argument("--partition", action="append", choices=sorted(DATASET_COLUMNS), default=[], metavar="DATASET",
+                   help="write DATASET Hive-partitioned by event date (<raw>/DATASET/dt=YYYY-MM-DD/) with "
+                        "a _partitions.json index; repeatable")
+    p.add_argument("--partition-by-node", action="store_true", default=CONFIG["partitioning"]["by_node"],
+                   help="add a node_id=<node>/ level under each date for the partitioned datasets that "
+                        "have a node (all but flow_kpis)")
+    p.add_argument("--ordering", choices=ORDERING_MODES, default=CONFIG["ordering"]["mode"],
+                   help="event-time order of the written rows: none, event_time (per-node streams merged) "
+                        "or sort (the unordered rows, sorted with bounded memory)")
+    p.add_argument("--live-tail", action="store_true", default=CONFIG["live_tail"]["enabled"],
+                   help="append wall-clock-stamped bulletins, provenance and alerts to rolling per-node files "
+                        "instead of writing the batch files (CONFIG[\"live_tail\"]; until Ctrl-C unless "
+                        "live_tail.duration_s is set)")
+    p.add_argument("--pipeline", action="store_true", default=CONFIG["pipeline"]["enabled"],
+                   help="write each dataset from a background thread fed through a bounded queue, "
+                        "overlapping I/O with generation (CONFIG[\"pipeline\"])")
+    p.add_argument("--plan", action="store_true",
+                   help="print the predicted rows, bytes, runtime and peak memory and exit without writing")
+    p.add_argument("--calibrate", action="store_true",
+                   help="measure per-row costs for these settings with a small run, save them "
+                        "(CONFIG[\"plan\"][\"costs_path\"]) and print the plan")
+    return p.parse_args(argv)
 
 
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    CONFIG["pipeline"]["enabled"] = args.pipeline
+    if args.partition:
+        CONFIG["partitioning"]["datasets"] = args.partition
+    CONFIG["partitioning"]["by_node"] = args.partition_by_node
+    CONFIG["ordering"]["mode"] = args.ordering
+    CONFIG["live_tail"]["enabled"] = args.live_tail
+    if args.skew:
+        apply_preset(CONFIG["skew"], args.skew)
+    if args.scale:
+        scale_volumes(CONFIG["volumes"], parse_scale(args.scale), SCALED_VOLUMES)
+    for spec in args.set:
+        set_value(CONFIG, spec)
+    if args.plan or args.calibrate:
+        plan(calibrate() if args.calibrate else None)
+    else:
+        main()
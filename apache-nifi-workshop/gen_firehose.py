@@ -0,0 +1,397 @@
+import asyncio
+import os
+import time
+from itertools import islice
+from urllib.parse import urlsplit
+
+from gen_io import atomic_write
+
+# Rate-controlled real-time emission ("firehose") shared by the generators.
+#
+# An event source is an iterator of (dataset, row) pairs, generated lazily as
+# the emitter pulls them. The emitter releases events at the target rate of
+# a load profile, groups them into payloads of up to batch_events JSON lines
+# per dataset, and hands the payloads to `concurrency` sender tasks through a
+# bounded queue (a slow sink backs the producer up instead of buffering
+# without limit). Every send is timed, and the emitter reports the achieved
+# event rate and send latency percentiles per interval and for the whole run.
+#
+# Profiles (events/sec as a function of elapsed seconds t):
+#   steady  rate
+#   ramp    ramp_from_rate rising linearly to rate over ramp_s, then rate
+#   burst   rate, with burst_rate for burst_s at the start of every
+#           burst_every_s window
+#
+# Sinks:
+#   http  POST to http_url (NiFi ListenHTTP), one newline-delimited JSON
+#         payload per request, dataset in the X-Dataset header
+#   tcp   newline-delimited JSON to tcp_host:tcp_ports[dataset] (ListenTCP)
+#   dir   one small file per payload in drop_dir/<dataset>/ (GetFile),
+#         written under a hidden temp name and renamed into place
+#
+# Receiver is a stand-in for ListenHTTP/ListenTCP that only counts events,
+# so the sinks can be exercised on loopback with no NiFi running.
+
+PROFILES = ("steady", "ramp", "burst")
+SINKS = ("http", "tcp", "dir")
+
+
+def target_rate(cfg, t):
+    profile, rate = cfg["profile"], cfg["rate"]
+    if profile == "ramp":
+        if t < cfg["ramp_s"]:
+            return cfg["ramp_from_rate"] + (rate - cfg["ramp_from_rate"]) * t / cfg["ramp_s"]
+        return rate
+    if profile == "burst":
+        return cfg["burst_rate"] if t % cfg["burst_every_s"] < cfg["burst_s"] else rate
+    if profile != "steady":
+        raise ValueError(f"unknown emit profile {profile!r}; expected one of {PROFILES}")
+    return rate
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class Stats:
+    def __init__(self):
+        self.events = self.sends = self.bytes = self.errors = 0
+        self.latencies = []
+        self.begin()
+
+    def begin(self):
+        self.start = time.monotonic()
+        self.end = None
+        self._mark = (self.start, self.events, self.sends, self.errors)
+
+    def record(self, n, size, latency):
+        self.events += n
+        self.sends += 1
+        self.bytes += size
+        self.latencies.append(latency)
+
+    def _line(self, elapsed, events, sends, errors, latencies, target=None):
+        lat = sorted(latencies)
+        rate = events / elapsed if elapsed > 0 else 0.0
+        return (f"events {events}  sends {sends}  errors {errors}  "
+                + (f"target {target:.0f}/s  " if target is not None else "")
+                + f"achieved {rate:.0f}/s  latency ms p50 {percentile(lat, 0.50) * 1000:.2f} "
+                f"p95 {percentile(lat, 0.95) * 1000:.2f} p99 {percentile(lat, 0.99) * 1000:.2f}")
+
+    def interval(self, target):
+        now = time.monotonic()
+        t0, events0, sends0, errors0 = self._mark
+        line = f"[{now - self.start:7.1f}s] " + self._line(
+            now - t0, self.events - events0, self.sends - sends0, self.errors - errors0,
+            self.latencies[sends0:], target)
+        self._mark = (now, self.events, self.sends, self.errors)
+        return line
+
+    def summary(self):
+        elapsed = (self.end or time.monotonic()) - self.start
+        lat = sorted(self.latencies)
+        return {
+            "elapsed_s": round(elapsed, 3),
+            "events": self.events,
+            "sends": self.sends,
+            "bytes": self.bytes,
+            "errors": self.errors,
+            "achieved_rate": round(self.events / elapsed, 1) if elapsed > 0 else 0.0,
+            "latency_ms": {q: round(percentile(lat, p) * 1000, 3)
+                           for q, p in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99), ("max", 1.0))},
+        }
+
+
+class HttpSink:
+    # minimal keep-alive HTTP/1.1 client; one connection per sender task
+    def __init__(self, cfg):
+        u = urlsplit(cfg["http_url"])
+        self.host = u.hostname
+        self.port = u.port or 80
+        self.path = u.path or "/"
+        self.reader = self.writer = None
+
+    def connection(self):
+        return HttpSink({"http_url": f"http://{self.host}:{self.port}{self.path}"})
+
+    async def send(self, dataset, payload, n):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        head = (f"POST {self.path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+                f"Content-Type: application/x-ndjson\r\nContent-Length: {len(payload)}\r\n"
+                f"X-Dataset: {dataset}\r\nX-Event-Count: {n}\r\n\r\n")
+        self.writer.write(head.encode("ascii") + payload)
+        await self.writer.drain()
+        status = await self.reader.readline()
+        if not status:
+            await self.close()
+            raise ConnectionError("connection closed by the HTTP endpoint")
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            k, _, v = line.decode("latin-1").partition(":")
+            headers[k.strip().lower()] = v.strip()
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        else:
+            await self.reader.readexactly(int(headers.get("content-length", 0)))
+        if headers.get("connection", "").lower() == "close":
+            await self.close()
+        code = int(status.split()[1])
+        if code >= 300:
+            raise ConnectionError(f"HTTP {code}")
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+            self.reader = self.writer = None
+
+
+class TcpSink:
+    # newline-delimited JSON, one connection per dataset and sender task
+    def __init__(self, cfg):
+        self.host = cfg["tcp_host"]
+        self.ports = cfg["tcp_ports"]
+        self.writers = {}
+
+    def connection(self):
+        return TcpSink({"tcp_host": self.host, "tcp_ports": self.ports})
+
+    async def send(self, dataset, payload, n):
+        if dataset not in self.writers:
+            self.writers[dataset] = await asyncio.open_connection(self.host, self.ports[dataset])
+        w = self.writers[dataset][1]
+        w.write(payload)
+        await w.drain()
+
+    async def close(self):
+        for _, w in self.writers.values():
+            w.close()
+            try:
+                await w.wait_closed()
+            except OSError:
+                pass
+        self.writers = {}
+
+
+class DirSink:
+    def __init__(self, cfg):
+        self.drop_dir = cfg["drop_dir"]
+        self.seq = 0
+        self.prefix = f"{os.getpid()}-{int(time.time())}"
+
+    def connection(self):
+        return self
+
+    def _write(self, dataset, name, payload):
+        with atomic_write(os.path.join(self.drop_dir, dataset, name), "wb") as f:
+            f.write(payload)
+
+    async def send(self, dataset, payload, n):
+        self.seq += 1
+        name = f"{dataset}-{self.prefix}-{self.seq:09d}.jsonl"
+        await asyncio.get_running_loop().run_in_executor(None, self._write, dataset, name, payload)
+
+    async def close(self):
+        pass
+
+
+def open_sink(cfg):
+    sink = cfg["sink"]
+    if sink == "http":
+        return HttpSink(cfg)
+    if sink == "tcp":
+        return TcpSink(cfg)
+    if sink == "dir":
+        return DirSink(cfg)
+    raise ValueError(f"unknown emit sink {sink!r}; expected one of {SINKS}")
+
+
+async def _sender(queue, conn, stats):
+    while True:
+        item = await queue.get()
+        if item is None:
+            await conn.close()
+            return
+        dataset, payload, n = item
+        t0 = time.perf_counter()
+        try:
+            await conn.send(dataset, payload, n)
+        except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError):
+            stats.errors += 1
+            await conn.close()
+            continue
+        stats.record(n, len(payload), time.perf_counter() - t0)
+
+
+def encode_payload(encoder, rows):
+    lines = encoder.encode_rows(rows)
+    if lines and isinstance(lines[0], bytes):
+        return b"".join(lines)
+    return "".join(lines).encode("utf-8")
+
+
+async def emit(events, encoders, cfg, stats, report=print):
+    sink = open_sink(cfg)
+    queue = asyncio.Queue(maxsize=2 * cfg["concurrency"])
+    senders = [asyncio.create_task(_sender(queue, sink.connection(), stats))
+               for _ in range(cfg["concurrency"])]
+    loop = asyncio.get_running_loop()
+    batch, linger = cfg["batch_events"], cfg["linger_ms"] / 1000
+    duration, max_events = cfg["duration_s"], cfg.get("max_events")
+    start = last = last_flush = loop.time()
+    next_report = start + cfg["report_every_s"]
+    credit, emitted = 0.0, 0
+    stats.begin()
+    try:
+        while True:
+            now = loop.time()
+            t = now - start
+            if (duration is not None and t >= duration) or (max_events is not None and emitted >= max_events):
+                break
+            rate = target_rate(cfg, t)
+            # a stalled sink may owe at most one second of events
+            credit = min(credit + rate * (now - last), max(rate, batch))
+            last = now
+            if now >= next_report:
+                report(stats.interval(rate))
+                next_report = now + cfg["report_every_s"]
+            n = int(credit)
+            if max_events is not None:
+                n = min(n, max_events - emitted)
+            if n < batch and (n == 0 or now - last_flush < linger):
+                # sleep until the batch fills, the linger time runs out or
+                # (with nothing owed yet) the next event is due
+                wait = ((batch if n else 1) - credit) / rate if rate > 0 else linger
+                if n:
+                    wait = min(wait, linger - (now - last_flush))
+                await asyncio.sleep(max(0.0005, min(wait, next_report - now)))
+                continue
+            n = min(n, batch)
+            rows = {}
+            for dataset, row in islice(events, n):
+                rows.setdefault(dataset, []).append(row)
+            taken = sum(len(r) for r in rows.values())
+            credit -= n
+            emitted += taken
+            last_flush = now
+            for dataset, ds_rows in rows.items():
+                await queue.put((dataset, encode_payload(encoders[dataset], ds_rows), len(ds_rows)))
+            if taken < n:
+                break  # the event source is exhausted
+    finally:
+        for _ in senders:
+            await queue.put(None)
+        await asyncio.gather(*senders)
+        stats.end = time.monotonic()
+    report(stats.interval(target_rate(cfg, loop.time() - start)))
+
+
+def run_emit(events, encoders, cfg, receiver=None, report=print):
+    # runs the emitter (and optionally an in-process Receiver) until the
+    # duration or event budget is used up, or Ctrl-C; returns the summary
+    stats = Stats()
+
+    async def main():
+        if receiver is not None:
+            await receiver.start()
+        try:
+            await emit(events, encoders, cfg, stats, report)
+        finally:
+            if receiver is not None:
+                await asyncio.sleep(0.2)  # let the last payloads land
+                await receiver.stop()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+    summary = stats.summary()
+    if receiver is not None:
+        summary["received"] = dict(receiver.counts)
+    return summary
+
+
+def local_receiver(cfg):
+    # a Receiver listening where the configured http/tcp sink sends
+    if cfg["sink"] == "http":
+        u = urlsplit(cfg["http_url"])
+        return Receiver(u.hostname, http_port=u.port or 80)
+    if cfg["sink"] == "tcp":
+        return Receiver(cfg["tcp_host"], tcp_ports=cfg["tcp_ports"])
+    return None  # the dir sink needs no receiver
+
+
+class Receiver:
+    # counts newline-delimited events per dataset on an HTTP port and/or a
+    # set of TCP ports (dataset -> port)
+    def __init__(self, host="127.0.0.1", http_port=None, tcp_ports=None):
+        self.host = host
+        self.http_port = http_port
+        self.tcp_ports = tcp_ports or {}
+        self.counts = {}
+        self.servers = []
+
+    def _count(self, dataset, n):
+        self.counts[dataset] = self.counts.get(dataset, 0) + n
+
+    async def _handle_http(self, reader, writer):
+        try:
+            while True:
+                request = await reader.readline()
+                if not request:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    k, _, v = line.decode("latin-1").partition(":")
+                    headers[k.strip().lower()] = v.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                dataset = headers.get("x-dataset") or request.split()[1].decode().rstrip("/").rsplit("/", 1)[-1]
+                self._count(dataset, body.count(b"\n"))
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def _tcp_handler(self, dataset):
+        async def handle(reader, writer):
+            try:
+                while True:
+                    data = await reader.read(1 << 16)
+                    if not data:
+                        break
+                    self._count(dataset, data.count(b"\n"))
+            except ConnectionError:
+                pass
+            finally:
+                writer.close()
+        return handle
+
+    async def start(self):
+        if self.http_port:
+            self.servers.append(await asyncio.start_server(self._handle_http, self.host, self.http_port))
+        for dataset, port in self.tcp_ports.items():
+            self.servers.append(await asyncio.start_server(self._tcp_handler(dataset), self.host, port))
+
+    async def stop(self):
+        for server in self.servers:
+            server.close()
+            await server.wait_closed()
+        self.servers = []
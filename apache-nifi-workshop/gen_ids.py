@@ -0,0 +1,171 @@
+import random
+
+try:
+    import numpy as np
+except ImportError:  # np_uuid4_strings is only used by the numpy engine
+    np = None
+
+# Seeded, batched ID generation shared by the generators.
+#
+# uuid.uuid4() reads os.urandom once per call and ignores the run seed. An
+# IdFactory draws whole batches of random bits from its own seeded RNG, so a
+# seeded run produces the same IDs every time, and bulk generation costs one
+# getrandbits() call plus string slicing per ID.
+#
+# Modes:
+#   uuid4  version-4/variant-1 shaped UUID strings (satisfy "format": "uuid")
+#   ulid   26-char Crockford base32 ULIDs; the 48-bit timestamp is the
+#          factory clock and the 80-bit random part increases monotonically,
+#          so IDs sort in generation order. They do not match "format": "uuid".
+
+ID_MODES = ("uuid4", "ulid")
+
+_VARIANT = {c: "89ab"[int(c, 16) & 3] for c in "0123456789abcdef"}
+_CROCKFORD = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_B32_PAIRS = [a + b for a in _CROCKFORD for b in _CROCKFORD]
+_HEX_PAIRS = "".join(f"{i:02x}" for i in range(256)).encode("ascii")
+_CROCKFORD_INDEX = {c: i for i, c in enumerate(_CROCKFORD)}
+
+# every ID mode packs into 16 bytes (a ULID's 26 base32 chars hold 128 bits)
+ID_BYTES = 16
+
+
+class IdFactory:
+    def __init__(self, seed, mode="uuid4", batch_size=8192, clock_ms=0):
+        if mode not in ID_MODES:
+            raise ValueError(f"unknown id mode {mode!r}; expected one of {ID_MODES}")
+        self.mode = mode
+        self.batch_size = batch_size
+        # the 8 most distinctive characters of an ID (idempotency keys use
+        # them); a ULID's leading characters are the shared timestamp
+        self.short = slice(0, 8) if mode == "uuid4" else slice(-8, None)
+        self._rng = random.Random(seed)
+        self._buf = []
+        self._pos = 0
+        # RNG state the buffered batch was drawn from (for exact getstate)
+        self._refill = None
+        self._ulid_prefix = "".join(_CROCKFORD[(clock_ms >> s) & 31]
+                                    for s in range(45, -1, -5))
+        self._ulid_last = self._rng.getrandbits(79)
+
+    def _generate(self, n):
+        if self.mode == "ulid":
+            return self._ulid_batch(n)
+        return self._uuid4_batch(n)
+
+    def _uuid4_batch(self, n):
+        h = self._rng.getrandbits(128 * n).to_bytes(16 * n, "big").hex()
+        v = _VARIANT
+        return [f"{h[i:i + 8]}-{h[i + 8:i + 12]}-4{h[i + 13:i + 16]}-{v[h[i + 16]]}{h[i + 17:i + 20]}-{h[i + 20:i + 32]}"
+                for i in range(0, 32 * n, 32)]
+
+    def _ulid_batch(self, n):
+        p, prefix = _B32_PAIRS, self._ulid_prefix
+        r = self._ulid_last
+        out = []
+        for _ in range(n):
+            r += 1
+            out.append(prefix + p[(r >> 70) & 1023] + p[(r >> 60) & 1023] + p[(r >> 50) & 1023]
+                       + p[(r >> 40) & 1023] + p[(r >> 30) & 1023] + p[(r >> 20) & 1023]
+                       + p[(r >> 10) & 1023] + p[r & 1023])
+        self._ulid_last = r
+        return out
+
+    def next(self):
+        if self._pos == len(self._buf):
+            self._refill = (self._rng.getstate(), self._ulid_last)
+            self._buf = self._generate(self.batch_size)
+            self._pos = 0
+        v = self._buf[self._pos]
+        self._pos += 1
+        return v
+
+    def getstate(self, exact=False):
+        # resumable position for incremental runs; IDs still buffered are
+        # dropped, the restored factory continues with the next batch. exact
+        # also records where the buffered batch came from, so the restored
+        # factory hands out the same IDs as this one would
+        version, internal, gauss = self._rng.getstate()
+        state = {"rng": [version, list(internal), gauss], "ulid_last": self._ulid_last}
+        if exact and self._pos < len(self._buf):
+            (version, internal, gauss), ulid_last = self._refill
+            state["buffer"] = {"rng": [version, list(internal), gauss], "ulid_last": ulid_last,
+                               "size": len(self._buf), "pos": self._pos}
+        return state
+
+    def setstate(self, state):
+        self._buf = []
+        self._pos = 0
+        buffer = state.get("buffer")
+        if buffer is not None:
+            version, internal, gauss = buffer["rng"]
+            self._rng.setstate((version, tuple(internal), gauss))
+            self._ulid_last = buffer["ulid_last"]
+            self._refill = (self._rng.getstate(), self._ulid_last)
+            self._buf = self._generate(buffer["size"])
+            self._pos = buffer["pos"]
+        version, internal, gauss = state["rng"]
+        self._rng.setstate((version, tuple(internal), gauss))
+        self._ulid_last = state["ulid_last"]
+
+    def take(self, n):
+        out = self._buf[self._pos:self._pos + n]
+        self._pos += len(out)
+        if len(out) < n:
+            out += self._generate(n - len(out))
+        return out
+
+
+def pack_uuid(s):
+    return bytes.fromhex(s.replace("-", ""))
+
+
+def unpack_uuid(b):
+    h = b.hex()
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+
+def pack_ulid(s):
+    n = 0
+    for c in s:
+        n = (n << 5) | _CROCKFORD_INDEX[c]
+    return n.to_bytes(ID_BYTES, "big")
+
+
+def unpack_ulid(b):
+    n = int.from_bytes(b, "big")
+    return "".join(_CROCKFORD[(n >> s) & 31] for s in range(125, -1, -5))
+
+
+# mode -> (pack, unpack) between ID strings and their 16-byte form
+ID_CODECS = {"uuid4": (pack_uuid, unpack_uuid), "ulid": (pack_ulid, unpack_ulid)}
+
+
+def np_uuid4_strings(nrng, m):
+    raw = nrng.integers(0, 256, size=(m, 16), dtype=np.uint8)
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80
+    return np_uuid_strings(raw)
+
+
+def np_uuid_strings(raw):
+    # (m, 16) uint8 array of packed UUIDs -> list of m UUID strings
+    m = len(raw)
+    # hex-encode through a 256-entry table of two-char pairs, then lay the
+    # 32 hex chars out around the dashes as one fixed-width ASCII buffer
+    h = np.frombuffer(_HEX_PAIRS, dtype=np.uint16)[raw].view(np.uint8)
+    out = np.full((m, 36), ord("-"), dtype=np.uint8)
+    out[:, 0:8] = h[:, 0:8]
+    out[:, 9:13] = h[:, 8:12]
+    out[:, 14:18] = h[:, 12:16]
+    out[:, 19:23] = h[:, 16:20]
+    out[:, 24:36] = h[:, 20:32]
+    s = out.tobytes().decode("ascii")
+    return [s[i:i + 36] for i in range(0, 36 * m, 36)]
+
+
+def np_ids(nrng, ids, m):
+    # a block of m IDs for the numpy engine; ulid mode falls back to the factory
+    if ids.mode == "uuid4":
+        return np_uuid4_strings(nrng, m)
+    return ids.take(m)
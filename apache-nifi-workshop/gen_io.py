@@ -0,0 +1,987 @@
+import csv
+import glob
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import partial
+from itertools import count, islice
+from urllib.parse import quote
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+    import pyarrow.parquet as pq
+except ImportError:  # only the parquet/arrow formats need pyarrow
+    pa = None
+
+try:
+    import zstandard
+except ImportError:  # only zstd-compressed text parts need zstandard
+    zstandard = None
+
+try:
+    import orjson
+except ImportError:  # the stdlib encoder is the fallback JSON backend
+    orjson = None
+
+# Dataset writers shared by the generators.
+#
+# Every dataset is written through open_writer(), which picks an encoder for
+# the configured format. Rows are dicts; the numpy engine can also hand over
+# column blocks (dict of column lists, None for an all-null column).
+#
+# Column specs are lists of (name, type) with type one of "string", "dict"
+# (low-cardinality string, dictionary-encoded), "int64", "float64" or
+# ("struct", [(name, type), ...]) for nested objects. JSONL and CSV only use
+# the names; parquet and arrow map them to Arrow types.
+#
+# Output files are written under a hidden temp name (".name.ext.tmp", which
+# NiFi's GetFile/ListFile skip by default) and renamed into place when they
+# are complete. With a parts config the output rolls over to a new part file
+# every max_rows rows and/or max_bytes uncompressed bytes, text parts can be
+# gzip or zstd compressed, and each writer records per-part stats for the
+# manifest:
+#
+#   parts = {"max_rows": None, "max_bytes": None, "compression": None,
+#            "manifest": False}
+#
+# Part files are named name.part-00000.ext, or name.part-SSSSS-00000.ext
+# when a sharded run rolls within shard SSSSS.
+#
+# With a partition config the dataset is laid out Hive-style instead:
+#
+#   partition = {"by": [["dt", ["event_time"]], ["node_id", ["node_id"]]],
+#                "max_open_files": 64}
+#
+# Each row goes to <dir>/<name>/dt=YYYY-MM-DD/node_id=n1/ by the field at
+# each path ("dt" takes the date of an ISO time, a missing value lands in
+# __HIVE_DEFAULT_PARTITION__), in part files numbered across the whole
+# dataset. PartitionedWriter keeps at most max_open_files of them open and
+# closes the least recently written one first, so high-cardinality layouts
+# never run out of file descriptors. <dir>/<name>/_partitions.json records
+# per-partition rows, bytes, time range and files, and partition_files()
+# prunes with it alone: no listing, no opening data files.
+#
+# With a pipeline (see gen_pipeline) open_writer() wraps the writer so its
+# batches are encoded and written by a background thread.
+#
+# Text rows are encoded TEXT_BATCH_ROWS at a time and each batch reaches the
+# file as one write. JSON lines come from one of (serializer="auto" picks the
+# first that applies):
+#   orjson    when installed and the dataset has no float64 column (orjson
+#             renders 1.2e-05 as 0.000012, which would change the bytes)
+#   template  a per-dataset "%"-template when the caller declares column
+#             kinds (see encode_block_jsonl), i.e. a fixed-shape record
+#   stdlib    one cached json.JSONEncoder; json.dumps() with non-default
+#             arguments builds a new encoder for every call
+# All three produce the bytes json.dumps(r, separators=(",", ":"),
+# ensure_ascii=False) + "\n" would.
+#
+# A text writer can take a faults hook (see gen_faults.FaultInjector): every
+# encoded batch passes through faults.apply(lines, times) on its way to the
+# file. A partitioned writer applies it to the dataset's whole stream before
+# routing, so a fault that moves a record's event time (a delayed replay, a
+# date before the FX rates) also moves it to that date's partition.
+#
+# The reading side, for tools that consume what the generators wrote:
+# dataset_files() lists a dataset's file, part files (partitioned ones too)
+# and delta files (full output first, then each delta run),
+# chunk_ranges()/read_chunk() split an
+# uncompressed text file into byte ranges that workers read line by line,
+# and read_records() yields the rows of a (small) reference file.
+
+FORMATS = ("jsonl", "csv", "parquet", "arrow")
+FORMAT_EXT = {"jsonl": ".jsonl", "csv": ".csv",
+              "parquet": ".parquet", "arrow": ".arrow"}
+COMPRESSIONS = (None, "gzip", "zstd")
+COMPRESSION_EXT = {None: "", "gzip": ".gz", "zstd": ".zst"}
+SERIALIZERS = ("auto", "orjson", "stdlib")
+TEXT_BATCH_ROWS = 10_000
+
+DEFAULT_COLUMNAR = {"row_group_rows": 250_000, "compression": "zstd"}
+DEFAULT_PARTS = {"max_rows": None, "max_bytes": None,
+                 "compression": None, "manifest": False}
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = "1.1"
+PARTITION_INDEX_NAME = "_partitions.json"
+PARTITION_INDEX_VERSION = "1.1"
+HIVE_NULL = "__HIVE_DEFAULT_PARTITION__"
+DEFAULT_PARTITION = {"by": [], "max_open_files": 64}
+
+# what follows the dataset name in its file names: name.jsonl,
+# name.part-00003.jsonl, name.part-00003-00001.jsonl.gz, name.delta-00002.csv
+DATASET_SUFFIX_RE = re.compile(r"(\.delta-(\d+))?(\.part-\d+(-\d+)?)?\.\w+(\.\w+)?")
+
+
+def parts_config(parts):
+    cfg = dict(DEFAULT_PARTS, **(parts or {}))
+    if cfg["compression"] not in COMPRESSIONS:
+        raise ValueError(f"unknown part compression {cfg['compression']!r}; expected one of {COMPRESSIONS}")
+    return cfg
+
+
+def partition_config(partition):
+    cfg = dict(DEFAULT_PARTITION, **(partition or {}))
+    if not cfg["by"]:
+        raise ValueError("a partition config needs at least one [key, field path] in by")
+    if not cfg["max_open_files"] or cfg["max_open_files"] < 1:
+        raise ValueError(f"max_open_files must be at least 1, got {cfg['max_open_files']!r}")
+    return cfg
+
+
+def rolling(parts):
+    return bool(parts and (parts.get("max_rows") or parts.get("max_bytes")))
+
+
+def output_ext(fmt, compression=None):
+    # columnar formats compress internally (CONFIG["columnar"])
+    if fmt in ("jsonl", "csv"):
+        return FORMAT_EXT[fmt] + COMPRESSION_EXT[compression]
+    return FORMAT_EXT[fmt]
+
+
+def dataset_path(directory, name, fmt, compression=None):
+    return os.path.join(directory, name + output_ext(fmt, compression))
+
+
+def remove_dataset_outputs(directory, name):
+    # drop outputs of every format (and earlier part files) so consumers
+    # never pick up a stale copy next to the new one
+    prefix = os.path.join(glob.escape(directory), glob.escape(name))
+    for ext in FORMAT_EXT.values():
+        for path in glob.glob(f"{prefix}{ext}*") + glob.glob(f"{prefix}.part-*{ext}*"):
+            os.remove(path)
+    # and a partitioned layout: its partition directories and index
+    tree = os.path.join(directory, name)
+    for path in glob.glob(os.path.join(glob.escape(tree), "*=*")):
+        shutil.rmtree(path)
+    if os.path.exists(os.path.join(tree, PARTITION_INDEX_NAME)):
+        os.remove(os.path.join(tree, PARTITION_INDEX_NAME))
+    if os.path.isdir(tree) and not os.listdir(tree):
+        os.rmdir(tree)
+
+
+_json_dumps = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False).encode
+
+
+def has_float(columns):
+    for _, t in columns:
+        if t == "float64" or (isinstance(t, tuple) and has_float(t[1])):
+            return True
+    return False
+
+
+def rows_to_block(fields, rows, kinds):
+    return {f: None if kinds.get(f) == "null" else [r[f] for r in rows] for f in fields}
+
+
+# Column kinds for rendering blocks as text: "str" and "int" columns never
+# hold None, "nullable" columns hold str-or-None, "float" columns hold
+# finite floats, "json" columns hold nested objects (JSONL only), and a
+# column that is None as a whole (kind "null" for rows) is null for every
+# row. "str" values must come from a JSON/CSV-safe alphabet (UUIDs, digits,
+# enum labels, dotted IPs), so the templates render exactly what the row
+# writers would; only declare kinds for datasets whose strings are safe.
+def encode_block_jsonl(fields, block, kinds):
+    parts, cols = [], []
+    for f in fields:
+        col = block[f]
+        kind = kinds.get(f, "str")
+        if col is None:
+            parts.append(f'"{f}":null')
+        elif kind == "nullable":
+            parts.append(f'"{f}":%s')
+            cols.append(["null" if v is None else f'"{v}"' for v in col])
+        elif kind == "json":
+            parts.append(f'"{f}":%s')
+            cols.append([_json_dumps(v) for v in col])
+        else:
+            parts.append({"int": f'"{f}":%d', "float": f'"{f}":%r'}.get(kind, f'"{f}":"%s"'))
+            cols.append(col)
+    template = "{" + ",".join(parts) + "}\n"
+    return [template % row for row in zip(*cols)]
+
+
+def encode_block_csv(fields, block, kinds):
+    parts, cols = [], []
+    for f in fields:
+        col = block[f]
+        if col is None:
+            parts.append("")
+        elif kinds.get(f, "str") == "nullable":
+            parts.append("%s")
+            cols.append(["" if v is None else v for v in col])
+        else:
+            parts.append({"int": "%d", "float": "%r"}.get(kinds.get(f), "%s"))
+            cols.append(col)
+    template = ",".join(parts) + "\r\n"
+    return [template % row for row in zip(*cols)]
+
+
+def block_len(block):
+    return next(len(col) for col in block.values() if col is not None)
+
+
+# Encoders turn a batch of rows (or a block) into a list of lines, either
+# all str or all bytes.
+class JsonlEncoder:
+    def __init__(self, columns, kinds=None, serializer="auto"):
+        if serializer not in SERIALIZERS:
+            raise ValueError(f"unknown serializer {serializer!r}; expected one of {SERIALIZERS}")
+        if serializer == "orjson" and orjson is None:
+            raise SystemExit("serializer 'orjson' requires orjson (pip install orjson)")
+        self.fields = [name for name, _ in columns]
+        self.header = None
+        self.kinds = kinds
+        self.orjson = None
+        # a float64 column declared "null" never holds a float
+        numeric = [(n, t) for n, t in columns if (kinds or {}).get(n) != "null"]
+        if serializer != "stdlib" and orjson is not None and not has_float(numeric):
+            self.orjson = partial(orjson.dumps, option=orjson.OPT_APPEND_NEWLINE)
+
+    def encode_rows(self, rows):
+        if self.orjson is not None:
+            return [self.orjson(r) for r in rows]
+        if self.kinds is not None:
+            return encode_block_jsonl(self.fields, rows_to_block(self.fields, rows, self.kinds), self.kinds)
+        dumps = _json_dumps
+        return [dumps(r) + "\n" for r in rows]
+
+    def encode_block(self, block, kinds):
+        return encode_block_jsonl(self.fields, block, kinds)
+
+
+class CsvEncoder:
+    def __init__(self, columns, kinds=None, serializer="auto"):
+        self.fields = [name for name, _ in columns]
+        # nested objects are written as their Python repr by DictWriter
+        self.kinds = kinds if kinds is not None and "json" not in kinds.values() else None
+        self.buf = io.StringIO()
+        self.w = csv.DictWriter(self.buf, fieldnames=self.fields)
+        self.w.writeheader()
+        self.header = self._take()
+
+    def _take(self):
+        s = self.buf.getvalue()
+        self.buf.seek(0)
+        self.buf.truncate()
+        return s
+
+    def encode_rows(self, rows):
+        if self.kinds is not None:
+            return encode_block_csv(self.fields, rows_to_block(self.fields, rows, self.kinds), self.kinds)
+        self.w.writerows(rows)
+        lines = self._take().split("\r\n")
+        if len(lines) == len(rows) + 1:
+            return [line + "\r\n" for line in lines[:-1]]
+        # a quoted value spans lines; encode row by row instead
+        out = []
+        for r in rows:
+            self.w.writerow(r)
+            out.append(self._take())
+        return out
+
+    def encode_block(self, block, kinds):
+        return encode_block_csv(self.fields, block, kinds)
+
+
+class _HashingFile:
+    # counts and checksums the bytes that reach the disk
+    closed = False
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.sha = hashlib.sha256()
+        self.bytes = 0
+
+    def write(self, b):
+        self.sha.update(b)
+        self.bytes += len(b)
+        return self.raw.write(b)
+
+    def tell(self):
+        return self.bytes
+
+    def flush(self):
+        self.raw.flush()
+
+
+class PartFile:
+    # one output file: written under a hidden temp name, optionally
+    # compressed, renamed into place by close()
+    def __init__(self, path, compression=None):
+        self.path = path
+        self.tmp = os.path.join(os.path.dirname(path), "." + os.path.basename(path) + ".tmp")
+        self.raw = open(self.tmp, "wb")
+        self.hashed = _HashingFile(self.raw)
+        if compression == "gzip":
+            # fixed mtime and no embedded name keep seeded runs byte-identical
+            self.out = gzip.GzipFile(filename="", mode="wb", fileobj=self.hashed, mtime=0)
+        elif compression == "zstd":
+            if zstandard is None:
+                raise SystemExit("zstd part compression requires zstandard (pip install zstandard)")
+            self.out = zstandard.ZstdCompressor().stream_writer(self.hashed, closefd=False)
+        else:
+            self.out = self.hashed
+
+    def write(self, b):
+        self.out.write(b)
+
+    def close(self):
+        if self.out is not self.hashed:
+            self.out.close()
+        self.raw.close()
+        os.replace(self.tmp, self.path)
+        return {"bytes": self.hashed.bytes, "sha256": self.hashed.sha.hexdigest()}
+
+    def discard(self):
+        self.raw.close()
+        os.remove(self.tmp)
+
+
+@contextmanager
+def atomic_write(path, mode="w"):
+    # a single file written the same way as a part: under a hidden temp name
+    # next to path, renamed over it only once the block completes, so a run
+    # that dies half-way (or a reader racing it) never sees a partial file
+    # and any previous version (or a cached hardlink of it) stays intact
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    tmp = os.path.join(directory, "." + os.path.basename(path) + ".tmp")
+    f = open(tmp, mode, encoding=None if "b" in mode else "utf-8")
+    try:
+        yield f
+    except BaseException:
+        f.close()
+        os.remove(tmp)
+        raise
+    f.close()
+    os.replace(tmp, path)
+
+
+def arrow_type(t):
+    if isinstance(t, tuple) and t[0] == "struct":
+        return pa.struct([(name, arrow_type(sub)) for name, sub in t[1]])
+    return {
+        "string": pa.string(),
+        "dict": pa.dictionary(pa.int32(), pa.string()),
+        "int64": pa.int64(),
+        "float64": pa.float64(),
+    }[t]
+
+
+class _DictColumn:
+    # Dictionary that only ever grows, so every batch's dictionary is a
+    # prefix-extension of the last one; Arrow IPC files accept that as a
+    # delta, while an independently built dictionary per batch is rejected.
+    def __init__(self):
+        self.values = []
+        self.index = {}
+
+    def array(self, col):
+        index = self.index
+        codes = []
+        for v in col:
+            if v is None:
+                codes.append(None)
+                continue
+            code = index.get(v)
+            if code is None:
+                code = index[v] = len(self.values)
+                self.values.append(v)
+            codes.append(code)
+        return pa.DictionaryArray.from_arrays(pa.array(codes, pa.int32()), pa.array(self.values, pa.string()))
+
+
+class _ColumnarSink:
+    # a Parquet or Arrow IPC writer on top of one PartFile; "dict" columns
+    # are dictionary-encoded
+    def __init__(self, f, columns, fmt, schema, opts):
+        self.dicts = {name: _DictColumn() for name, t in columns if t == "dict"}
+        codec = opts["compression"] or "none"
+        if fmt == "parquet":
+            self.w = pq.ParquetWriter(f, schema, compression=codec,
+                                      use_dictionary=list(self.dicts))
+        else:
+            if codec not in ("none", "lz4", "zstd"):
+                raise ValueError(f"arrow IPC supports lz4 or zstd compression, not {codec!r}")
+            self.w = pa_ipc.new_file(f, schema, options=pa_ipc.IpcWriteOptions(
+                compression=None if codec == "none" else codec, emit_dictionary_deltas=True))
+
+    def close(self):
+        self.w.close()
+
+
+class DatasetWriter:
+    # Writes one dataset as a single file, or as size-rolled part files when
+    # the parts config sets max_rows/max_bytes. self.parts lists the stats of
+    # every finished file (path, rows, bytes, sha256, min/max time_field).
+    def __init__(self, directory, name, fmt, columns, options=None, parts=None,
+                 shard=None, time_field=None, kinds=None, serializer="auto", faults=None, numbering=None):
+        if fmt not in FORMATS:
+            raise ValueError(f"unknown output format {fmt!r}; expected one of {FORMATS}")
+        cfg = parts_config(parts)
+        self.directory = directory
+        self.name = name
+        self.fmt = fmt
+        self.columns = columns
+        self.shard = shard
+        self.time_field = time_field
+        self.rolling = rolling(cfg)
+        self.max_rows = cfg["max_rows"] or None
+        self.max_bytes = cfg["max_bytes"] or None
+        self.compression = cfg["compression"] if fmt in ("jsonl", "csv") else None
+        self.ext = output_ext(fmt, self.compression)
+        self.parts = []
+        self.faults = faults
+        # a shared part counter (PartitionedWriter): always numbered names
+        self.numbering = numbering
+        self._f = None
+        if fmt == "jsonl":
+            self.encoder = JsonlEncoder(columns, kinds, serializer)
+        elif fmt == "csv":
+            self.encoder = CsvEncoder(columns, kinds, serializer)
+        else:
+            if pa is None:
+                raise SystemExit(f"the {fmt} output format requires pyarrow (pip install pyarrow)")
+            self.encoder = None
+            self.opts = dict(DEFAULT_COLUMNAR, **(options or {}))
+            self.schema = pa.schema([(n, arrow_type(t)) for n, t in columns])
+            self.row_group_rows = self.opts["row_group_rows"]
+        # rows per write_rows() batch
+        self.chunk = TEXT_BATCH_ROWS if self.encoder is not None else self.row_group_rows
+
+    def _part_name(self):
+        stem = self.name
+        numbered = self.rolling or self.numbering is not None
+        number = len(self.parts) if self.numbering is None else next(self.numbering)
+        if self.shard is not None:
+            stem += f".part-{self.shard:05d}"
+            if numbered:
+                stem += f"-{number:05d}"
+        elif numbered:
+            stem += f".part-{number:05d}"
+        return stem + self.ext
+
+    def _open_part(self):
+        self._f = PartFile(os.path.join(self.directory, self._part_name()), self.compression)
+        self._rows = 0
+        self._bytes = 0
+        self._min = self._max = None
+        if self.encoder is None:
+            self._sink = _ColumnarSink(self._f.out, self.columns, self.fmt, self.schema, self.opts)
+        elif self.encoder.header:
+            data = self.encoder.header.encode("utf-8")
+            self._f.write(data)
+            self._bytes += len(data)
+
+    def _close_part(self):
+        if self.encoder is None:
+            self._sink.close()
+        stats = self._f.close()
+        self.parts.append({
+            "path": os.path.basename(self._f.path),
+            "rows": self._rows,
+            "bytes": stats["bytes"],
+            "min_time": self._min,
+            "max_time": self._max,
+            "sha256": stats["sha256"],
+        })
+        self._f = None
+
+    def _track_times(self, times):
+        times = [t for t in times if t is not None]
+        if not times:
+            return
+        lo, hi = min(times), max(times)
+        if self._min is None or lo < self._min:
+            self._min = lo
+        if self._max is None or hi > self._max:
+            self._max = hi
+
+    def _full(self):
+        return (self.max_rows is not None and self._rows >= self.max_rows) or \
+            (self.max_bytes is not None and self._bytes >= self.max_bytes)
+
+    def _room(self, n):
+        # rows of the next n that still fit in the open part by row count
+        if self.max_rows is None:
+            return n
+        return min(n, self.max_rows - self._rows)
+
+    def _write_lines(self, lines, times):
+        if self.faults is not None:
+            lines, times = self.faults.apply(lines, times)
+        i, n = 0, len(lines)
+        binary = n > 0 and isinstance(lines[0], bytes)
+        while i < n:
+            if self._f is None:
+                self._open_part()
+            j = i + self._room(n - i)
+            if self.max_bytes is None:
+                data = b"".join(lines[i:j]) if binary else "".join(lines[i:j]).encode("utf-8")
+            else:
+                # cut at the line that reaches the byte budget (at least one line)
+                budget, chunks = self.max_bytes - self._bytes, []
+                for k in range(i, j):
+                    b = lines[k] if binary else lines[k].encode("utf-8")
+                    chunks.append(b)
+                    budget -= len(b)
+                    if budget <= 0:
+                        j = k + 1
+                        break
+                data = b"".join(chunks)
+            self._f.write(data)
+            self._rows += j - i
+            self._bytes += len(data)
+            if self.time_field:
+                self._track_times(times[i:j])
+            i = j
+            if self.rolling and self._full():
+                self._close_part()
+
+    def _write_columns(self, cols, n):
+        start = 0
+        while start < n:
+            if self._f is None:
+                self._open_part()
+            end = start + min(self._room(n - start), self.row_group_rows)
+            arrays = []
+            for name, t in self.columns:
+                col = cols[name]
+                if col is None:
+                    arrays.append(pa.nulls(end - start, arrow_type(t)))
+                elif name in self._sink.dicts:
+                    arrays.append(self._sink.dicts[name].array(col[start:end]))
+                else:
+                    arrays.append(pa.array(col[start:end], arrow_type(t)))
+            self._sink.w.write_batch(pa.record_batch(arrays, schema=self.schema))
+            self._rows += end - start
+            # a columnar part's size is only known as its batches reach the file
+            self._bytes = self._f.hashed.bytes
+            if self.time_field and cols[self.time_field] is not None:
+                self._track_times(cols[self.time_field][start:end])
+            start = end
+            if self.rolling and self._full():
+                self._close_part()
+
+    def write_rows(self, rows):
+        rows = iter(rows)
+        tf = self.time_field
+        while True:
+            batch = list(islice(rows, self.chunk))
+            if not batch:
+                return
+            if self.encoder is not None:
+                self._write_lines(self.encoder.encode_rows(batch),
+                                  [r.get(tf) for r in batch] if tf else None)
+            else:
+                cols = {name: [r.get(name) for r in batch] for name, _ in self.columns}
+                self._write_columns(cols, len(batch))
+
+    def write_block(self, block, kinds):
+        if self.encoder is not None:
+            self._write_lines(self.encoder.encode_block(block, kinds),
+                              block[self.time_field] if self.time_field else None)
+        else:
+            self._write_columns(block, block_len(block))
+
+    def write_lines(self, lines, times):
+        # lines already encoded (and through faults) by a PartitionedWriter
+        self._write_lines(lines, times)
+
+    def close(self):
+        if self._f is None and not self.parts:
+            # an empty dataset still gets its (header-only) file
+            self._open_part()
+        if self._f is not None:
+            self._close_part()
+
+    def abort(self):
+        if self._f is not None:
+            self._f.discard()
+            self._f = None
+
+
+def partition_value(key, value):
+    if key == "dt":
+        return value[:10] if isinstance(value, str) and value else None
+    return None if value is None else str(value)
+
+
+def field_at(row, path):
+    for name in path:
+        row = row.get(name) if isinstance(row, dict) else None
+    return row
+
+
+def parse_epoch(value, default=None):
+    # ISO-8601 time ("Z", an offset, or naive meaning UTC) -> epoch seconds;
+    # default for a missing or unparseable value, so each reader decides
+    # what a bad time means (a failure, sort-first, an error)
+    if not isinstance(value, str):
+        return default
+    try:
+        dt = datetime.fromisoformat(value[:-1] if value.endswith("Z") else value)
+    except ValueError:
+        return default
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
+def partition_path(keys, values):
+    # "dt=2026-01-01/node_id=n1", values escaped the way Hive does
+    return "/".join(f"{k}={HIVE_NULL if v is None else quote(v, safe='')}" for k, v in zip(keys, values))
+
+
+class PartitionedWriter:
+    # Same interface as DatasetWriter, for a partition config: rows are
+    # grouped by partition per batch and each group goes through the
+    # DatasetWriter of its partition directory. Those share one part counter,
+    # so every file name in the dataset is unique (consumers name their
+    # outputs after them). Only max_open_files partitions hold an open file;
+    # a partition evicted from that LRU and written again continues in a new
+    # part. self.parts lists every finished part, with its path relative to
+    # directory and its partition values. With faults the rows are encoded
+    # and faulted here, then routed by their event time after the fault; each
+    # label names the partition its record went to.
+    def __init__(self, directory, name, fmt, columns, options=None, parts=None, shard=None,
+                 time_field=None, kinds=None, serializer="auto", faults=None, partition=None):
+        if fmt not in FORMATS:
+            raise ValueError(f"unknown output format {fmt!r}; expected one of {FORMATS}")
+        cfg = partition_config(partition)
+        self.directory = directory
+        self.name = name
+        self.by = cfg["by"]
+        self.keys = [key for key, _ in self.by]
+        self.max_open = cfg["max_open_files"]
+        self.args = (fmt, columns, options, parts, shard, time_field, kinds, serializer)
+        self.time_field = time_field
+        self.faults = faults
+        if faults is not None:
+            # faulted records are routed by time alone: only dt of time_field
+            if [[key, list(path)] for key, path in self.by] != [["dt", [time_field]]]:
+                raise ValueError(f"fault injection needs a partition config by [['dt', [{time_field!r}]]], "
+                                 f"got {cfg['by']!r}")
+            self.encoder = JsonlEncoder(columns, kinds, serializer) if fmt == "jsonl" else \
+                CsvEncoder(columns, kinds, serializer)
+            faults.partition_of = lambda row: partition_path(self.keys, self._values(row))
+        self.chunk = TEXT_BATCH_ROWS if fmt in ("jsonl", "csv") else \
+            dict(DEFAULT_COLUMNAR, **(options or {}))["row_group_rows"]
+        self.numbering = count()
+        self.writers = {}
+        self.open = OrderedDict()
+
+    def _values(self, row):
+        return tuple(partition_value(key, field_at(row, path)) for key, path in self.by)
+
+    def _writer(self, values):
+        w = self.writers.get(values)
+        if w is None:
+            path = os.path.join(self.directory, self.name, *partition_path(self.keys, values).split("/"))
+            os.makedirs(path, exist_ok=True)
+            w = self.writers[values] = DatasetWriter(path, self.name, *self.args, numbering=self.numbering)
+        if values in self.open:
+            self.open.move_to_end(values)
+        else:
+            if len(self.open) >= self.max_open:
+                _, lru = self.open.popitem(last=False)
+                lru.close()
+            self.open[values] = w
+        return w
+
+    def _write_faulted(self, lines, times):
+        lines, times = self.faults.apply(lines, times)
+        groups = {}
+        for line, t in zip(lines, times):
+            group = groups.setdefault((partition_value("dt", t),), ([], []))
+            group[0].append(line)
+            group[1].append(t)
+        for values, (group_lines, group_times) in groups.items():
+            self._writer(values).write_lines(group_lines, group_times)
+
+    def write_rows(self, rows):
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, self.chunk))
+            if not batch:
+                return
+            if self.faults is not None:
+                self._write_faulted(self.encoder.encode_rows(batch), [r.get(self.time_field) for r in batch])
+                continue
+            groups = {}
+            for r in batch:
+                groups.setdefault(self._values(r), []).append(r)
+            for values, group in groups.items():
+                self._writer(values).write_rows(group)
+
+    def write_block(self, block, kinds):
+        if self.faults is not None:
+            self._write_faulted(self.encoder.encode_block(block, kinds), list(block[self.time_field]))
+            return
+        # blocks are flat: every partition field path is one column
+        cols = [block[path[0]] for _, path in self.by]
+        groups = {}
+        for i in range(block_len(block)):
+            values = tuple(partition_value(key, None if col is None else col[i])
+                           for (key, _), col in zip(self.by, cols))
+            groups.setdefault(values, []).append(i)
+        for values, idx in groups.items():
+            self._writer(values).write_block(
+                {f: None if col is None else [col[i] for i in idx] for f, col in block.items()}, kinds)
+
+    @property
+    def parts(self):
+        out = []
+        for values, w in self.writers.items():
+            prefix = f"{self.name}/{partition_path(self.keys, values)}/"
+            out += [dict(p, path=prefix + p["path"], partition=dict(zip(self.keys, values))) for p in w.parts]
+        return sorted(out, key=lambda p: p["path"])
+
+    def close(self):
+        for w in self.open.values():
+            w.close()
+        self.open.clear()
+
+    def abort(self):
+        for w in self.open.values():
+            w.abort()
+        self.open.clear()
+
+
+def open_writer(directory, name, fmt, columns, options=None, parts=None, shard=None, time_field=None,
+                kinds=None, serializer="auto", faults=None, partition=None, pipeline=None):
+    # pipeline: a gen_pipeline.Pipeline to write from a background thread
+    if partition:
+        w = PartitionedWriter(directory, name, fmt, columns, options, parts, shard, time_field,
+                              kinds, serializer, faults, partition)
+    else:
+        w = DatasetWriter(directory, name, fmt, columns, options, parts, shard, time_field,
+                          kinds, serializer, faults)
+    return pipeline.wrap(w, name) if pipeline is not None else w
+
+
+def write_manifest(directory, name, fmt, parts, part_stats, time_field=None):
+    # records one dataset's part files in directory/manifest.json, keeping
+    # the entries of the other datasets written to the same directory; each
+    # part's min_time/max_time are the bounds of the dataset's time_field
+    # (event_time, opened_at, window_start, ...)
+    cfg = parts_config(parts)
+    path = os.path.join(directory, MANIFEST_NAME)
+    manifest = {"manifest_version": MANIFEST_VERSION, "datasets": {}}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            loaded = json.load(f)
+        # a manifest from before min_time/max_time is rewritten whole
+        if loaded.get("manifest_version") == MANIFEST_VERSION:
+            manifest = loaded
+    part_stats = sorted(part_stats, key=lambda p: p["path"])
+    manifest["datasets"][name] = {
+        "format": fmt,
+        "compression": cfg["compression"] if fmt in ("jsonl", "csv") else None,
+        "time_field": time_field,
+        "rows": sum(p["rows"] for p in part_stats),
+        "bytes": sum(p["bytes"] for p in part_stats),
+        "parts": part_stats,
+    }
+    with atomic_write(path) as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+
+def write_partition_index(directory, name, fmt, partition, part_stats, time_field=None):
+    # per-partition rows, bytes, time range and files of a partitioned
+    # dataset in directory/name/_partitions.json
+    keys = [key for key, _ in partition_config(partition)["by"]]
+    partitions = {}
+    for p in sorted(part_stats, key=lambda p: p["path"]):
+        path, file_name = p["path"][len(name) + 1:].rsplit("/", 1)
+        e = partitions.get(path)
+        if e is None:
+            e = partitions[path] = {"path": path, "values": p["partition"], "rows": 0, "bytes": 0,
+                                    "min_time": None, "max_time": None, "files": []}
+        e["rows"] += p["rows"]
+        e["bytes"] += p["bytes"]
+        if p["min_time"] is not None and (e["min_time"] is None or p["min_time"] < e["min_time"]):
+            e["min_time"] = p["min_time"]
+        if p["max_time"] is not None and (e["max_time"] is None or p["max_time"] > e["max_time"]):
+            e["max_time"] = p["max_time"]
+        e["files"].append({"path": file_name, "rows": p["rows"], "bytes": p["bytes"]})
+    index = {
+        "partition_index_version": PARTITION_INDEX_VERSION,
+        "dataset": name,
+        "format": fmt,
+        "keys": keys,
+        "time_field": time_field,
+        "rows": sum(e["rows"] for e in partitions.values()),
+        "bytes": sum(e["bytes"] for e in partitions.values()),
+        "partitions": list(partitions.values()),
+    }
+    with atomic_write(os.path.join(directory, name, PARTITION_INDEX_NAME)) as f:
+        json.dump(index, f, indent=2, sort_keys=True)
+
+
+def write_dataset(directory, name, fmt, columns, rows, options=None, parts=None, time_field=None,
+                  kinds=None, serializer="auto", faults=None, partition=None, pipeline=None):
+    remove_dataset_outputs(directory, name)
+    w = open_writer(directory, name, fmt, columns, options, parts, time_field=time_field,
+                    kinds=kinds, serializer=serializer, faults=faults, partition=partition,
+                    pipeline=pipeline)
+    try:
+        w.write_rows(rows)
+    except BaseException:
+        w.abort()
+        raise
+    w.close()
+    if parts and parts.get("manifest"):
+        write_manifest(directory, name, fmt, parts, w.parts, time_field)
+    if partition:
+        write_partition_index(directory, name, fmt, partition, w.parts, time_field)
+    return w.parts
+
+
+def file_format(path):
+    # (format, compression) from the file name, or None for other files
+    root, ext = os.path.splitext(path)
+    compression = next((c for c, e in COMPRESSION_EXT.items() if c and e == ext), None)
+    if compression:
+        root, ext = os.path.splitext(root)
+    fmt = next((f for f, e in FORMAT_EXT.items() if e == ext), None)
+    if fmt is None or (compression and fmt not in ("jsonl", "csv")):
+        return None
+    return fmt, compression
+
+
+def dataset_files(directory, name):
+    # the dataset's single file, part files or partition files, then those of
+    # each delta run in run order (later rows supersede earlier ones)
+    files = []
+    partitioned = os.path.join(glob.escape(directory), glob.escape(name), "**", glob.escape(name) + ".*")
+    for path in glob.glob(os.path.join(glob.escape(directory), glob.escape(name) + ".*")) + \
+            glob.glob(partitioned, recursive=True):
+        m = DATASET_SUFFIX_RE.fullmatch(os.path.basename(path)[len(name):])
+        if m:
+            files.append((int(m[2] or 0), path))
+    return [path for _, path in sorted(files)]
+
+
+def read_partition_index(directory, name):
+    # the dataset's partition index, or None when it is not partitioned
+    path = os.path.join(directory, name, PARTITION_INDEX_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        index = json.load(f)
+    if index.get("partition_index_version") != PARTITION_INDEX_VERSION:
+        raise SystemExit(f"{path}: unsupported partition index version "
+                         f"{index.get('partition_index_version')!r}; regenerate the dataset")
+    return index
+
+
+def partition_files(directory, name, start=None, end=None, **values):
+    # files of the partitions that can hold rows with start <= time <= end
+    # (ISO strings, either may be None) and the given partition values, e.g.
+    # partition_files(raw, "nifi_provenance", node_id="n1"); read from the
+    # index only. An unpartitioned dataset returns all of its files.
+    index = read_partition_index(directory, name)
+    if index is None:
+        return dataset_files(directory, name)
+    files = []
+    for e in index["partitions"]:
+        if any(e["values"].get(k) != str(v) for k, v in values.items()):
+            continue
+        if start is not None and e["max_time"] is not None and e["max_time"] < start:
+            continue
+        if end is not None and e["min_time"] is not None and e["min_time"] > end:
+            continue
+        files += [os.path.join(directory, name, *e["path"].split("/"), f["path"]) for f in e["files"]]
+    return files
+
+
+def file_stamp(path):
+    # size and mtime: readers that remember how far they got in a file
+    # (trace index, SLO checkpoint) compare it to spot a rewritten file
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def open_source(path, compression):
+    # binary reader over a text file, decompressing gzip/zstd
+    if compression == "gzip":
+        return gzip.open(path, "rb")
+    if compression == "zstd":
+        if zstandard is None:
+            raise SystemExit(f"{path}: reading zstd files requires zstandard (pip install zstandard)")
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True))
+    return open(path, "rb")
+
+
+def read_header(path, compression):
+    with open_source(path, compression) as f:
+        line = f.readline()
+    return next(csv.reader([line.decode("utf-8").rstrip("\r\n")]), [])
+
+
+def read_records(path):
+    # rows of a dataset file as dicts (CSV values stay strings)
+    fmt, compression = file_format(path)
+    if fmt in ("parquet", "arrow"):
+        if pa is None:
+            raise SystemExit(f"{path}: reading {fmt} files requires pyarrow (pip install pyarrow)")
+        if fmt == "parquet":
+            table = pq.read_table(path)
+        else:
+            with pa_ipc.open_file(path) as reader:
+                table = reader.read_all()
+        yield from table.to_pylist()
+        return
+    with open_source(path, compression) as f:
+        text = io.TextIOWrapper(f, encoding="utf-8", newline="")
+        if fmt == "csv":
+            yield from csv.DictReader(text)
+            return
+        for line in text:
+            if line.strip():
+                yield json.loads(line)
+
+
+def chunk_ranges(path, chunk_bytes):
+    # byte ranges of about chunk_bytes; a worker starts at the first line
+    # beginning inside its range
+    size = os.path.getsize(path)
+    if size == 0:
+        return [(0, 0)]
+    return [(start, min(start + chunk_bytes, size)) for start in range(0, size, chunk_bytes)]
+
+
+def read_chunk(f, start, end):
+    # raw lines (newline kept) starting in [start, end), with their offsets;
+    # end None reads to EOF
+    if start:
+        f.seek(start - 1)
+        f.readline()
+    pos = f.tell()
+    while end is None or pos < end:
+        line = f.readline()
+        if not line:
+            return
+        yield pos, line
+        pos += len(line)
+
+
+def concat(out_path, parts, head=b""):
+    # joins per-chunk outputs (in the given order) into one file
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    with open(out_path, "wb") as out:
+        out.write(head)
+        for part in parts:
+            with open(part, "rb") as f:
+                shutil.copyfileobj(f, out, 1 << 20)
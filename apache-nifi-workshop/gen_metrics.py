@@ -0,0 +1,170 @@
+import cProfile
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # Windows: no peak RSS metric
+    resource = None
+
+# Self-instrumentation shared by the generators.
+#
+# Each generator phase runs inside Instrumentation.stage(name); when metrics
+# are enabled the stage's wall time, rows, rows/sec, bytes written and
+# memory are appended to a JSONL file as flow_kpis records:
+#
+#   {"window_start": <stage start>, "window_end": <stage end>,
+#    "flow_name": <generator>, "metric_name": "stage_wall_s",
+#    "metric_value": 1.234, "dimensions": {"env": ..., "cluster": ...,
+#    "stage": "transactions", "run_id": ...}}
+#
+# so the observability flows that read flow_kpis.jsonl can ingest the
+# generator's own telemetry as-is.
+#
+# Memory comes as three metrics. stage_peak_rss_mb is the stage's own peak
+# RSS: on Linux the kernel's peak (VmHWM) is reset to the current RSS as a
+# stage starts (/proc/self/clear_refs), and stage_rss_growth_mb is how far
+# the stage took RSS above where it started, which points at the phase
+# that grew (Python seldom hands memory back, so a later stage's peak
+# includes what earlier ones left behind); elsewhere neither is recorded.
+# process_peak_rss_mb is cumulative, the largest RSS of the process so far
+# (any stage up to this one), which the planner uses as its base memory.
+# The reset also lowers ru_maxrss, so with metrics on read the process peak
+# from these records.
+#
+# Optional hooks: tracemalloc adds a per-stage traced_peak_mb metric (and
+# slows the run down), profile_path writes a cProfile dump of the whole run
+# (open with pstats or snakeviz).
+#
+#   cfg = {"enabled": False, "path": ..., "dimensions": {...},
+#          "tracemalloc": False, "profile_path": None}
+
+ISO_UTC_FMT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def reset_peak_rss():
+    # True when the kernel's peak RSS of this process now starts over from
+    # the current RSS (Linux 4.0+)
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def hwm_rss_mb():
+    # peak RSS since the last reset_peak_rss(), from /proc/self/status
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+class StageMetrics:
+    def __init__(self):
+        self.rows = 0
+        self.bytes = 0
+
+    def add_parts(self, parts):
+        # count the rows and bytes of gen_io writer part stats
+        for p in parts or ():
+            self.rows += p["rows"]
+            self.bytes += p["bytes"]
+
+
+class Instrumentation:
+    def __init__(self, flow_name, cfg=None):
+        cfg = cfg or {}
+        self.flow_name = flow_name
+        self.enabled = bool(cfg.get("enabled"))
+        self.path = cfg.get("path")
+        self.dimensions = dict(cfg.get("dimensions") or {})
+        self.tracemalloc = self.enabled and bool(cfg.get("tracemalloc"))
+        self.profile_path = cfg.get("profile_path")
+        self.records = []
+        # largest RSS seen, across the per-stage resets
+        self.process_peak = None
+        started = datetime.now(timezone.utc)
+        self.run_id = f"{flow_name}-{started.strftime('%Y%m%dT%H%M%SZ')}-{os.getpid()}"
+        self.profiler = None
+        if self.tracemalloc:
+            tracemalloc.start()
+        if self.profile_path:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def _record(self, start, end, stage, metric, value):
+        self.records.append({
+            "window_start": start,
+            "window_end": end,
+            "flow_name": self.flow_name,
+            "metric_name": metric,
+            "metric_value": float(value),
+            "dimensions": dict(self.dimensions, stage=stage, run_id=self.run_id),
+        })
+
+    @contextmanager
+    def stage(self, name):
+        m = StageMetrics()
+        if not self.enabled:
+            yield m
+            return
+        start = datetime.now(timezone.utc).strftime(ISO_UTC_FMT)
+        self._peak(peak_rss_mb())
+        start_rss = hwm_rss_mb() if reset_peak_rss() else None
+        if self.tracemalloc:
+            tracemalloc.reset_peak()
+        t0 = time.perf_counter()
+        yield m
+        wall = time.perf_counter() - t0
+        end = datetime.now(timezone.utc).strftime(ISO_UTC_FMT)
+        self._record(start, end, name, "stage_wall_s", wall)
+        self._record(start, end, name, "rows_produced", m.rows)
+        self._record(start, end, name, "rows_per_s", m.rows / wall if wall > 0 else 0.0)
+        self._record(start, end, name, "bytes_written", m.bytes)
+        stage_peak = hwm_rss_mb() if start_rss is not None else None
+        if stage_peak is not None:
+            self._record(start, end, name, "stage_peak_rss_mb", stage_peak)
+            self._record(start, end, name, "stage_rss_growth_mb", max(0.0, stage_peak - start_rss))
+        self._peak(stage_peak)
+        self._peak(peak_rss_mb())
+        if self.process_peak is not None:
+            self._record(start, end, name, "process_peak_rss_mb", self.process_peak)
+        if self.tracemalloc:
+            self._record(start, end, name, "traced_peak_mb", tracemalloc.get_traced_memory()[1] / (1024 * 1024))
+
+    def _peak(self, mb):
+        if mb is not None and (self.process_peak is None or mb > self.process_peak):
+            self.process_peak = mb
+
+    def close(self):
+        if self.profiler is not None:
+            self.profiler.disable()
+            self.profiler.dump_stats(self.profile_path)
+            print(f"cProfile stats written to {self.profile_path}")
+        if self.tracemalloc:
+            tracemalloc.stop()
+        if self.enabled and self.records:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", newline="", encoding="utf-8") as f:
+                for r in self.records:
+                    f.write(json.dumps(r, separators=(",", ":"), ensure_ascii=False) + "\n")
+            print(f"{len(self.records)} generator metrics ({self.run_id}) appended to {self.path}")
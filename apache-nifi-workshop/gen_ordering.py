@@ -0,0 +1,119 @@
+import heapq
+import os
+import pickle
+import shutil
+import tempfile
+from operator import itemgetter
+
+# Event-time ordering for the observability generator.
+#
+# The generator draws each node's stream in time order to begin with:
+# ascending_uniforms() yields n uniform draws already sorted (the order
+# statistics, one at a time), the generator maps them through the inverse
+# of its time distribution, and heapq.merge k-way merges the node streams,
+# holding one row per node.
+#
+# ordered() is the fallback for rows drawn at random times (the "sort"
+# mode, which keeps exactly the rows of an unordered run). It routes each
+# row to its node's NodeSorter (node_id, or
+# context.node_id for alerts; datasets with no node use one stream), which
+# returns that node's rows in event-time order, and k-way merges the node
+# streams into one ordered stream with heapq.merge.
+#
+# A NodeSorter keeps up to max_rows rows in memory. Past that it sorts the
+# buffer and spills it to a run file (pickled blocks of RUN_BLOCK_ROWS
+# rows) under tmp_dir, and rows() merges the runs with what is left in
+# memory, so sorting needs memory for max_rows rows, not for the dataset.
+# Sorting and merging are stable (ties keep generation order, then node
+# order), so the output is the same whether or not anything was spilled.
+#
+# Event times are fixed-width ISO-8601 UTC strings, which sort as text.
+
+RUN_BLOCK_ROWS = 4096
+
+
+def ascending_uniforms(rng, n):
+    # n uniform [0, 1) draws in ascending order, one at a time: the smallest
+    # of k uniforms above x is 1 - (1 - x) * V ** (1 / k), V uniform (0, 1]
+    x = 0.0
+    random = rng.random
+    for k in range(n, 0, -1):
+        x = 1.0 - (1.0 - x) * (1.0 - random()) ** (1.0 / k)
+        yield x
+
+
+def node_getter(path):
+    # row -> node id for a field path such as ("context", "node_id")
+    if path is None:
+        return lambda row: None
+    if len(path) == 1:
+        return itemgetter(path[0])
+
+    def get(row):
+        for name in path:
+            row = row.get(name) if isinstance(row, dict) else None
+        return row
+    return get
+
+
+class NodeSorter:
+    def __init__(self, time_field, max_rows, tmp_dir):
+        self.key = itemgetter(time_field)
+        self.max_rows = max_rows
+        self.tmp_dir = tmp_dir
+        self.buf = []
+        self.runs = []
+        self.rows_in = 0
+
+    def add(self, row):
+        self.buf.append(row)
+        self.rows_in += 1
+        if self.max_rows is not None and len(self.buf) >= self.max_rows:
+            self._spill()
+
+    def _spill(self):
+        self.buf.sort(key=self.key)
+        fd, path = tempfile.mkstemp(suffix=".run", dir=self.tmp_dir)
+        with os.fdopen(fd, "wb") as f:
+            for i in range(0, len(self.buf), RUN_BLOCK_ROWS):
+                pickle.dump(self.buf[i:i + RUN_BLOCK_ROWS], f, pickle.HIGHEST_PROTOCOL)
+        self.runs.append(path)
+        self.buf = []
+
+    def rows(self):
+        self.buf.sort(key=self.key)
+        if not self.runs:
+            return iter(self.buf)
+        return heapq.merge(*[read_run(p) for p in self.runs], self.buf, key=self.key)
+
+
+def read_run(path):
+    with open(path, "rb") as f:
+        while True:
+            try:
+                block = pickle.load(f)
+            except EOFError:
+                return
+            yield from block
+
+
+def ordered(rows, time_field, node_path=None, nodes=(), max_rows=None, tmp_dir=None):
+    # rows re-emitted in time_field order: per-node sort, then k-way merge.
+    # max_rows caps the rows held in memory (split across the node sorters);
+    # spilled runs go to a private directory under tmp_dir
+    node_of = node_getter(node_path)
+    per_node = None if max_rows is None else max(1, max_rows // max(1, len(nodes)))
+    run_dir = tempfile.mkdtemp(prefix=".sort-", dir=tmp_dir) if max_rows is not None else None
+    try:
+        sorters = {n: NodeSorter(time_field, per_node, run_dir) for n in nodes}
+        for row in rows:
+            node = node_of(row)
+            sorter = sorters.get(node)
+            if sorter is None:
+                sorter = sorters[node] = NodeSorter(time_field, per_node, run_dir)
+            sorter.add(row)
+        streams = [s.rows() for s in sorters.values() if s.rows_in]
+        yield from heapq.merge(*streams, key=itemgetter(time_field))
+    finally:
+        if run_dir is not None:
+            shutil.rmtree(run_dir, ignore_errors=True)
@@ -0,0 +1,139 @@
+import queue
+import threading
+import time
+from itertools import islice
+
+# Pipelined dataset writes: generation and encoding/compression/file I/O
+# overlap instead of taking turns.
+#
+# Pipeline.wrap() puts a PipelinedWriter in front of a gen_io writer
+# (DatasetWriter or PartitionedWriter). The caller's thread keeps drawing
+# rows: write_rows() cuts them into the writer's own batches (TEXT_BATCH_ROWS
+# text rows or one row group) and write_block() passes numpy blocks as they
+# are, onto a bounded queue of queue_batches batches. A writer thread per
+# dataset drains the queue through the wrapped writer, so batch boundaries,
+# order and bytes are exactly those of an inline write.
+#
+# The bounded queue is the backpressure: when the disk (or the encoder) is
+# the bottleneck the generator blocks on a full queue, so memory stays at
+# queue_batches + 2 batches per dataset however large the run. Each writer
+# records how long the generator waited on it (generate_blocked_s) and how
+# long its thread waited for rows (write_idle_s); Pipeline.summary() reports
+# both per dataset. Mostly the first says the disk is the bottleneck, mostly
+# the second that generation is.
+#
+# Threads overlap work that runs outside the GIL: file writes, gzip/zstd
+# compression and pyarrow encoding. JSON/CSV encoding in Python still
+# shares the interpreter with row generation; orjson keeps that part short.
+#
+# A writer thread that fails keeps draining (and dropping) batches so the
+# generator never blocks on it; the error is raised in the generator's
+# thread at its next write or at close().
+
+
+class Pipeline:
+    def __init__(self, queue_batches=4):
+        if not queue_batches or queue_batches < 1:
+            raise ValueError(f"queue_batches must be at least 1, got {queue_batches!r}")
+        self.queue_batches = queue_batches
+        # dataset -> {"generate_blocked_s", "write_idle_s", "batches"}
+        self.totals = {}
+
+    def wrap(self, writer, name):
+        return PipelinedWriter(writer, self, name)
+
+    def add(self, name, generate_blocked_s, write_idle_s, batches):
+        t = self.totals.setdefault(name, {"generate_blocked_s": 0.0, "write_idle_s": 0.0, "batches": 0})
+        t["generate_blocked_s"] += generate_blocked_s
+        t["write_idle_s"] += write_idle_s
+        t["batches"] += batches
+
+    def merge(self, totals):
+        # totals of another Pipeline, e.g. one per shard worker process
+        for name, t in totals.items():
+            self.add(name, t["generate_blocked_s"], t["write_idle_s"], t["batches"])
+
+    def summary(self):
+        if not self.totals:
+            return "pipelined writes: nothing written"
+        blocked = sum(t["generate_blocked_s"] for t in self.totals.values())
+        idle = sum(t["write_idle_s"] for t in self.totals.values())
+        return (f"pipelined writes: generation blocked {blocked:.2f}s on full queues, "
+                f"writers idle {idle:.2f}s waiting for rows ("
+                + ", ".join(f"{name} {t['generate_blocked_s']:.2f}s/{t['write_idle_s']:.2f}s "
+                            f"over {t['batches']} batches" for name, t in self.totals.items()) + ")")
+
+
+class PipelinedWriter:
+    # same interface as the writer it wraps
+    def __init__(self, writer, pipeline, name):
+        self.w = writer
+        self.pipeline = pipeline
+        self.name = name
+        self.queue = queue.Queue(pipeline.queue_batches)
+        self.error = None
+        self.blocked_s = 0.0
+        self.idle_s = 0.0
+        self.batches = 0
+        self.thread = threading.Thread(target=self._drain, name=f"writer-{name}", daemon=True)
+        self.thread.start()
+
+    def _drain(self):
+        get = self.queue.get
+        while True:
+            t0 = time.perf_counter()
+            item = get()
+            self.idle_s += time.perf_counter() - t0
+            if item is None:
+                return
+            if self.error is not None:
+                continue
+            data, kinds = item
+            try:
+                if kinds is None:
+                    self.w.write_rows(data)
+                else:
+                    self.w.write_block(data, kinds)
+            except BaseException as e:
+                self.error = e
+
+    def _put(self, item):
+        if self.error is not None:
+            raise self.error
+        t0 = time.perf_counter()
+        self.queue.put(item)
+        self.blocked_s += time.perf_counter() - t0
+        self.batches += 1
+
+    def write_rows(self, rows):
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, self.w.chunk))
+            if not batch:
+                return
+            self._put((batch, None))
+
+    def write_block(self, block, kinds):
+        self._put((block, kinds or {}))
+
+    def _finish(self):
+        if self.thread is None:
+            return
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+        self.pipeline.add(self.name, self.blocked_s, self.idle_s, self.batches)
+
+    @property
+    def parts(self):
+        return self.w.parts
+
+    def close(self):
+        self._finish()
+        if self.error is not None:
+            raise self.error
+        self.w.close()
+
+    def abort(self):
+        self._finish()
+        self.w.abort()
@@ -0,0 +1,238 @@
+import json
+import os
+import platform
+import re
+import shutil
+import tracemalloc
+from datetime import datetime, timezone
+
+from gen_io import atomic_write, dataset_files
+
+# Scale factors, CONFIG overrides and run planning shared by the generators.
+#
+# Scale factors are TPC-style: SF1 is the volumes in CONFIG, SFn multiplies
+# every entity and event count by n (time spans such as fx_days stay put),
+# so the ratios between datasets hold at any size. --set KEY=VALUE then
+# overrides any CONFIG value by its dotted path (volumes.transactions=5e6,
+# parts.max_rows=1000000, formats.transactions=parquet).
+#
+# A plan predicts a run before anything is written. Each generator describes
+# its datasets (rows, instrumentation stage, rows held in memory at once,
+# rows kept in packed entity tables) and estimate() prices them with
+# per-row costs:
+#
+#   bytes_per_row     output bytes (from the files of a calibration run)
+#   rows_per_s        stage throughput (from the run's stage metrics)
+#   row_mem_bytes     one row dict held in memory (tracemalloc)
+#   table_mem_bytes   one packed entity table row (tracemalloc)
+#
+# plus the fixed setup time and base memory of the process. Runtime is the
+# sum over stages (parallel stages divided by their workers), peak memory
+# the base plus every entity table per process plus the largest batch held
+# at once.
+#
+# Costs depend on the formats, engine and compression, so a calibration is
+# stored per cost profile (those settings) in costs_path; --calibrate
+# measures the current one with a small run in a temp directory. Every
+# calibration records the machine it ran on. Without a matching calibration
+# the generator's built-in costs are used: rough defaults from one run of
+# its default settings on the machine they name, and the plan says so
+# (rows_per_s scale with the CPU).
+
+PLAN_COSTS_VERSION = "1.0"
+SCALE_RE = re.compile(r"(?i)^(sf)?(\d+(\.\d*)?|\.\d+)$")
+
+
+def parse_scale(text):
+    m = SCALE_RE.match(str(text).strip())
+    sf = float(m.group(2)) if m else 0.0
+    if sf <= 0:
+        raise SystemExit(f"bad scale factor {text!r}; expected e.g. SF1, SF100, SF0.1 or 1000")
+    return sf
+
+
+def scale_volumes(volumes, sf, keys):
+    # every count in keys times sf (at least 1); other volumes keep their value
+    for key in keys:
+        volumes[key] = max(1, int(round(volumes[key] * sf)))
+
+
+def parse_value(text, current):
+    # JSON when it parses (numbers, true/false/null, lists, objects), else the
+    # plain string; 5e6 for an int setting becomes 5000000
+    try:
+        value = json.loads(text)
+    except ValueError:
+        return text
+    if isinstance(current, int) and not isinstance(current, bool) and isinstance(value, float) \
+            and value.is_integer():
+        return int(value)
+    return value
+
+
+def set_value(config, spec):
+    # applies one KEY=VALUE override, KEY a dotted path into config
+    path, sep, text = spec.partition("=")
+    if not sep or not path:
+        raise SystemExit(f"--set expects KEY=VALUE, got {spec!r}")
+    keys = path.split(".")
+    node = config
+    for i, key in enumerate(keys[:-1]):
+        if not isinstance(node.get(key), dict):
+            raise SystemExit(f"--set {path}: {'.'.join(keys[:i + 1])} is not a CONFIG section")
+        node = node[key]
+    last = keys[-1]
+    if last not in node:
+        raise SystemExit(f"--set {path}: unknown key {last!r}; expected one of {sorted(node)}")
+    value = parse_value(text, node[last])
+    if isinstance(node[last], dict) and not isinstance(value, dict):
+        raise SystemExit(f"--set {path}: is a section; set one of its keys {sorted(node[last])}")
+    node[last] = value
+
+
+def machine():
+    # where a calibration ran
+    return {"system": f"{platform.system()} {platform.machine()}", "cpus": os.cpu_count(),
+            "python": platform.python_version()}
+
+
+def machine_text(m):
+    if not m:
+        return "an unrecorded machine"
+    return f"a {m['cpus']}-CPU {m['system']} machine, Python {m['python']}"
+
+
+def costs_source(costs, builtin):
+    # how print_plan() describes where costs come from
+    if builtin:
+        return (f"built-in rough defaults, measured {costs['created_at']} on {machine_text(costs.get('machine'))}; "
+                f"--calibrate measures this machine")
+    return f"costs calibrated {costs['created_at']} on {machine_text(costs.get('machine'))}"
+
+
+def profile_key(profile):
+    return json.dumps(profile, sort_keys=True, separators=(",", ":"))
+
+
+def load_costs(path, generator, profile):
+    # the calibration stored for this generator and cost profile, or None
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get("plan_costs_version") != PLAN_COSTS_VERSION:
+        return None
+    return data.get("generators", {}).get(generator, {}).get(profile_key(profile))
+
+
+def save_costs(path, generator, profile, costs):
+    data = {"plan_costs_version": PLAN_COSTS_VERSION, "generators": {}}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            loaded = json.load(f)
+        if loaded.get("plan_costs_version") == PLAN_COSTS_VERSION:
+            data = loaded
+    data["generators"].setdefault(generator, {})[profile_key(profile)] = costs
+    with atomic_write(path) as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+
+
+def traced_bytes(make):
+    # bytes allocated (and still held) by make()'s result
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = make()
+    size = tracemalloc.get_traced_memory()[0] - before
+    del kept
+    if not was_tracing:
+        tracemalloc.stop()
+    return max(0, size)
+
+
+def measure_costs(datasets, records, wall_s, dirs, row_mem, table_mem):
+    # costs from one calibration run: datasets as plan_datasets() described
+    # it, records its Instrumentation records, dirs role -> output directory,
+    # row_mem/table_mem dataset -> bytes per row
+    stages = {}
+    for r in records:
+        stage = stages.setdefault(r["dimensions"]["stage"], {})
+        stage[r["metric_name"]] = r["metric_value"]
+    costs = {"created_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"), "machine": machine(),
+             "base_mb": max((s.get("process_peak_rss_mb") or 0.0) for s in stages.values()) if stages else 0.0,
+             # everything outside the priced stages (startup, contracts, ...)
+             "setup_s": round(max(0.0, wall_s - sum(stages.get(st, {}).get("stage_wall_s", 0.0)
+                                                    for st in {d["stage"] for d in datasets})), 3),
+             "stages": {}, "datasets": {}}
+    for name, s in stages.items():
+        if s.get("rows_produced"):
+            costs["stages"][name] = {"rows_per_s": round(s["rows_produced"] / max(s["stage_wall_s"], 1e-6), 1)}
+    for d in datasets:
+        size = sum(os.path.getsize(path) for path in dataset_files(dirs[d["dir"]], d["name"]))
+        costs["datasets"][d["name"]] = {
+            "bytes_per_row": round(size / d["rows"], 1) if d["rows"] else 0.0,
+            "row_mem_bytes": round(row_mem.get(d["name"], 0.0), 1),
+            "table_mem_bytes": round(table_mem.get(d["name"], 0.0), 1),
+        }
+    return costs
+
+
+def estimate(datasets, costs):
+    # [{"name", "rows", "bytes", "seconds"}] per dataset plus the totals
+    # (parallel: workers running at once; processes: worker processes, each
+    # with its own copy of the entity tables)
+    out = []
+    held = tables = 0.0
+    procs = 1
+    for d in datasets:
+        c = costs["datasets"].get(d["name"], {})
+        rate = costs["stages"].get(d["stage"], {}).get("rows_per_s")
+        seconds = d["rows"] / rate / max(1, d.get("parallel", 1)) if rate else None
+        out.append({"name": d["name"], "rows": d["rows"], "bytes": d["rows"] * c.get("bytes_per_row", 0.0),
+                    "seconds": seconds})
+        n = d.get("processes", 1)
+        procs = max(procs, n + 1 if n > 1 else 1)
+        tables += d.get("table_rows", 0) * c.get("table_mem_bytes", 0.0)
+        held = max(held, d.get("held_rows", 0) * c.get("row_mem_bytes", 0.0) * n)
+    return {
+        "datasets": out,
+        "rows": sum(d["rows"] for d in out),
+        "bytes": sum(d["bytes"] for d in out),
+        "seconds": costs["setup_s"] + sum(d["seconds"] or 0.0 for d in out),
+        "peak_mb": procs * (costs["base_mb"] + tables / (1024 * 1024)) + held / (1024 * 1024),
+    }
+
+
+def human_bytes(n):
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if n < 1000 or unit == "TB":
+            return f"{n:.1f} {unit}" if unit != "B" else f"{n:.0f} B"
+        n /= 1000
+
+
+def human_seconds(s):
+    if s < 120:
+        return f"{s:.1f} s"
+    if s < 7200:
+        return f"{s / 60:.1f} min"
+    return f"{s / 3600:.1f} h"
+
+
+def print_plan(generator, plan, source, out_dir, note=None):
+    print(f"plan for {generator} ({source})")
+    print(f"{'dataset':<20} {'rows':>16} {'bytes':>12} {'time':>10}")
+    for d in plan["datasets"]:
+        t = human_seconds(d["seconds"]) if d["seconds"] is not None else "?"
+        print(f"{d['name']:<20} {d['rows']:>16,} {human_bytes(d['bytes']):>12} {t:>10}")
+    print(f"{'total':<20} {plan['rows']:>16,} {human_bytes(plan['bytes']):>12} "
+          f"{human_seconds(plan['seconds']):>10}  (setup included)")
+    print(f"peak memory about {plan['peak_mb']:,.0f} MB (all processes)")
+    probe = out_dir
+    while probe and not os.path.exists(probe):
+        probe = os.path.dirname(probe)
+    free = shutil.disk_usage(probe or ".").free
+    print(f"{human_bytes(free)} free at {out_dir}" +
+          ("  NOT ENOUGH for this run" if free < plan["bytes"] else ""))
+    if note:
+        print(note)
@@ -0,0 +1,69 @@
+import hashlib
+import json
+import os
+from functools import partial
+
+from faker import Faker
+
+from gen_io import atomic_write
+
+# Pre-generated Faker value pools shared by the generators.
+#
+# Faker providers cost tens of microseconds per call, which dominates large
+# runs. A pool calls a provider until it holds `size` distinct values (or the
+# provider stops producing new ones), then rows draw from it with one indexed
+# RNG pick. The pool size is the real distinct-value count of that column, so
+# cardinality stays under control for downstream dedupe/tokenization caches.
+
+
+def pool_seed(seed, name):
+    key = f"{seed}:pool:{name}".encode("utf-8")
+    return int.from_bytes(hashlib.sha256(key).digest()[:8], "big")
+
+
+def pool_cache_path(cache_dir, locale, seed, name, size):
+    return os.path.join(cache_dir, f"{locale}-seed{seed}-{name}-{size}.json")
+
+
+def build_pool(make, size, locale, seed):
+    fake = Faker(locale)
+    fake.seed_instance(seed)
+    values, seen = [], set()
+    misses, max_misses = 0, 10 * size + 100
+    while len(values) < size and misses < max_misses:
+        v = make(fake)
+        if v in seen:
+            misses += 1
+            continue
+        seen.add(v)
+        values.append(v)
+    return values
+
+
+def load_pool(name, make, size, locale, seed, cache_dir=None):
+    path = pool_cache_path(cache_dir, locale, seed,
+                           name, size) if cache_dir else None
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    values = build_pool(make, size, locale, pool_seed(seed, name))
+    if path:
+        with atomic_write(path) as f:
+            json.dump(values, f, ensure_ascii=False)
+    return values
+
+
+def load_pools(providers, cfg, seed):
+    # name -> list of distinct values, for every provider with a configured size
+    if not cfg or not cfg.get("enabled"):
+        return {}
+    locale = cfg.get("locale", "en_US")
+    return {name: load_pool(name, providers[name], size, locale, seed, cfg.get("cache_dir"))
+            for name, size in cfg["sizes"].items() if name in providers}
+
+
+def value_sources(providers, pools, rng, fake):
+    # name -> zero-arg callable: an indexed pool draw when the provider is
+    # pooled, otherwise a direct Faker call
+    return {name: partial(rng.choice, pools[name]) if pools.get(name) else partial(make, fake)
+            for name, make in providers.items()}
@@ -0,0 +1,229 @@
+import base64
+import time
+from array import array
+from datetime import datetime, timezone
+
+from gen_ids import ID_BYTES, ID_CODECS, np_uuid_strings
+
+try:
+    import numpy as np
+except ImportError:  # take() falls back to per-item decoding
+    np = None
+
+# Compact, array-backed reference entity tables shared by the generators.
+#
+# A list of row dicts costs a few hundred bytes per entity (a dict plus a
+# str object per field), which is tens of GB at 10M accounts. An
+# EntityTable keeps one packed column per field instead:
+#
+#   id    16-byte binary IDs in one bytearray (see gen_ids.ID_CODECS)
+#   ref   row index into another table's id column (array of uint32)
+#   enum  one-byte codes plus the interned labels (at most 256)
+#   time  epoch seconds (array of int64), rendered as ISO-8601 UTC
+#   text  UTF-8 bytes in one bytearray plus an offsets array
+#
+# Columns index like sequences, so rng.choice(table["merchant_id"]) draws
+# exactly what it would from a list of the same IDs, and table.row(i)
+# rebuilds the row dict for writing.
+
+ISO_UTC_FMT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+def _b64(data):
+    return base64.b64encode(bytes(data)).decode("ascii")
+
+
+class IdColumn:
+    def __init__(self, mode):
+        self.mode = mode
+        self._pack, self._unpack = ID_CODECS[mode]
+        self.data = bytearray()
+
+    def __len__(self):
+        return len(self.data) // ID_BYTES
+
+    def __getitem__(self, i):
+        return self._unpack(self.data[i * ID_BYTES:(i + 1) * ID_BYTES])
+
+    def append(self, value):
+        self.data += self._pack(value)
+
+    def take(self, indices):
+        # IDs at an array of row indices; one vectorized decode for UUIDs
+        if np is not None and self.mode == "uuid4" and len(indices):
+            raw = np.frombuffer(self.data, dtype=np.uint8).reshape(-1, ID_BYTES)[indices]
+            return np_uuid_strings(raw)
+        return [self[i] for i in indices]
+
+    def getstate(self):
+        return {"data": _b64(self.data)}
+
+    def setstate(self, state):
+        self.data = bytearray(base64.b64decode(state["data"]))
+
+
+class RefColumn:
+    def __init__(self, target):
+        # target: the referenced table's IdColumn
+        self.target = target
+        self.index = array("I")
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, i):
+        return self.target[self.index[i]]
+
+    def append(self, value):
+        self.index.append(value)
+
+    def take(self, indices):
+        if np is not None and len(indices):
+            return self.target.take(np.frombuffer(self.index, dtype=np.uint32)[indices])
+        return [self[i] for i in indices]
+
+    def getstate(self):
+        return {"data": _b64(self.index)}
+
+    def setstate(self, state):
+        self.index = array("I")
+        self.index.frombytes(base64.b64decode(state["data"]))
+
+
+class EnumColumn:
+    def __init__(self):
+        self.labels = []
+        self.codes = bytearray()
+        self._code = {}
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, i):
+        return self.labels[self.codes[i]]
+
+    def __setitem__(self, i, value):
+        self.codes[i] = self.intern(value)
+
+    def intern(self, value):
+        code = self._code.get(value)
+        if code is None:
+            if len(self.labels) == 256:
+                raise ValueError(f"enum column holds at most 256 labels, got {value!r} as the 257th")
+            code = self._code[value] = len(self.labels)
+            self.labels.append(value)
+        return code
+
+    def append(self, value):
+        self.codes.append(self.intern(value))
+
+    def take(self, indices):
+        if np is not None and len(indices):
+            labels = np.array(self.labels, dtype=object)
+            return labels[np.frombuffer(self.codes, dtype=np.uint8)[indices]].tolist()
+        return [self[i] for i in indices]
+
+    def getstate(self):
+        return {"labels": self.labels, "data": _b64(self.codes)}
+
+    def setstate(self, state):
+        self.labels = list(state["labels"])
+        self._code = {v: i for i, v in enumerate(self.labels)}
+        self.codes = bytearray(base64.b64decode(state["data"]))
+
+
+class TimeColumn:
+    def __init__(self):
+        self.seconds = array("q")
+
+    def __len__(self):
+        return len(self.seconds)
+
+    def __getitem__(self, i):
+        return time.strftime(ISO_UTC_FMT, time.gmtime(self.seconds[i]))
+
+    def append(self, value):
+        # fromisoformat is ~20x faster than strptime; values end in "Z"
+        dt = datetime.fromisoformat(value[:-1]).replace(tzinfo=timezone.utc)
+        self.seconds.append(int(dt.timestamp()))
+
+    def take(self, indices):
+        return [self[i] for i in indices]
+
+    def getstate(self):
+        return {"data": _b64(self.seconds)}
+
+    def setstate(self, state):
+        self.seconds = array("q")
+        self.seconds.frombytes(base64.b64decode(state["data"]))
+
+
+class TextColumn:
+    def __init__(self):
+        self.data = bytearray()
+        self.offsets = array("Q", [0])
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.data[self.offsets[i]:self.offsets[i + 1]].decode("utf-8")
+
+    def append(self, value):
+        self.data += value.encode("utf-8")
+        self.offsets.append(len(self.data))
+
+    def take(self, indices):
+        return [self[i] for i in indices]
+
+    def getstate(self):
+        return {"data": _b64(self.data), "offsets": _b64(self.offsets)}
+
+    def setstate(self, state):
+        self.data = bytearray(base64.b64decode(state["data"]))
+        self.offsets = array("Q")
+        self.offsets.frombytes(base64.b64decode(state["offsets"]))
+
+
+class EntityTable:
+    def __init__(self, spec, id_mode, refs=None):
+        # spec: [(column, kind)], kinds as above; refs: ref column -> the
+        # EntityTable it points into
+        self.names = [name for name, _ in spec]
+        self.columns = {}
+        for name, kind in spec:
+            if kind == "id":
+                self.columns[name] = IdColumn(id_mode)
+            elif kind == "ref":
+                target = refs[name]
+                self.columns[name] = RefColumn(target.columns[target.names[0]])
+            elif kind == "enum":
+                self.columns[name] = EnumColumn()
+            elif kind == "time":
+                self.columns[name] = TimeColumn()
+            elif kind == "text":
+                self.columns[name] = TextColumn()
+            else:
+                raise ValueError(f"unknown column kind {kind!r} for {name}")
+
+    def __len__(self):
+        return len(self.columns[self.names[0]])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def append(self, row, **ref_index):
+        # ref columns take the referenced row's index (as a keyword) rather
+        # than its ID string
+        for name in self.names:
+            self.columns[name].append(ref_index[name] if name in ref_index else row[name])
+
+    def row(self, i):
+        return {name: self.columns[name][i] for name in self.names}
+
+    def getstate(self):
+        return {name: self.columns[name].getstate() for name in self.names}
+
+    def setstate(self, state):
+        for name in self.names:
+            self.columns[name].setstate(state[name])
@@ -0,0 +1,183 @@
+from array import array
+from bisect import bisect_right
+from datetime import timedelta
+
+try:
+    import numpy as np
+except ImportError:  # np_sample is only used by the numpy engine
+    np = None
+
+# Skewed key and time distributions shared by the generators.
+#
+# By default every pick is uniform. A skew config swaps individual picks for
+# production-shaped ones, to reproduce hotspots in LookupRecord caches,
+# DetectDuplicate and partitioned routing:
+#
+#   accounts_zipf / merchants_zipf / devices_zipf
+#       Zipf exponent s: the k-th entity (in creation order) is picked with
+#       weight 1 / k**s, so with s ~ 1 the top 1% of keys take about half
+#       the traffic
+#   diurnal   24 UTC hourly weights, or a DIURNAL_CURVES name
+#   weekly    7 weights Monday..Sunday, or a WEEKLY_CURVES name
+#   bursts    [{"ago_hours": 36, "hours": 2, "multiplier": 20}]: the hours
+#             starting ago_hours before "now" get multiplier x the traffic
+#   node_weights (observability) one weight per CONFIG["nodes"] entry
+#
+# Every weighted pick goes through an AliasTable (Vose's alias method): O(n)
+# to build, then one rng.random() and two array reads per sample, whatever
+# the number of keys.
+
+DIURNAL_CURVES = {
+    "flat": [1] * 24,
+    # consumer payments: quiet overnight, lunch bump, evening peak
+    "retail": [2, 1, 1, 1, 1, 2, 4, 6, 8, 9, 10, 12, 14, 12, 10, 10, 11, 13, 16, 18, 17, 13, 8, 4],
+    # business hours
+    "b2b": [1, 1, 1, 1, 1, 1, 2, 5, 12, 16, 16, 15, 12, 15, 16, 15, 12, 7, 3, 2, 1, 1, 1, 1],
+}
+WEEKLY_CURVES = {
+    "flat": [1] * 7,
+    "retail": [9, 9, 10, 10, 13, 16, 12],
+    "b2b": [12, 12, 12, 12, 11, 2, 1],
+}
+
+SKEW_PRESETS = {
+    "uniform": {},
+    "hot-keys": {"accounts_zipf": 1.1, "merchants_zipf": 1.2, "devices_zipf": 1.0,
+                 "node_weights": [6, 3, 1]},
+    "diurnal": {"diurnal": "retail", "weekly": "retail"},
+    "peak": {"accounts_zipf": 1.1, "merchants_zipf": 1.2, "devices_zipf": 1.0,
+             "node_weights": [6, 3, 1], "diurnal": "retail", "weekly": "retail",
+             "bursts": [{"ago_hours": 30, "hours": 3, "multiplier": 25}]},
+}
+
+
+class AliasTable:
+    def __init__(self, weights):
+        n = len(weights)
+        if n == 0:
+            raise ValueError("AliasTable needs at least one weight")
+        total = float(sum(weights))
+        if total <= 0:
+            raise ValueError("AliasTable weights must sum to a positive value")
+        scaled = [w * n / total for w in weights]
+        prob = array("d", [1.0]) * n
+        alias = array("I", range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, g = small.pop(), large.pop()
+            prob[s] = scaled[s]
+            alias[s] = g
+            scaled[g] -= 1.0 - scaled[s]
+            (small if scaled[g] < 1.0 else large).append(g)
+        # leftovers are 1.0 up to rounding
+        self.n = n
+        self.prob = prob
+        self.alias = alias
+
+    def sampler(self, rng):
+        # zero-arg callable returning an index in [0, n)
+        random, n, prob, alias = rng.random, self.n, self.prob, self.alias
+
+        def sample():
+            u = random() * n
+            i = int(u)
+            return i if u - i < prob[i] else alias[i]
+        return sample
+
+    def np_sample(self, nrng, m):
+        u = nrng.random(m) * self.n
+        i = u.astype(np.int64)
+        prob = np.frombuffer(self.prob, dtype=np.float64)
+        alias = np.frombuffer(self.alias, dtype=np.uint32)
+        return np.where(u - i < prob[i], i, alias[i])
+
+
+def zipf_weights(n, s):
+    return [1.0 / (k ** s) for k in range(1, n + 1)]
+
+
+def zipf_table(n, s):
+    # None (uniform) unless an exponent is set
+    if not s or n == 0:
+        return None
+    return AliasTable(zipf_weights(n, s))
+
+
+def curve(value, curves, length):
+    if value is None:
+        return None
+    weights = curves[value] if isinstance(value, str) else value
+    if len(weights) != length:
+        raise ValueError(f"expected {length} weights, got {len(weights)}")
+    return weights
+
+
+class TimeProfile:
+    # offsets (seconds before now) over a window_s window, weighted per hour
+    # slot by the diurnal/weekly curves and burst windows
+    def __init__(self, now, window_s, diurnal=None, weekly=None, bursts=()):
+        diurnal = curve(diurnal, DIURNAL_CURVES, 24) or DIURNAL_CURVES["flat"]
+        weekly = curve(weekly, WEEKLY_CURVES, 7) or WEEKLY_CURVES["flat"]
+        self.window_s = window_s
+        slots = -(-window_s // 3600)
+        self.slot_len = [min(3600, window_s - k * 3600) for k in range(slots)]
+        weights = []
+        for k in range(slots):
+            mid = now - timedelta(seconds=k * 3600 + self.slot_len[k] / 2)
+            w = diurnal[mid.hour] * weekly[mid.weekday()] * self.slot_len[k]
+            for b in bursts:
+                if b["ago_hours"] - b["hours"] <= k < b["ago_hours"]:
+                    w *= b["multiplier"]
+            weights.append(w)
+        self.slots = AliasTable(weights)
+        # cumulative weight from the oldest slot, for quantile()
+        self.cum = []
+        acc = 0.0
+        for w in reversed(weights):
+            acc += w
+            self.cum.append(acc)
+
+    def sampler(self, rng):
+        pick, randrange, slot_len = self.slots.sampler(rng), rng.randrange, self.slot_len
+
+        def sample():
+            k = pick()
+            return k * 3600 + randrange(slot_len[k])
+        return sample
+
+    def quantile(self, u):
+        # the offset at quantile u in [0, 1) of event time (0 = oldest): the
+        # inverse of what sampler() draws from, non-increasing in u, so
+        # ascending u give ascending times
+        cum = self.cum
+        x = u * cum[-1]
+        i = min(bisect_right(cum, x), len(cum) - 1)
+        k = len(cum) - 1 - i
+        lo = cum[i - 1] if i else 0.0
+        n = self.slot_len[k]
+        r = min(int((x - lo) / (cum[i] - lo) * n), n - 1) if cum[i] > lo else 0
+        return k * 3600 + n - 1 - r
+
+    def np_sample(self, nrng, m):
+        k = self.slots.np_sample(nrng, m)
+        slot_len = np.array(self.slot_len, dtype=np.int64)
+        return k * 3600 + (nrng.random(m) * slot_len[k]).astype(np.int64)
+
+
+def time_profile(cfg, now, window_s):
+    # None (uniform) unless the skew config shapes time
+    if not cfg or not (cfg.get("diurnal") or cfg.get("weekly") or cfg.get("bursts")):
+        return None
+    return TimeProfile(now, window_s, cfg.get("diurnal"), cfg.get("weekly"), cfg.get("bursts") or ())
+
+
+def apply_preset(cfg, name):
+    # resets cfg (a CONFIG["skew"] dict) to the named preset; only the keys
+    # cfg already has are set, since each generator reads its own subset
+    # (no node_weights for fintech, no Zipf exponents for observability)
+    if name not in SKEW_PRESETS:
+        raise ValueError(f"unknown skew preset {name!r}; expected one of {sorted(SKEW_PRESETS)}")
+    for key in cfg:
+        cfg[key] = [] if key == "bursts" else None
+    cfg.update((key, value) for key, value in SKEW_PRESETS[name].items() if key in cfg)
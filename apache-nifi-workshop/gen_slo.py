@@ -0,0 +1,266 @@
+import heapq
+import json
+import math
+from datetime import datetime, timezone
+
+from gen_io import atomic_write, parse_epoch
+
+# Incremental SLO aggregation over flow_kpis records (observability Module 3).
+#
+# The flow gathers the KPI records of one (flow_name, window) with
+# MergeRecord and pivots them with QueryRecord. SloAggregator does the same
+# in one pass: add() folds a record into its window's running state (per
+# metric: count, sum, max, and a QuantileSketch for QUANTILE_METRICS) and
+# returns the windows the watermark has passed, finalized as derived SLO
+# records:
+#
+#   {"window_start": ..., "window_end": ..., "flow_name": ...,
+#    "succeeded": <sum postings_succeeded>, "failed": <sum postings_failed>,
+#    "dlq_count": <sum>, "backpressure_engaged": <max>,
+#    "latency_ms_p95": <p95 of the latency_ms_p95 values>,
+#    "error_rate": failed / (succeeded + failed), "kpi_records": <n>}
+#
+# As in the Module 3 SQL, a metric with no records in the window is 0.
+# Windows are tumbling window_s windows on time_field (window_end, when the
+# KPI was measured); window_s None keeps each record's own
+# window_start/window_end, the flow's GROUP BY. The watermark is the latest
+# time seen minus lateness_s: a window is final once its end is at or
+# before the watermark, and a record for a finalized window is counted as
+# late and dropped. lateness_s None holds every window until flush(), which
+# suits the generated files (not in time order).
+#
+# getstate()/from_state() (and save_checkpoint/load_checkpoint) carry the
+# open windows, sketches included, across restarts, along with inputs: what
+# the caller has already fed in (aggregate_slos records each file's stamp
+# and consumed byte offset there), so a restarted run does not add it twice.
+
+SLO_STATE_VERSION = "1.1"
+ISO_UTC_FMT = "%Y-%m-%dT%H:%M:%SZ"
+QUANTILE_METRICS = ("latency_ms_p95",)
+# output field -> (aggregate, metric_name)
+SLO_FIELDS = {
+    "succeeded": ("sum", "postings_succeeded"),
+    "failed": ("sum", "postings_failed"),
+    "dlq_count": ("sum", "dlq_count"),
+    "backpressure_engaged": ("max", "backpressure_engaged"),
+    "latency_ms_p95": ("p95", "latency_ms_p95"),
+}
+DERIVED_SLO_COLUMNS = [
+    ("window_start", "string"), ("window_end", "string"), ("flow_name", "dict"),
+    ("succeeded", "float64"), ("failed", "float64"), ("dlq_count", "float64"),
+    ("backpressure_engaged", "float64"), ("latency_ms_p95", "float64"),
+    ("error_rate", "float64"), ("kpi_records", "int64"),
+]
+
+
+def record_epoch(record, field):
+    # KPI times are required: a record without one is an error, not a late
+    # or dropped record, so it cannot silently shift a window's sums
+    t = parse_epoch(record.get(field))
+    if t is None:
+        raise ValueError(f"flow_kpis record has no parseable {field}: {record.get(field)!r}")
+    return t
+
+
+def iso_utc(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime(ISO_UTC_FMT)
+
+
+class QuantileSketch:
+    # log-bucketed counts (DDSketch-style): every quantile comes back within
+    # relative_accuracy of a value in the stream, and two sketches merge by
+    # adding bucket counts. Values <= 0 share one zero bucket.
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.zero = 0
+        self.bins = {}
+        self.count = 0
+
+    def add(self, value):
+        self.count += 1
+        if value <= 0:
+            self.zero += 1
+            return
+        k = math.ceil(math.log(value) / self._log_gamma)
+        self.bins[k] = self.bins.get(k, 0) + 1
+
+    def merge(self, other):
+        self.zero += other.zero
+        self.count += other.count
+        for k, c in other.bins.items():
+            self.bins[k] = self.bins.get(k, 0) + c
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero
+        if rank < seen:
+            return 0.0
+        for k in sorted(self.bins):
+            seen += self.bins[k]
+            if rank < seen:
+                return 2 * self.gamma ** k / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+    def getstate(self):
+        return {"zero": self.zero, "bins": [[k, c] for k, c in sorted(self.bins.items())]}
+
+    def setstate(self, state):
+        self.zero = state["zero"]
+        self.bins = {k: c for k, c in state["bins"]}
+        self.count = self.zero + sum(self.bins.values())
+
+
+class SloAggregator:
+    def __init__(self, window_s=300, lateness_s=None, time_field="window_end", relative_accuracy=0.01):
+        self.window_s = window_s
+        self.lateness_s = lateness_s
+        self.time_field = time_field
+        self.relative_accuracy = relative_accuracy
+        # (end, start) -> flow_name -> {"n": records,
+        # "metrics": {metric_name: [count, sum, max]}}
+        self.windows = {}
+        self.sketches = {}
+        self._heap = []
+        self.max_time = None
+        self.late = 0
+        self.emitted = 0
+        # input file -> {"stamp", "offset", "tail"}, kept by the caller
+        self.inputs = {}
+
+    def watermark(self):
+        if self.max_time is None or self.lateness_s is None:
+            return None
+        return self.max_time - self.lateness_s
+
+    def _bounds(self, record, t):
+        if self.window_s is None:
+            return record_epoch(record, "window_end"), record_epoch(record, "window_start")
+        start = t - t % self.window_s
+        return start + self.window_s, start
+
+    def add(self, record):
+        # folds one KPI record in; returns the SLO records it finalized
+        t = record_epoch(record, self.time_field)
+        key = self._bounds(record, t)
+        wm = self.watermark()
+        if wm is not None and key[0] <= wm:
+            self.late += 1
+            return []
+        flows = self.windows.get(key)
+        if flows is None:
+            flows = self.windows[key] = {}
+            heapq.heappush(self._heap, key)
+        flow = record["flow_name"]
+        state = flows.get(flow)
+        if state is None:
+            state = flows[flow] = {"n": 0, "metrics": {}}
+        state["n"] += 1
+        metric, value = record["metric_name"], float(record["metric_value"])
+        agg = state["metrics"].get(metric)
+        if agg is None:
+            state["metrics"][metric] = [1, value, value]
+        else:
+            agg[0] += 1
+            agg[1] += value
+            if value > agg[2]:
+                agg[2] = value
+        if metric in QUANTILE_METRICS:
+            sk_key = (key, flow, metric)
+            sketch = self.sketches.get(sk_key)
+            if sketch is None:
+                sketch = self.sketches[sk_key] = QuantileSketch(self.relative_accuracy)
+            sketch.add(value)
+        if self.max_time is None or t > self.max_time:
+            self.max_time = t
+            wm = self.watermark()
+            if wm is not None:
+                return self._finalize(wm)
+        return []
+
+    def tee(self, rows, emit=None):
+        # passes rows through unchanged, handing finalized SLO records to emit
+        for row in rows:
+            done = self.add(row)
+            if done and emit is not None:
+                emit(done)
+            yield row
+
+    def flush(self):
+        # every open window, finalized
+        return self._finalize(None)
+
+    def _finalize(self, wm):
+        out = []
+        while self._heap and (wm is None or self._heap[0][0] <= wm):
+            key = heapq.heappop(self._heap)
+            for flow, state in sorted(self.windows.pop(key).items()):
+                out.append(self._slo(key, flow, state))
+        self.emitted += len(out)
+        return out
+
+    def _slo(self, key, flow, state):
+        end, start = key
+        rec = {"window_start": iso_utc(start), "window_end": iso_utc(end), "flow_name": flow}
+        for field, (how, metric) in SLO_FIELDS.items():
+            agg = state["metrics"].get(metric)
+            if how == "p95":
+                sketch = self.sketches.pop((key, flow, metric), None)
+                value = sketch.quantile(0.95) if sketch is not None else None
+            elif agg is None:
+                value = None
+            else:
+                value = agg[1] if how == "sum" else agg[2]
+            rec[field] = 0.0 if value is None else value
+        total = rec["succeeded"] + rec["failed"]
+        rec["error_rate"] = rec["failed"] / total if total else 0.0
+        rec["kpi_records"] = state["n"]
+        return rec
+
+    def getstate(self):
+        windows = []
+        for (end, start), flows in sorted(self.windows.items()):
+            for flow, state in sorted(flows.items()):
+                sketches = {m: self.sketches[((end, start), flow, m)].getstate()
+                            for m in QUANTILE_METRICS if ((end, start), flow, m) in self.sketches}
+                windows.append({"start": start, "end": end, "flow": flow, "state": state,
+                                "sketches": sketches})
+        return {"slo_state_version": SLO_STATE_VERSION, "window_s": self.window_s,
+                "lateness_s": self.lateness_s, "time_field": self.time_field,
+                "relative_accuracy": self.relative_accuracy, "max_time": self.max_time,
+                "late": self.late, "emitted": self.emitted, "inputs": self.inputs, "windows": windows}
+
+    @classmethod
+    def from_state(cls, state):
+        agg = cls(state["window_s"], state["lateness_s"], state["time_field"], state["relative_accuracy"])
+        agg.max_time = state["max_time"]
+        agg.late = state["late"]
+        agg.emitted = state["emitted"]
+        agg.inputs = state["inputs"]
+        for w in state["windows"]:
+            key = (w["end"], w["start"])
+            if key not in agg.windows:
+                agg.windows[key] = {}
+                heapq.heappush(agg._heap, key)
+            agg.windows[key][w["flow"]] = w["state"]
+            for metric, s in w["sketches"].items():
+                sketch = agg.sketches[(key, w["flow"], metric)] = QuantileSketch(agg.relative_accuracy)
+                sketch.setstate(s)
+        return agg
+
+
+def save_checkpoint(path, agg):
+    with atomic_write(path) as f:
+        json.dump(agg.getstate(), f, separators=(",", ":"))
+
+
+def load_checkpoint(path):
+    with open(path, encoding="utf-8") as f:
+        state = json.load(f)
+    if state.get("slo_state_version") != SLO_STATE_VERSION:
+        raise SystemExit(f"{path}: unsupported SLO state version {state.get('slo_state_version')!r}; "
+                         f"delete it to start empty")
+    return SloAggregator.from_state(state)
@@ -0,0 +1,53 @@
+import json
+import os
+
+from gen_io import atomic_write
+
+# Persisted generator state for incremental (append) runs.
+#
+# After a run in incremental mode the generator saves what the next run
+# needs to carry on where this one stopped: the packed reference entity
+# tables (gen_refstore; new transactions keep pointing at real accounts and
+# merchants), the RNG/ID factory states (a chain of append runs is as
+# reproducible as one full run), the event-time watermark and the first and
+# last FX dates. A later run only generates the window after the watermark and
+# writes it as delta files, so its cost follows the new data rather than
+# the full history.
+#
+#   {"state_version": "2.1", "seed": 7, "id_mode": "uuid4", "run": 3,
+#    "watermark": "2026-01-04T00:00:00Z", "fx_first_date": "2025-10-03",
+#    "fx_last_date": "2026-01-03",
+#    "rng": [...], "faker_rng": [...], "ids": {...},
+#    "entities": {"customers": {<column>: {"data": <base64>, ...}}, ...}}
+
+STATE_VERSION = "2.1"
+
+
+def rng_state(rng):
+    # random.Random state as JSON-safe lists
+    version, internal, gauss = rng.getstate()
+    return [version, list(internal), gauss]
+
+
+def restore_rng(rng, state):
+    version, internal, gauss = state
+    rng.setstate((version, tuple(internal), gauss))
+
+
+def load_state(path):
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        state = json.load(f)
+    if state.get("state_version") != STATE_VERSION:
+        raise SystemExit(f"{path}: unsupported state version {state.get('state_version')!r}; "
+                         f"delete it to start a fresh full run")
+    return state
+
+
+def save_state(path, state):
+    # a run that dies half-way leaves the previous state in place, so
+    # rerunning regenerates (and overwrites) the same delta files
+    with atomic_write(path) as f:
+        json.dump(dict(state, state_version=STATE_VERSION), f, ensure_ascii=False,
+                  separators=(",", ":"))
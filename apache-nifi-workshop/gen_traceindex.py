@@ -0,0 +1,206 @@
+import hashlib
+import heapq
+import json
+import mmap
+import os
+import struct
+
+from gen_io import file_stamp, parse_epoch
+from gen_validate import json_loads
+
+# Offset index over the observability event files, for trace and lineage
+# lookups that read only the matching lines.
+#
+# For every KEY_FIELDS kind (correlation_id, transaction_id, flowfile_uuid,
+# component_id) the index is one file of fixed-width entries sorted by
+# (key hash, event time, file, offset):
+#
+#   <Q key hash (blake2b, 64 bits)> <q event epoch s> <I file number>
+#   <Q byte offset of the line> <I line length>          (ENTRY, 32 bytes)
+#
+# plus index.json, which lists the indexed files (with size and mtime, so a
+# stale index is refused) and the entry count per kind. Entries are built
+# per chunk, sorted and written as runs, then k-way merged into place, so
+# building needs memory for one chunk, not for the index.
+#
+# TraceIndex memory-maps the index and the data files: a lookup binary
+# searches the key hash, slices each candidate line out of its file and
+# parses only those, dropping the (rare) hash collisions; results come out
+# ordered by event time across all datasets.
+
+TRACE_INDEX_VERSION = "1.0"
+ENTRY = struct.Struct("<QqIQI")
+# dataset -> event time field
+INDEXED_DATASETS = {
+    "nifi_provenance": "event_time",
+    "nifi_bulletins": "event_time",
+    "alerts": "alert_time",
+}
+# kind -> dataset -> path of the field in a record
+KEY_FIELDS = {
+    "correlation_id": {
+        "nifi_provenance": ("attributes", "trace.correlation_id"),
+        "nifi_bulletins": ("trace.correlation_id",),
+        "alerts": ("context", "trace.correlation_id"),
+    },
+    "transaction_id": {
+        "nifi_provenance": ("attributes", "trace.transaction_id"),
+        "nifi_bulletins": ("trace.transaction_id",),
+        "alerts": ("context", "trace.transaction_id"),
+    },
+    "flowfile_uuid": {
+        "nifi_provenance": ("flowfile_uuid",),
+    },
+    "component_id": {
+        "nifi_provenance": ("component_id",),
+        "nifi_bulletins": ("component_id",),
+        "alerts": ("context", "component_id"),
+    },
+}
+
+
+def key_hash(value):
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def field_value(record, path):
+    for name in path:
+        if not isinstance(record, dict):
+            return None
+        record = record.get(name)
+    return record if isinstance(record, str) and record else None
+
+
+def index_lines(dataset, file_no, lines):
+    # kind -> [entry tuples] for (offset, raw line) pairs of one dataset file
+    time_field = INDEXED_DATASETS[dataset]
+    paths = {kind: fields[dataset] for kind, fields in KEY_FIELDS.items() if dataset in fields}
+    entries = {kind: [] for kind in paths}
+    for pos, line in lines:
+        try:
+            record = json_loads(line)
+        except ValueError:
+            continue
+        if not isinstance(record, dict):
+            continue
+        # a missing or unparseable time is 0: such events sort first
+        t = parse_epoch(record.get(time_field), 0)
+        length = len(line.rstrip(b"\r\n"))
+        for kind, path in paths.items():
+            value = field_value(record, path)
+            if value is not None:
+                entries[kind].append((key_hash(value), t, file_no, pos, length))
+    return entries
+
+
+def write_run(path, entries):
+    entries.sort()
+    pack = ENTRY.pack
+    with open(path, "wb") as f:
+        for i in range(0, len(entries), 65536):
+            f.write(b"".join(pack(*e) for e in entries[i:i + 65536]))
+
+
+def read_run(path):
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(ENTRY.size * 65536)
+            if not data:
+                return
+            yield from ENTRY.iter_unpack(data)
+
+
+def merge_runs(out_path, run_paths):
+    # k-way merge of sorted runs; returns the entry count
+    n = 0
+    pack = ENTRY.pack
+    buf = []
+    with open(out_path, "wb") as out:
+        for e in heapq.merge(*[read_run(p) for p in run_paths]):
+            buf.append(pack(*e))
+            if len(buf) == 65536:
+                out.write(b"".join(buf))
+                n += len(buf)
+                buf = []
+        out.write(b"".join(buf))
+        n += len(buf)
+    return n
+
+
+class TraceIndex:
+    def __init__(self, index_dir):
+        with open(os.path.join(index_dir, "index.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("trace_index_version") != TRACE_INDEX_VERSION:
+            raise SystemExit(f"{index_dir}: unsupported trace index version "
+                             f"{meta.get('trace_index_version')!r}; rebuild it")
+        for entry in meta["files"]:
+            if not os.path.exists(entry["path"]) or file_stamp(entry["path"]) != entry["stamp"]:
+                raise SystemExit(f"{entry['path']} changed since the trace index was built; rebuild it")
+        self.index_dir = index_dir
+        self.files = meta["files"]
+        self.kinds = meta["kinds"]
+        self._index = {}
+        self._data = {}
+
+    def _map(self, cache, key, path):
+        mm = cache.get(key)
+        if mm is None:
+            with open(path, "rb") as f:
+                # an empty file cannot be mapped
+                mm = cache[key] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) \
+                    if os.path.getsize(path) else b""
+        return mm
+
+    def lookup(self, kind, value):
+        # events whose kind field equals value, ordered by event time:
+        # [{"dataset", "file", "offset", "event_time", "record"}]
+        if kind not in KEY_FIELDS:
+            raise ValueError(f"unknown key kind {kind!r}; expected one of {sorted(KEY_FIELDS)}")
+        if not self.kinds.get(kind, {}).get("entries"):
+            return []
+        mm = self._map(self._index, kind, os.path.join(self.index_dir, self.kinds[kind]["path"]))
+        h = key_hash(value)
+        size, unpack = ENTRY.size, ENTRY.unpack_from
+        lo, hi = 0, len(mm) // size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if unpack(mm, mid * size)[0] < h:
+                lo = mid + 1
+            else:
+                hi = mid
+        out = []
+        i, n = lo, len(mm) // size
+        while i < n:
+            eh, t, file_no, offset, length = unpack(mm, i * size)
+            if eh != h:
+                break
+            entry = self.files[file_no]
+            data = self._map(self._data, file_no, entry["path"])
+            record = json_loads(data[offset:offset + length])
+            if field_value(record, KEY_FIELDS[kind][entry["dataset"]]) == value:
+                out.append({"dataset": entry["dataset"], "file": entry["path"], "offset": offset,
+                            "event_time": record.get(INDEXED_DATASETS[entry["dataset"]]),
+                            "record": record})
+            i += 1
+        return out
+
+    def lineage(self, kind, value):
+        # lookup() plus every provenance event of the flowfiles it touches
+        events = self.lookup(kind, value)
+        seen = {(e["file"], e["offset"]) for e in events}
+        uuids = {e["record"].get("flowfile_uuid") for e in events if e["dataset"] == "nifi_provenance"}
+        for uuid in sorted(u for u in uuids if u and not (kind == "flowfile_uuid" and u == value)):
+            for e in self.lookup("flowfile_uuid", uuid):
+                if (e["file"], e["offset"]) not in seen:
+                    seen.add((e["file"], e["offset"]))
+                    events.append(e)
+        events.sort(key=lambda e: (parse_epoch(e["event_time"], 0), e["file"], e["offset"]))
+        return events
+
+    def close(self):
+        for cache in (self._index, self._data):
+            for mm in cache.values():
+                if isinstance(mm, mmap.mmap):
+                    mm.close()
+            cache.clear()
@@ -0,0 +1,385 @@
+import csv
+import json
+import re
+from datetime import date, datetime
+
+from gen_ids import pack_ulid, pack_uuid
+
+try:
+    import numpy as np
+except ImportError:  # IdIndex falls back to a set of packed IDs
+    np = None
+
+try:
+    import orjson
+except ImportError:  # the stdlib parser is the fallback JSON backend
+    orjson = None
+
+# Contract checks shared by validate_contracts.py.
+#
+# compile_contract() turns one contract into a record check, once per
+# process: it writes the source of a function with one if/elif chain per
+# field, holding only the steps that field's contract asks for (type, enum,
+# length, format, pattern, minimum), and compiles it. A record then costs a
+# dict lookup and a few inline comparisons per field, with no walk over the
+# schema and no call per step. Contracts come in three shapes:
+#
+#   schema    a JSON Schema ("required" + "properties"), as the raw_* files
+#   columns   a reference column spec [{"name", "type", "required"}], types
+#             uuid, string, date, date-time, enum, decimal
+#   required  a required-field list (observability contracts): present and
+#             neither null nor ""
+#
+# plus the QUALITY_RULES of the contracts bundle, matched by their check
+# text (see QUALITY_PATTERNS). "<field> appears in raw <dataset>" is a
+# cross-dataset rule, checked against an IdIndex of the target's IDs.
+#
+# Text sources (CSV) hold strings: "" is an absent field, and integer/number
+# fields are parsed before the range checks. A check returns the record's
+# error messages, [] when it is valid; messages carry no values, so they
+# can be counted as they are.
+
+MISSING = object()
+
+UUID_RE = re.compile(r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}")
+DATE_TIME_RE = re.compile(r"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(\.\d+)?(Z|[+-]\d{2}:\d{2})")
+DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+INT_RE = re.compile(r"-?\d+")
+DECIMAL_RE = re.compile(r"-?\d+(\.\d+)?([eE][+-]?\d+)?")
+
+# JSON Schema types -> Python types of parsed JSON values (a bool is not an
+# integer here: type(True) is bool)
+JSON_TYPES = {
+    "string": (str,),
+    "integer": (int,),
+    "number": (int, float),
+    "boolean": (bool,),
+    "object": (dict,),
+    "array": (list,),
+}
+
+# reference column types as JSON Schema properties
+COLUMN_TYPES = {
+    "uuid": {"type": "string", "format": "uuid"},
+    "string": {"type": "string"},
+    "date": {"type": "string", "format": "date"},
+    "date-time": {"type": "string", "format": "date-time"},
+    "enum": {"type": "string"},
+    "decimal": {"type": "number"},
+}
+
+
+def is_date_time(v):
+    if not DATE_TIME_RE.fullmatch(v):
+        return False
+    try:
+        datetime.fromisoformat(v[:-1] + "+00:00" if v.endswith("Z") else v)
+    except ValueError:
+        return False
+    return True
+
+
+def is_date(v):
+    if not DATE_RE.fullmatch(v):
+        return False
+    try:
+        date.fromisoformat(v)
+    except ValueError:
+        return False
+    return True
+
+
+FORMATS = {
+    "uuid": UUID_RE.fullmatch,
+    "date-time": is_date_time,
+    "date": is_date,
+}
+
+
+def pack_id(value):
+    # 16-byte key of a UUID or ULID string; None for anything else
+    if not isinstance(value, str):
+        return None
+    if len(value) == 36 and UUID_RE.fullmatch(value):
+        return pack_uuid(value)
+    if len(value) == 26:
+        try:
+            return pack_ulid(value.upper())
+        except KeyError:
+            return None
+    return None
+
+
+BAD = object()
+
+
+def to_int(v):
+    return int(v) if INT_RE.fullmatch(v) else BAD
+
+
+def to_number(v):
+    return float(v) if DECIMAL_RE.fullmatch(v) else BAD
+
+
+def to_int_or_number(v):
+    if INT_RE.fullmatch(v):
+        return int(v)
+    return float(v) if DECIMAL_RE.fullmatch(v) else BAD
+
+
+class CheckBuilder:
+    # Source of one contract's check function. Each field reads
+    # v = record.get(field) and tests one combined expression for a valid
+    # value; only when that fails does an if/elif chain find the first
+    # failing condition and append its message. Constants (enum sets,
+    # regexes, converters, ID indexes) are bound by name in the function's
+    # globals.
+    def __init__(self):
+        self.lines = []
+        self.env = {"M": MISSING, "BAD": BAD, "NUM": (int, float)}
+
+    def const(self, value):
+        name = f"c{len(self.env)}"
+        self.env[name] = value
+        return name
+
+    def field(self, name, cases, ok=None):
+        # cases: [(condition, message or None to accept)]; ok: the fast-path
+        # expression, or None to run the chain for every record
+        self.lines.append(f"    v = g({name!r}, M)")
+        indent = "    "
+        if ok is not None:
+            self.lines.append(f"    if not ({ok}):")
+            self.lines.append(f"        v = g({name!r}, M)")
+            indent = "        "
+        keyword = "if"
+        for condition, message in cases:
+            self.lines.append(f"{indent}{keyword} {condition}:")
+            self.lines.append(f"{indent}    E.append({message!r})" if message else f"{indent}    pass")
+            keyword = "elif"
+
+    def build(self, label):
+        source = "def check(r):\n    E = []\n    g = r.get\n" + "\n".join(self.lines) + "\n    return E\n"
+        exec(compile(source, f"<contract {label}>", "exec"), self.env)
+        check = self.env["check"]
+        check.source = source
+        return check
+
+
+def field_cases(b, name, prop, required, text):
+    # (cases, ok) for CheckBuilder.field
+    types = prop.get("type") or []
+    types = [types] if isinstance(types, str) else list(types)
+    nullable = "null" in types
+    types = [t for t in types if t != "null"]
+    expected = f"{name}: expected {' or '.join(types)}"
+    absent = "v is M or v == ''" if text else "v is M"
+    cases = [(absent, f"{name}: missing required field" if required else None)]
+    steps = []  # (ok expression, message) for a present, non-null value
+    if text:
+        # CSV values are strings; numbers are parsed first
+        if "integer" in types:
+            convert = to_int_or_number if "number" in types else to_int
+        else:
+            convert = to_number if "number" in types else None
+        if convert is not None:
+            steps.append((f"(v := {b.const(convert)}(v)) is not BAD", expected))
+            py = {int, float}
+        else:
+            py = {str}
+    else:
+        cases.append(("v is None", None if nullable or not types else f"{name}: null not allowed"))
+        py = {t for k in types for t in JSON_TYPES.get(k, ())}
+        if len(py) == 1:
+            steps.append((f"type(v) is {next(iter(py)).__name__}", expected))
+        elif py:
+            steps.append((f"type(v) in {b.const(frozenset(py))}", expected))
+    # the steps after the type test only guard on type when it allows more
+    # than strings (or numbers)
+    if_str = "" if py == {str} else "type(v) is not str or "
+    if_num = "" if py and py <= {int, float} else "type(v) not in NUM or "
+    if "enum" in prop:
+        steps.append((f"v in {b.const(frozenset(prop['enum']))}", f"{name}: not an allowed value"))
+    if "minLength" in prop:
+        n = prop["minLength"]
+        steps.append((f"{if_str}len(v) >= {n}", f"{name}: shorter than {n}"))
+    if "maxLength" in prop:
+        n = prop["maxLength"]
+        steps.append((f"{if_str}len(v) <= {n}", f"{name}: longer than {n}"))
+    if prop.get("format") in FORMATS:
+        steps.append((f"{if_str}{b.const(FORMATS[prop['format']])}(v)", f"{name}: not a {prop['format']}"))
+    if "pattern" in prop:
+        steps.append((f"{if_str}{b.const(re.compile(prop['pattern']).search)}(v)",
+                      f"{name}: does not match pattern"))
+    if "minimum" in prop:
+        low = prop["minimum"]
+        steps.append((f"{if_num}v >= {low!r}", f"{name}: below minimum {low}"))
+    cases += [(f"not ({ok})", message) for ok, message in steps]
+    ok = " and ".join(f"({ok})" for ok, _ in steps) or "True"
+    if not text and (nullable or not types):
+        ok = f"v is None or {ok}"
+    if required:
+        ok = f"v is not M and {'v != ' + repr('') + ' and ' if text else ''}({ok})"
+    else:
+        ok = f"{absent} or ({ok})"
+    return cases, ok
+
+
+# check text of a QUALITY_RULES entry -> (kind, field, argument)
+QUALITY_PATTERNS = [
+    (re.compile(r"(\w+) is int and \1 >= 0"), lambda m, rule: ("non_negative_int", m[1], None)),
+    (re.compile(r"len\((\w+)\) == (\d+)"), lambda m, rule: ("length", m[1], int(m[2]))),
+    (re.compile(r"present and UUID-shaped"), lambda m, rule: ("uuid", rule.split()[0], None)),
+    (re.compile(r"present and non-empty"), lambda m, rule: ("non_empty", rule.split()[0], None)),
+    (re.compile(r"(\w+) appears in raw (\w+)"), lambda m, rule: ("reference", m[1], "raw_" + m[2])),
+]
+
+
+def parse_quality_rule(rule):
+    # None for a rule whose check text is not one of QUALITY_PATTERNS
+    for pattern, build in QUALITY_PATTERNS:
+        m = pattern.fullmatch(rule["check"].strip())
+        if m:
+            return build(m, rule["rule"])
+    return None
+
+
+def contract_references(contract):
+    # [(field, target contract)] of the contract's cross-dataset rules
+    refs = []
+    for rule in contract.get("quality") or ():
+        parsed = parse_quality_rule(rule)
+        if parsed and parsed[0] == "reference":
+            refs.append((parsed[1], parsed[2]))
+    return refs
+
+
+def quality_cases(b, rule, text, indexes):
+    # (field, cases, ok) of one quality rule; None when it is not recognised
+    parsed = parse_quality_rule(rule)
+    if parsed is None:
+        return None
+    kind, name, arg = parsed
+    if kind == "non_negative_int":
+        if text:
+            condition = f"not (type(v) is str and {b.const(INT_RE.fullmatch)}(v) and int(v) >= 0)"
+        else:
+            condition = "not (type(v) is int and v >= 0)"
+    elif kind == "length":
+        condition = f"not (type(v) is str and len(v) == {arg})"
+    elif kind == "uuid":
+        condition = f"not (type(v) is str and {b.const(UUID_RE.fullmatch)}(v))"
+    elif kind == "non_empty":
+        condition = "v is M or v is None or v == ''"
+    else:
+        condition = f"(v := {b.const(pack_id)}(v)) is None or v not in {b.const(indexes[arg])}"
+    return name, [(condition, f"rule: {rule['rule']}")], None
+
+
+def compile_contract(contract, text=False, indexes=None):
+    # record (dict) -> list of error messages; check.source is the
+    # generated code
+    b = CheckBuilder()
+    if contract.get("schema"):
+        schema = contract["schema"]
+        required = schema.get("required") or []
+        props = schema.get("properties") or {}
+        for name in list(props) + [r for r in required if r not in props]:
+            b.field(name, *field_cases(b, name, props.get(name, {}), name in required, text))
+    elif contract.get("columns"):
+        for col in contract["columns"]:
+            prop = dict(COLUMN_TYPES.get(col["type"], {}))
+            if col["type"] == "enum":
+                prop["enum"] = col["values"]
+            b.field(col["name"], *field_cases(b, col["name"], prop, col.get("required", False), text))
+    for name in contract.get("required") or ():
+        b.field(name, [("v is M or v is None or v == ''", f"{name}: missing required field")])
+    for rule in contract.get("quality") or ():
+        compiled = quality_cases(b, rule, text, indexes or {})
+        if compiled is not None:
+            b.field(*compiled)
+    return b.build(contract.get("name", "contract") + (" (csv)" if text else ""))
+
+
+def json_loads(line):
+    return orjson.loads(line) if orjson is not None else json.loads(line)
+
+
+def parse_lines(lines, fmt, header):
+    # (record or None, parse error or None) per raw line
+    if fmt == "jsonl":
+        for line in lines:
+            try:
+                record = json_loads(line)
+            except ValueError:
+                yield None, "parse_error"
+                continue
+            if isinstance(record, dict):
+                yield record, None
+            else:
+                yield None, "not a JSON object"
+        return
+    # one line at a time: a line cut inside a quoted field must not swallow
+    # the next record
+    width = len(header)
+    for line in lines:
+        text = line.decode("utf-8", "replace").rstrip("\r\n")
+        if '"' in text:
+            try:
+                row = next(csv.reader([text], strict=True), [])
+            except csv.Error:
+                yield None, "malformed row: unbalanced quotes"
+                continue
+        else:
+            row = text.split(",")
+        if len(row) != width:
+            yield None, f"malformed row: {len(row)} fields, expected {width}"
+        else:
+            yield dict(zip(header, row)), None
+
+
+class IdIndex:
+    # Sorted 16-byte IDs as two uint64 arrays (hi, lo): 16 bytes per ID and
+    # a binary search per lookup; saved as .npy and memory-mapped by every
+    # worker. Without numpy it is a set of the packed IDs.
+    def __init__(self, keys):
+        self.keys = keys
+
+    @classmethod
+    def build(cls, id_paths, out_path):
+        data = bytearray()
+        for path in id_paths:
+            with open(path, "rb") as f:
+                data += f.read()
+        if np is None:
+            with open(out_path, "wb") as f:
+                f.write(data)
+            return out_path
+        pairs = np.frombuffer(bytes(data), dtype=">u8").reshape(-1, 2).astype(np.uint64)
+        order = np.lexsort((pairs[:, 1], pairs[:, 0]))
+        np.save(out_path, np.ascontiguousarray(pairs[order].T))
+        return out_path + ".npy"
+
+    @classmethod
+    def load(cls, path):
+        if np is None:
+            with open(path, "rb") as f:
+                data = f.read()
+            return cls({data[i:i + 16] for i in range(0, len(data), 16)})
+        return cls(np.load(path, mmap_mode="r"))
+
+    def __len__(self):
+        return len(self.keys) if np is None else self.keys.shape[1]
+
+    def __contains__(self, key):
+        if np is None:
+            return key in self.keys
+        hi_col, lo_col = self.keys
+        hi, lo = int.from_bytes(key[:8], "big"), int.from_bytes(key[8:], "big")
+        i, n = int(np.searchsorted(hi_col, np.uint64(hi))), len(hi_col)
+        while i < n and int(hi_col[i]) == hi:
+            if int(lo_col[i]) == lo:
+                return True
+            i += 1
+        return False
+
@@ -0,0 +1,129 @@
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import time
+
+from gen_io import chunk_ranges, dataset_files, file_format, file_stamp, read_chunk
+from gen_traceindex import (INDEXED_DATASETS, KEY_FIELDS, TRACE_INDEX_VERSION, TraceIndex, index_lines, merge_runs,
+                            write_run)
+
+# Builds and queries the trace/lineage offset index over the observability
+# event files (nifi_provenance, nifi_bulletins, alerts; see gen_traceindex).
+#
+# --build reads every uncompressed JSONL file of those datasets once, in
+# byte-range chunks across a process pool, and writes index_dir. A query
+# then returns the events that carry one correlation_id, transaction_id,
+# flowfile_uuid or component_id, ordered by event time, as JSON lines on
+# stdout; --lineage adds every provenance event of the flowfiles involved.
+#
+#   python trace_index.py --build
+#   python trace_index.py --correlation-id ad1a18fc-08fe-4841-8847-45df427ace48 --lineage
+
+# Config block: edit values here
+CONFIG = {
+    "obs_dir": "./data/obs/raw",
+    "index_dir": "./data/obs/index",
+    "workers": os.cpu_count() or 1,
+    "chunk_mb": 64,
+}
+
+
+def index_chunk(task):
+    dataset, file_no, path, start, end, tmp_prefix = task
+    with open(path, "rb") as f:
+        entries = index_lines(dataset, file_no, (pl for pl in read_chunk(f, start, end) if pl[1].strip()))
+    runs = {}
+    for kind, es in entries.items():
+        if es:
+            runs[kind] = f"{tmp_prefix}.{kind}.run"
+            write_run(runs[kind], es)
+    return runs
+
+
+def build():
+    t0 = time.perf_counter()
+    files = []
+    for dataset in INDEXED_DATASETS:
+        for path in dataset_files(CONFIG["obs_dir"], dataset):
+            if file_format(path) == ("jsonl", None):
+                files.append({"dataset": dataset, "path": path, "stamp": file_stamp(path)})
+            else:
+                print(f"skipping {path} (only uncompressed jsonl files can be indexed by offset)")
+    if not files:
+        raise SystemExit(f"no {'/'.join(INDEXED_DATASETS)} jsonl files in {CONFIG['obs_dir']}; "
+                         "run gen_fintech_observability_data.py first")
+
+    index_dir = CONFIG["index_dir"]
+    shutil.rmtree(index_dir, ignore_errors=True)
+    tmp_dir = os.path.join(index_dir, ".tmp")
+    os.makedirs(tmp_dir)
+    chunk_bytes = int(CONFIG["chunk_mb"] * 1024 * 1024)
+    tasks = []
+    for file_no, entry in enumerate(files):
+        for ci, (start, end) in enumerate(chunk_ranges(entry["path"], chunk_bytes)):
+            tasks.append((entry["dataset"], file_no, entry["path"], start, end,
+                          os.path.join(tmp_dir, f"{file_no:05d}-{ci:05d}")))
+    with multiprocessing.Pool(CONFIG["workers"]) as pool:
+        results = list(pool.imap(index_chunk, tasks))
+
+    kinds = {}
+    for kind in KEY_FIELDS:
+        name = kind + ".idx"
+        n = merge_runs(os.path.join(index_dir, name), [r[kind] for r in results if kind in r])
+        kinds[kind] = {"path": name, "entries": n}
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    with open(os.path.join(index_dir, "index.json"), "w", encoding="utf-8") as f:
+        json.dump({"trace_index_version": TRACE_INDEX_VERSION, "files": files, "kinds": kinds}, f, indent=2)
+    wall = time.perf_counter() - t0
+    size = sum(os.path.getsize(e["path"]) for e in files)
+    print(f"indexed {len(files)} files ({size / 1e6:.1f} MB) in {wall:.1f}s: "
+          + ", ".join(f"{k} {v['entries']}" for k, v in kinds.items()) + f"; index in {index_dir}")
+
+
+def query(kind, value, lineage):
+    t0 = time.perf_counter()
+    index = TraceIndex(CONFIG["index_dir"])
+    events = index.lineage(kind, value) if lineage else index.lookup(kind, value)
+    wall_ms = (time.perf_counter() - t0) * 1000
+    out = sys.stdout
+    for e in events:
+        out.write(json.dumps({"dataset": e["dataset"], "offset": e["offset"], "event": e["record"]},
+                             separators=(",", ":"), ensure_ascii=False) + "\n")
+    index.close()
+    print(f"{len(events)} events for {kind}={value} in {wall_ms:.1f} ms", file=sys.stderr)
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(
+        description="Build or query the offset index over provenance, bulletins and alerts.")
+    p.add_argument("--build", action="store_true",
+                   help="(re)build the index from the observability files")
+    for kind in KEY_FIELDS:
+        p.add_argument("--" + kind.replace("_", "-"), metavar="VALUE",
+                       help=f"print the events with this {kind}")
+    p.add_argument("--lineage", action="store_true",
+                   help="also print every provenance event of the flowfiles found")
+    p.add_argument("--obs-dir", default=CONFIG["obs_dir"],
+                   help="directory with the observability files")
+    p.add_argument("--index-dir", default=CONFIG["index_dir"],
+                   help="where the index is written / read")
+    p.add_argument("--workers", type=int, default=CONFIG["workers"],
+                   help="indexing processes")
+    return p.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    CONFIG["obs_dir"] = args.obs_dir
+    CONFIG["index_dir"] = args.index_dir
+    CONFIG["workers"] = args.workers
+    keys = [(k, getattr(args, k)) for k in KEY_FIELDS if getattr(args, k)]
+    if not args.build and not keys:
+        raise SystemExit("nothing to do: pass --build and/or a key such as --correlation-id VALUE")
+    if args.build:
+        build()
+    for kind, value in keys:
+        query(kind, value, args.lineage)
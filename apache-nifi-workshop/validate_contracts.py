@@ -0,0 +1,317 @@
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+from itertools import islice
+
+from gen_io import chunk_ranges, concat, dataset_files, file_format, open_source, read_chunk, read_header
+from gen_validate import (IdIndex, compile_contract, contract_references, pack_id, parse_lines,
+                          parse_quality_rule)
+
+# Validates the generated datasets against their contracts, as the Module 1
+# flows do, but fast enough for hundreds of millions of lines.
+#
+# Contracts are read from what the generators wrote: the fintech bundle
+# (raw_* JSON Schemas, reference_* column specs, quality rules) and the
+# observability contracts (required-field lists). Each contract is compiled
+# once per process (see gen_validate) and every JSONL/CSV file of its
+# dataset, including part and delta files, is split into byte-range chunks
+# validated in parallel by a process pool. Valid lines are copied as they
+# are to out_dir/valid/<contract>/<file>; invalid ones go to
+# out_dir/quarantine/<dataset>_invalid.jsonl in the Module 1 quarantine
+# envelope:
+#
+#   {"schema_version": "1.0", "ingest_time": ..., "source_file": ...,
+#    "source_offset": <byte offset of the line>, "validation_errors": "...",
+#    "raw": <the record, or the line when it does not parse>}
+#
+# Cross-dataset rules ("disputes reference transaction_id in raw
+# transactions") run in a second pass, against a sorted 16-byte ID index of
+# the target built from the first. out_dir/report.json has the per-dataset
+# counts and error messages.
+#
+#   python validate_contracts.py
+#   python validate_contracts.py --contracts raw_transactions,raw_disputes --workers 8
+
+# Config block: edit values here
+CONFIG = {
+    "base_dir": "./data",
+    "bundle": "./data/contracts/contracts_bundle.json",
+    "observability": "./data/obs/contracts/observability_contracts.json",
+    "out_dir": "./data/validated",
+    # contract names to check; None = every contract found
+    "contracts": None,
+    "workers": os.cpu_count() or 1,
+    "chunk_mb": 64,
+    # False only counts and quarantines; valid lines are not copied
+    "write_valid": True,
+    "batch_lines": 10_000,
+}
+
+
+def load_contracts(base_dir, bundle_path, obs_path):
+    # contract name -> {"name", "version", "schema"/"columns"/"required",
+    # "quality", "dir", "stem"}
+    contracts = {}
+    if os.path.exists(bundle_path):
+        with open(bundle_path, encoding="utf-8") as f:
+            bundle = json.load(f)
+        contracts_dir = os.path.dirname(bundle_path)
+        for name, schema_file in bundle["schemas"].items():
+            with open(os.path.join(contracts_dir, schema_file), encoding="utf-8") as f:
+                schema = json.load(f)
+            # raw_transactions -> raw dir, transactions.*
+            area, _, stem = name.partition("_")
+            contract = {"name": name, "version": bundle["version"], "dir": bundle["paths"][area],
+                        "stem": stem, "quality": bundle.get("quality_rules", {}).get(name, [])}
+            if "columns" in schema:
+                contract["columns"] = schema["columns"]
+            else:
+                contract["schema"] = schema
+            contracts[name] = contract
+    if os.path.exists(obs_path):
+        with open(obs_path, encoding="utf-8") as f:
+            obs = json.load(f)
+        for name, spec in obs["datasets"].items():
+            contracts[name] = {"name": name, "version": obs["version"],
+                               "dir": os.path.join(base_dir, os.path.dirname(spec["path"])),
+                               "stem": name, "required": spec["required"], "quality": []}
+    return contracts
+
+
+_WORKER = {}
+
+
+def _init_worker(contracts, ingest_time, batch_lines):
+    _WORKER.update(contracts=contracts, ingest_time=ingest_time, batch_lines=batch_lines,
+                   checks={}, indexes={})
+
+
+def worker_check(name, text, index_paths):
+    key = (name, text)
+    checks = _WORKER["checks"]
+    if key not in checks:
+        indexes = _WORKER["indexes"]
+        for target, path in index_paths.items():
+            if target not in indexes:
+                indexes[target] = IdIndex.load(path)
+        checks[key] = compile_contract(_WORKER["contracts"][name], text, indexes)
+    return checks[key]
+
+
+def validate_chunk(task):
+    name, path, fmt, compression, start, end, header, tmp_prefix, index_field, index_paths, write_valid = task
+    contract = _WORKER["contracts"][name]
+    check = worker_check(name, fmt == "csv", index_paths)
+    envelope = {"schema_version": contract["version"], "ingest_time": _WORKER["ingest_time"],
+                "source_file": os.path.basename(path)}
+    rows = invalid = 0
+    errors = {}
+    ids = bytearray()
+    valid_f = open(tmp_prefix + ".valid", "wb") if write_valid else None
+    invalid_f = open(tmp_prefix + ".invalid", "wb")
+    with open_source(path, compression) as f:
+        lines = read_chunk(f, start, end if compression is None else None)
+        if fmt == "csv" and start == 0:
+            next(lines, None)
+        batch_lines = _WORKER["batch_lines"]
+        while True:
+            batch = list(islice(lines, batch_lines))
+            if not batch:
+                break
+            batch = [(pos, line) for pos, line in batch if line.strip()]
+            valid_out, invalid_out = [], []
+            parsed = parse_lines([line for _, line in batch], fmt, header)
+            for (pos, line), (record, parse_error) in zip(batch, parsed):
+                rows += 1
+                if record is None:
+                    problems = [parse_error]
+                else:
+                    problems = check(record)
+                    if index_field is not None:
+                        key = pack_id(record.get(index_field))
+                        if key is not None:
+                            ids += key
+                if not problems:
+                    if valid_f is not None:
+                        valid_out.append(line if line.endswith(b"\n") else line + b"\n")
+                    continue
+                invalid += 1
+                for p in problems:
+                    errors[p] = errors.get(p, 0) + 1
+                raw = record if fmt == "jsonl" and record is not None else \
+                    line.decode("utf-8", "replace").rstrip("\r\n")
+                invalid_out.append(json.dumps(dict(envelope, source_offset=pos,
+                                                   validation_errors="; ".join(problems), raw=raw),
+                                              separators=(",", ":"), ensure_ascii=False) + "\n")
+            if valid_out:
+                valid_f.write(b"".join(valid_out))
+            if invalid_out:
+                invalid_f.write("".join(invalid_out).encode("utf-8"))
+    if valid_f is not None:
+        valid_f.close()
+    invalid_f.close()
+    ids_path = None
+    if index_field is not None:
+        ids_path = tmp_prefix + ".ids"
+        with open(ids_path, "wb") as f:
+            f.write(ids)
+    return {"contract": name, "path": path, "rows": rows, "invalid": invalid, "errors": errors,
+            "tmp_prefix": tmp_prefix, "ids_path": ids_path}
+
+
+def plan_tasks(contract, files, tmp_dir, chunk_bytes, index_field, index_paths, write_valid):
+    tasks = []
+    for fi, path in enumerate(files):
+        fmt, compression = file_format(path)
+        header = read_header(path, compression) if fmt == "csv" else None
+        ranges = chunk_ranges(path, chunk_bytes) if compression is None else [(0, None)]
+        for ci, (start, end) in enumerate(ranges):
+            tmp_prefix = os.path.join(tmp_dir, f"{contract['name']}-{fi:05d}-{ci:05d}")
+            tasks.append((contract["name"], path, fmt, compression, start, end, header, tmp_prefix,
+                          index_field, index_paths, write_valid))
+    return tasks
+
+
+def collect(contract, results, out_dir, write_valid):
+    # joins the chunk outputs in file/chunk order; returns the report entry
+    by_file = {}
+    for r in results:
+        by_file.setdefault(r["path"], []).append(r)
+    if write_valid:
+        for path, rs in by_file.items():
+            fmt, compression = file_format(path)
+            name = os.path.basename(path)
+            if compression:
+                name = os.path.splitext(name)[0]
+            head = b""
+            if fmt == "csv":
+                with open_source(path, compression) as f:
+                    head = f.readline()
+            concat(os.path.join(out_dir, "valid", contract["name"], name),
+                   [r["tmp_prefix"] + ".valid" for r in rs], head)
+    concat(os.path.join(out_dir, "quarantine", f"{contract['stem']}_invalid.jsonl"),
+           [r["tmp_prefix"] + ".invalid" for r in results])
+    errors = {}
+    for r in results:
+        for k, v in r["errors"].items():
+            errors[k] = errors.get(k, 0) + v
+    rows = sum(r["rows"] for r in results)
+    invalid = sum(r["invalid"] for r in results)
+    return {"files": sorted(by_file), "rows": rows, "valid": rows - invalid, "invalid": invalid,
+            "errors": dict(sorted(errors.items(), key=lambda kv: -kv[1]))}
+
+
+def main():
+    t0 = time.perf_counter()
+    contracts = load_contracts(CONFIG["base_dir"], CONFIG["bundle"], CONFIG["observability"])
+    if not contracts:
+        raise SystemExit(f"no contracts found at {CONFIG['bundle']} or {CONFIG['observability']}; "
+                         "run the generators first")
+    selected = CONFIG["contracts"] or list(contracts)
+    unknown = [n for n in selected if n not in contracts]
+    if unknown:
+        raise SystemExit(f"unknown contracts {unknown}; expected some of {sorted(contracts)}")
+
+    for name in selected:
+        for rule in contracts[name]["quality"]:
+            if parse_quality_rule(rule) is None:
+                print(f"{name}: skipping quality rule {rule['rule']!r} (unrecognised check {rule['check']!r})")
+
+    # cross-dataset rules: their targets are indexed in the first pass
+    refs = {name: contract_references(contracts[name]) for name in selected}
+    index_fields = {}
+    for name, rs in refs.items():
+        for field, target in rs:
+            if target not in contracts:
+                raise SystemExit(f"{name}: rule references unknown contract {target}")
+            index_fields.setdefault(target, field)
+    first = [n for n in selected if not refs[n]]
+    second = [n for n in selected if refs[n]]
+    first += [t for t in index_fields if t not in first]
+
+    files = {}
+    for name in first + second:
+        c = contracts[name]
+        files[name] = []
+        for path in dataset_files(c["dir"], c["stem"]):
+            if (file_format(path) or (None,))[0] not in ("jsonl", "csv"):
+                print(f"{name}: skipping {path} (only jsonl/csv files are validated)")
+            else:
+                files[name].append(path)
+
+    out_dir = CONFIG["out_dir"]
+    for sub in ("valid", "quarantine"):
+        shutil.rmtree(os.path.join(out_dir, sub), ignore_errors=True)
+    tmp_dir = os.path.join(out_dir, ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    ingest_time = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    chunk_bytes = int(CONFIG["chunk_mb"] * 1024 * 1024)
+    write_valid = CONFIG["write_valid"]
+    report = {"ingest_time": ingest_time, "datasets": {}}
+    with multiprocessing.Pool(CONFIG["workers"], initializer=_init_worker,
+                              initargs=(contracts, ingest_time, CONFIG["batch_lines"])) as pool:
+        index_paths = {}
+        for names in (first, second):
+            tasks = []
+            for name in names:
+                paths = {t: index_paths[t] for _, t in refs[name]}
+                tasks += plan_tasks(contracts[name], files[name], tmp_dir, chunk_bytes,
+                                    index_fields.get(name), paths, write_valid)
+            results = {}
+            for r in pool.imap(validate_chunk, tasks):
+                results.setdefault(r["contract"], []).append(r)
+            for name in names:
+                rs = results.get(name, [])
+                if name in index_fields:
+                    index_paths[name] = IdIndex.build([r["ids_path"] for r in rs],
+                                                      os.path.join(tmp_dir, f"{name}.index"))
+                if name in selected:
+                    report["datasets"][name] = collect(contracts[name], rs, out_dir, write_valid)
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    wall = time.perf_counter() - t0
+    report["wall_s"] = round(wall, 3)
+    with open(os.path.join(out_dir, "report.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    total = 0
+    for name in selected:
+        d = report["datasets"][name]
+        total += d["rows"]
+        top = ", ".join(f"{k} ({v})" for k, v in list(d["errors"].items())[:3])
+        print(f"{name}: {d['rows']} rows, {d['valid']} valid, {d['invalid']} invalid"
+              + (f"; {top}" if top else ""))
+    print(f"validated {total} rows in {wall:.1f}s ({total / wall if wall > 0 else 0:.0f} rows/s, "
+          f"{CONFIG['workers']} workers); report in {os.path.join(out_dir, 'report.json')}")
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(
+        description="Validate the generated datasets against their contracts.")
+    p.add_argument("--contracts", default=None,
+                   help="comma-separated contract names (default: all), e.g. raw_transactions,raw_disputes")
+    p.add_argument("--workers", type=int, default=CONFIG["workers"],
+                   help="validation processes")
+    p.add_argument("--chunk-mb", type=float, default=CONFIG["chunk_mb"],
+                   help="size of the byte-range chunk each task validates")
+    p.add_argument("--out-dir", default=CONFIG["out_dir"],
+                   help="where valid/, quarantine/ and report.json go")
+    p.add_argument("--no-valid", action="store_true",
+                   help="only count and quarantine; do not copy valid lines")
+    return p.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    CONFIG["workers"] = args.workers
+    CONFIG["chunk_mb"] = args.chunk_mb
+    CONFIG["out_dir"] = args.out_dir
+    if args.contracts:
+        CONFIG["contracts"] = args.contracts.split(",")
+    if args.no_valid:
+        CONFIG["write_valid"] = False
+    main()